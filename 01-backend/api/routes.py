@@ -1,19 +1,33 @@
+import logging
+import os
 import pandas as pd
 import jwt
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
-from database.db_init import db, User, UserFoodLog
+from database.db_init import db, User, UserFoodLog, UserFoodPreference
 from datetime import datetime, timedelta, timezone, date
 from database.config import Config
 from models.mood_prediction_model import predict_emotion 
 from models.food_recommendation_model import get_food_recommendations, get_available_nutrients, personalized_recommendation
+from models.food_recommendation_model import SUPPORTED_MEAL_TYPES
 from models.food_explaination_ai import FoodExplanationAI
+from models.preference_state import record_rating, rebuild_preference_state
+from models.history_cache import invalidate_user_history
 from middleware.auth_utils import get_user_from_token
 from middleware.admin_auth import admin_required
+from middleware.server_timing import server_timing
+from models.stage_timer import stage
+from models.model_registry import BASE_MODEL_VERSION, model_registry
+from metrics import render_prometheus, sync_process_gauges, timed
 
 # Create the admin_required decorator with needed context
 admin_auth = admin_required(Config.JWT_SECRET, User)
 
+logger = logging.getLogger(__name__)
+
+# Most contexts a /recommend-batch call may ask for
+MAX_BATCH_CONTEXTS = int(os.getenv("MAX_BATCH_CONTEXTS", "16"))
+
 auth_api = Blueprint("auth_api", __name__)
 emotion_api = Blueprint("emotion_api", __name__)
 food_api = Blueprint("food_api", __name__)
@@ -107,7 +121,8 @@ def detect_emotion():
     image_bytes = file.read()  # Đọc ảnh dưới dạng bytes
 
     # Nhận diện cảm xúc bằng mô hình AI
-    emotion = predict_emotion(image_bytes)
+    with timed('emotion_inference_duration_seconds'):
+        emotion = predict_emotion(image_bytes)
 
     if emotion:
         return jsonify({"emotion": emotion})
@@ -132,10 +147,137 @@ def get_food_types():
         "food_types": food_types
     })
 
+def recommendation_response(user, emotion, meal_time, food_type, snapshot, context_stats, personalized_result):
+    """
+    Response body and status code of one recommend-food context: adds the satisfaction estimate
+    and context log to a personalized result, or falls back to the base recommendations
+    """
+    from models.food_recommendation_model import log_recommendation_context, predict_user_satisfaction
+    
+    # Check if personalized recommendation was successful
+    if personalized_result.get("status") == "success":
+        logger.debug("Using simplified state-aware recommendations for user %s", user.id)
+        
+        # Get recommendation and alternatives from personalized result
+        recommendation = personalized_result.get("recommendation")
+        alternatives = personalized_result.get("alternatives", [])
+        priority_nutrients = personalized_result.get("priority_nutrients", [])
+        adapted = personalized_result.get("adapted", False)
+        context_reset = personalized_result.get("context_reset", False)
+        preference_summary = personalized_result.get("preference_summary", {})
+        
+        # Predict user satisfaction
+        if recommendation:
+            with stage('satisfaction'):
+                satisfaction_prediction = predict_user_satisfaction(
+                    user.id, emotion, meal_time, food_type, recommendation.get('food'), snapshot=snapshot
+                )
+            recommendation['predicted_satisfaction'] = round(satisfaction_prediction, 2)
+        
+        # Log recommendation context with enhanced info
+        with stage('log_context'):
+            log_recommendation_context(
+                user.id, emotion, meal_time, food_type, 
+                recommendation.get('food') if recommendation else 'None',
+                {
+                    'adapted': adapted,
+                    'context_reset': context_reset,
+                    'food_state': recommendation.get('food_state', 'unknown') if recommendation else 'none',
+                    'preference_summary': preference_summary,
+                    'total_context_ratings': context_stats['total_ratings'],
+                    'context_avg_rating': context_stats['avg_rating']
+                },
+                snapshot=snapshot
+            )
+        
+    else:
+        logger.warning("Falling back to base recommendations for user %s: %s",
+                       user.id, personalized_result.get('error', 'Unknown error'))
+        
+        # Fall back to base recommendations if personalized fails
+        with stage('base_fallback'):
+            base_recommendations = get_food_recommendations(
+                emotion=emotion,
+                birth_date=user.date_of_birth,
+                user_id=user.id,
+                meal_time=meal_time,
+                food_type=food_type
+            )
+        
+        if base_recommendations.get("status") == "error":
+            return base_recommendations, 400
+        
+        recommendation = base_recommendations.get("recommendation")
+        alternatives = base_recommendations.get("alternatives", [])
+        priority_nutrients = base_recommendations.get("priority_nutrients", [])
+        adapted = False
+        context_reset = False
+        preference_summary = {'liked_count': 0, 'neutral_count': 0, 'disliked_count': 0}
+        
+        # Add default values for base recommendations
+        if recommendation:
+            recommendation['predicted_satisfaction'] = 0.5  # Neutral for base recommendations
+            recommendation['food_state'] = 'base_recommendation'
+            recommendation['personalization_reason'] = 'Base recommendation - help us learn your preferences!'
+    
+    # Ensure we have a valid recommendation
+    if not recommendation:
+        return {
+            "error": "No suitable recommendations found",
+            "status": "error"
+        }, 400
+    
+    # Enhanced response with state information
+    response = {
+        "status": "success",
+        "user_name": user.name,
+        "recommendation": recommendation,
+        "alternatives": alternatives,
+        "priority_nutrients": priority_nutrients,
+        "user_id": user.id,
+        "emotion": emotion,
+        "meal_time": meal_time,
+        "food_type": food_type if food_type else "",
+        
+        # Personalization info
+        "personalized": True,
+        "adapted": adapted,
+        "context_reset": context_reset,
+        
+        # Enhanced context information
+        "context_info": {
+            "context_key": f"{emotion}-{meal_time}-{food_type or 'Any'}",
+            "total_ratings_in_context": context_stats['total_ratings'],
+            "unique_foods_tried": context_stats['unique_foods'],
+            "average_rating_in_context": round(context_stats['avg_rating'], 2) if context_stats['avg_rating'] > 0 else 0,
+            "rating_distribution": context_stats['rating_distribution'],
+            "state_distribution": context_stats.get('state_distribution', {'liked': 0, 'neutral': 0, 'disliked': 0})
+        },
+        
+        # User preference summary for this context
+        "preference_summary": {
+            "liked_foods_count": preference_summary.get('liked_count', 0),
+            "neutral_foods_count": preference_summary.get('neutral_count', 0), 
+            "disliked_foods_count": preference_summary.get('disliked_count', 0),
+            "total_foods_tried": preference_summary.get('liked_count', 0) + preference_summary.get('neutral_count', 0) + preference_summary.get('disliked_count', 0)
+        },
+        
+        # Explanation for user
+        "explanation": {
+            "personalization_reason": recommendation.get('personalization_reason', 'Recommendation based on your preferences'),
+            "food_state": recommendation.get('food_state', 'unknown'),
+            "adaptation_note": recommendation.get('adaptation_note', ''),
+            "predicted_satisfaction": recommendation.get('predicted_satisfaction', 0.5)
+        }
+    }
+    
+    return response, 200
+
 # Optional enhancement for /recommend-food endpoint in api/routes.py
 # You can keep the current version or use this enhanced one
 
 @food_api.route("/recommend-food", methods=["POST"])
+@server_timing
 def recommend_food():
     """
     API returns context-aware food recommendations with simplified state logic.
@@ -165,143 +307,171 @@ def recommend_food():
         age = today.year - user.date_of_birth.year - ((today.month, today.day) < (user.date_of_birth.month, user.date_of_birth.day))
         
         # Import helper functions
-        from models.food_recommendation_model import (
-            log_recommendation_context, 
-            predict_user_satisfaction,
-            get_user_context_statistics
-        )
+        from models.food_recommendation_model import get_user_context_statistics, ContextSnapshot
+        
+        # The context's rating history is fetched once and shared by every helper below
+        snapshot = ContextSnapshot(user.id, emotion, meal_time, food_type)
         
         # Get context statistics before recommendation
-        context_stats = get_user_context_statistics(user.id, emotion, meal_time, food_type)
+        with stage('context_stats'):
+            context_stats = get_user_context_statistics(user.id, emotion, meal_time, food_type, snapshot=snapshot)
         
         # *** SIMPLIFIED STATE-AWARE PERSONALIZATION ***
-        personalized_result = personalized_recommendation(
-            user_id=user.id,
-            emotion=emotion,
-            age=age,
-            meal_time=meal_time,
-            preferred_food_type=food_type
-        )
-        
-        # Check if personalized recommendation was successful
-        if personalized_result.get("status") == "success":
-            print(f"Using simplified state-aware recommendations for user {user.id}")
-            
-            # Get recommendation and alternatives from personalized result
-            recommendation = personalized_result.get("recommendation")
-            alternatives = personalized_result.get("alternatives", [])
-            priority_nutrients = personalized_result.get("priority_nutrients", [])
-            adapted = personalized_result.get("adapted", False)
-            context_reset = personalized_result.get("context_reset", False)
-            preference_summary = personalized_result.get("preference_summary", {})
-            
-            # Predict user satisfaction
-            if recommendation:
-                satisfaction_prediction = predict_user_satisfaction(
-                    user.id, emotion, meal_time, food_type, recommendation.get('food')
-                )
-                recommendation['predicted_satisfaction'] = round(satisfaction_prediction, 2)
-            
-            # Log recommendation context with enhanced info
-            log_recommendation_context(
-                user.id, emotion, meal_time, food_type, 
-                recommendation.get('food') if recommendation else 'None',
-                {
-                    'adapted': adapted,
-                    'context_reset': context_reset,
-                    'food_state': recommendation.get('food_state', 'unknown') if recommendation else 'none',
-                    'preference_summary': preference_summary,
-                    'total_context_ratings': context_stats['total_ratings'],
-                    'context_avg_rating': context_stats['avg_rating']
-                }
-            )
-            
-        else:
-            print(f"Falling back to base recommendations for user {user.id}: {personalized_result.get('error', 'Unknown error')}")
-            
-            # Fall back to base recommendations if personalized fails
-            base_recommendations = get_food_recommendations(
-                emotion=emotion,
-                birth_date=user.date_of_birth,
+        with stage('personalization'):
+            personalized_result = personalized_recommendation(
                 user_id=user.id,
+                emotion=emotion,
+                age=age,
                 meal_time=meal_time,
-                food_type=food_type
+                preferred_food_type=food_type,
+                snapshot=snapshot
             )
-            
-            if base_recommendations.get("status") == "error":
-                return jsonify(base_recommendations), 400
-            
-            recommendation = base_recommendations.get("recommendation")
-            alternatives = base_recommendations.get("alternatives", [])
-            priority_nutrients = base_recommendations.get("priority_nutrients", [])
-            adapted = False
-            context_reset = False
-            preference_summary = {'liked_count': 0, 'neutral_count': 0, 'disliked_count': 0}
-            
-            # Add default values for base recommendations
-            if recommendation:
-                recommendation['predicted_satisfaction'] = 0.5  # Neutral for base recommendations
-                recommendation['food_state'] = 'base_recommendation'
-                recommendation['personalization_reason'] = 'Base recommendation - help us learn your preferences!'
-        
-        # Ensure we have a valid recommendation
-        if not recommendation:
-            return jsonify({
-                "error": "No suitable recommendations found",
-                "status": "error"
-            }), 400
-        
-        # Enhanced response with state information
-        response = {
+        
+        response, status_code = recommendation_response(
+            user, emotion, meal_time, food_type, snapshot, context_stats, personalized_result
+        )
+        return jsonify(response), status_code
+        
+    except Exception as e:
+        logger.error("Error getting recommendations: %s", e)
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": "Failed to get recommendations"}), 500
+
+@food_api.route("/recommend-batch", methods=["POST"])
+@server_timing
+def recommend_batch():
+    """
+    Recommendations for several contexts in one call: {"contexts": [{"emotion", "meal_time", "food_type"}, ...]}.
+    The user's preference states are loaded once and every context is scored in one batched pass.
+    Each result is the /recommend-food body of its context plus its status_code, in request order
+    """
+    user = get_user_from_request_token()
+    
+    if not user:
+        return jsonify({"error": "Invalid or expired token"}), 401
+    
+    data = request.json
+    contexts = data.get("contexts")
+    
+    # Check required fields
+    if not isinstance(contexts, list) or not contexts:
+        return jsonify({"error": "Contexts must be a non-empty list"}), 400
+    if len(contexts) > MAX_BATCH_CONTEXTS:
+        return jsonify({"error": f"At most {MAX_BATCH_CONTEXTS} contexts per request"}), 400
+    for i, context in enumerate(contexts):
+        if not isinstance(context, dict):
+            return jsonify({"error": f"Context {i} must be an object"}), 400
+        if not context.get("emotion"):
+            return jsonify({"error": f"Context {i}: Emotion is required"}), 400
+        if not context.get("meal_time"):
+            return jsonify({"error": f"Context {i}: Meal time is required"}), 400
+        if not isinstance(context["emotion"], str) or not isinstance(context["meal_time"], str):
+            return jsonify({"error": f"Context {i}: Emotion and meal time must be strings"}), 400
+        if context.get("food_type") is not None and not isinstance(context["food_type"], str):
+            return jsonify({"error": f"Context {i}: Food type must be a string"}), 400
+    
+    try:
+        # Calculate user age
+        today = date.today()
+        age = today.year - user.date_of_birth.year - ((today.month, today.day) < (user.date_of_birth.month, user.date_of_birth.day))
+        
+        # Import helper functions
+        from models.food_recommendation_model import (
+            get_user_context_statistics,
+            context_snapshots,
+            personalized_recommendation_batch
+        )
+        
+        keys = [(context["emotion"], context["meal_time"], context.get("food_type")) for context in contexts]
+        
+        # Preference states of every context come from one query; history from the user's cached projection
+        with stage('context_stats'):
+            snapshots = context_snapshots(user.id, keys)
+            context_stats = [
+                get_user_context_statistics(user.id, emotion, meal_time, food_type, snapshot=snapshot)
+                for (emotion, meal_time, food_type), snapshot in zip(keys, snapshots)
+            ]
+        
+        with stage('personalization'):
+            personalized_results = personalized_recommendation_batch(user.id, age, keys, snapshots=snapshots)
+        
+        results = []
+        for (emotion, meal_time, food_type), snapshot, stats, personalized_result in zip(
+                keys, snapshots, context_stats, personalized_results):
+            response, status_code = recommendation_response(
+                user, emotion, meal_time, food_type, snapshot, stats, personalized_result
+            )
+            response["status_code"] = status_code
+            results.append(response)
+        
+        return jsonify({
             "status": "success",
-            "user_name": user.name,
-            "recommendation": recommendation,
-            "alternatives": alternatives,
-            "priority_nutrients": priority_nutrients,
             "user_id": user.id,
-            "emotion": emotion,
-            "meal_time": meal_time,
-            "food_type": food_type if food_type else "",
-            
-            # Personalization info
-            "personalized": True,
-            "adapted": adapted,
-            "context_reset": context_reset,
-            
-            # Enhanced context information
-            "context_info": {
-                "context_key": f"{emotion}-{meal_time}-{food_type or 'Any'}",
-                "total_ratings_in_context": context_stats['total_ratings'],
-                "unique_foods_tried": context_stats['unique_foods'],
-                "average_rating_in_context": round(context_stats['avg_rating'], 2) if context_stats['avg_rating'] > 0 else 0,
-                "rating_distribution": context_stats['rating_distribution'],
-                "state_distribution": context_stats.get('state_distribution', {'liked': 0, 'neutral': 0, 'disliked': 0})
-            },
-            
-            # User preference summary for this context
-            "preference_summary": {
-                "liked_foods_count": preference_summary.get('liked_count', 0),
-                "neutral_foods_count": preference_summary.get('neutral_count', 0), 
-                "disliked_foods_count": preference_summary.get('disliked_count', 0),
-                "total_foods_tried": preference_summary.get('liked_count', 0) + preference_summary.get('neutral_count', 0) + preference_summary.get('disliked_count', 0)
-            },
-            
-            # Explanation for user
-            "explanation": {
-                "personalization_reason": recommendation.get('personalization_reason', 'Recommendation based on your preferences'),
-                "food_state": recommendation.get('food_state', 'unknown'),
-                "adaptation_note": recommendation.get('adaptation_note', ''),
-                "predicted_satisfaction": recommendation.get('predicted_satisfaction', 0.5)
+            "count": len(results),
+            "results": results
+        })
+        
+    except Exception as e:
+        logger.error("Error getting batch recommendations: %s", e)
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": "Failed to get recommendations"}), 500
+
+@food_api.route("/meal-plan", methods=["POST"])
+@server_timing
+def meal_plan():
+    """
+    Meal plan for an emotion trajectory: {"emotions": ["sad", "neutral", ...], "meal_times": [...]} with one
+    emotion per day (1 to 7 days) and optionally a subset of the meal times. Each day's foods maximize the
+    summed compatibility scores within the daily nutrient limits of the user's age group, and foods the
+    user dislikes in an emotion and meal time are never planned there
+    """
+    user = get_user_from_request_token()
+    
+    if not user:
+        return jsonify({"error": "Invalid or expired token"}), 401
+    
+    data = request.json
+    emotions = data.get("emotions")
+    meal_times = data.get("meal_times")
+    
+    # Check required fields
+    if not isinstance(emotions, list) or not emotions or not all(isinstance(emotion, str) and emotion for emotion in emotions):
+        return jsonify({"error": "Emotions must be a non-empty list, one per day"}), 400
+    if meal_times is not None and (not isinstance(meal_times, list) or not meal_times):
+        return jsonify({"error": "Meal times must be a non-empty list"}), 400
+    for meal_time in meal_times or []:
+        if not isinstance(meal_time, str) or meal_time not in SUPPORTED_MEAL_TYPES:
+            return jsonify({"error": f"Unsupported meal type: {meal_time}. Valid meal types are: {', '.join(SUPPORTED_MEAL_TYPES)}"}), 400
+    
+    try:
+        from models.food_recommendation_model import get_meal_plan
+        from models.preference_state import load_user_preferences
+        
+        # Disliked foods of every (emotion, meal time) of the plan, with one query
+        with stage('preferences'):
+            contexts = {(emotion, meal_time, None) for emotion in emotions for meal_time in (meal_times or SUPPORTED_MEAL_TYPES)}
+            states = load_user_preferences(user.id, contexts)
+            disliked_foods = {
+                (mood, meal_time): [food for food, state, _ in context_states if state == 'disliked']
+                for (mood, meal_time, _), context_states in states.items()
             }
-        }
         
-        return jsonify(response)
+        with stage('meal_plan'):
+            plan = get_meal_plan(user.date_of_birth, emotions, meal_times, disliked_foods)
+        
+        if plan.get("status") != "success":
+            return jsonify(plan), 400
+        
+        plan["user_id"] = user.id
+        return jsonify(plan)
         
     except Exception as e:
-        print(f"Error getting recommendations: {e}")
+        logger.error("Error getting meal plan: %s", e)
         import traceback
         traceback.print_exc()
-        return jsonify({"error": "Failed to get recommendations"}), 500
+        return jsonify({"error": "Failed to get meal plan"}), 500
 
 @food_api.route("/select-food", methods=["POST"])
 def select_food():
@@ -328,6 +498,11 @@ def select_food():
         log_entry.recommended_food = chosen_food
         
         db.session.commit()
+        invalidate_user_history(user.id)
+        
+        # A rated entry moved to another food, so the user's preference states change too
+        if log_entry.feedback_rating is not None:
+            rebuild_preference_state(user.id)
         
         return jsonify({
             "status": "success",
@@ -335,7 +510,7 @@ def select_food():
         })
         
     except Exception as e:
-        print(f"❌ Error recording food selection: {e}")
+        logger.error("❌ Error recording food selection: %s", e)
         return jsonify({"error": "Failed to record food selection"}), 500
 
 @food_api.route("/rate-food", methods=["POST"])
@@ -361,18 +536,8 @@ def rate_food():
         if rating < 1 or rating > 5:
             return jsonify({"error": "Rating must be between 1 and 5"}), 400
         
-        # Create a new log entry with the rating
-        log_entry = UserFoodLog(
-            user_id=user.id,
-            mood=emotion,
-            meal_time=meal_time,
-            food_type=food_type,
-            recommended_food=recommended_food,
-            feedback_rating=rating
-        )
-        
-        db.session.add(log_entry)
-        db.session.commit()
+        # Create a new log entry with the rating and update the food's preference state
+        log_entry = record_rating(user.id, emotion, meal_time, food_type, recommended_food, rating)
         
         return jsonify({
             "status": "success",
@@ -381,7 +546,8 @@ def rate_food():
         })
         
     except Exception as e:
-        print(f"❌ Error recording food rating: {e}")
+        logger.error("❌ Error recording food rating: %s", e)
+        db.session.rollback()
         return jsonify({"error": "Failed to record food rating"}), 500
 
 @explanation_api.route("/explain-recommendation", methods=["POST"])
@@ -448,9 +614,40 @@ def get_user_logs():
         })
         
     except Exception as e:
-        print(f"❌ Error fetching food logs: {e}")
+        logger.error("❌ Error fetching food logs: %s", e)
         return jsonify({"error": "Failed to fetch food logs"}), 500
 
+@admin_api.route("/metrics", methods=["GET"])
+@admin_auth
+def get_metrics():
+    """Request, inference, recommendation stage, cache and DB pool metrics of every worker in Prometheus format"""
+    sync_process_gauges(db.engine, force=True)
+    return Response(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@admin_api.route("/models", methods=["GET"])
+@admin_auth
+def get_model_status():
+    """Active, requested and available recommendation model versions and the last reload of this worker"""
+    return jsonify(model_registry.status())
+
+@admin_api.route("/models/reload", methods=["POST"])
+@admin_auth
+def reload_models():
+    """
+    Load a model version in the background and swap it in once it passes a smoke prediction.
+    Only then is it requested from the other workers, which pick it up within MODEL_VERSION_POLL_INTERVAL seconds
+    """
+    data = request.get_json(silent=True) or {}
+    version = data.get("version") or BASE_MODEL_VERSION
+    
+    try:
+        if not model_registry.reload(version, publish=True):
+            return jsonify({"error": "A model reload is already running", **model_registry.status()}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(model_registry.status()), 202
+
 # User Management Endpoints
 @admin_api.route("/users", methods=["GET"])
 @admin_auth
@@ -475,7 +672,7 @@ def get_all_users():
             "users": users_data
         })
     except Exception as e:
-        print(f"Error fetching users: {e}")
+        logger.error("Error fetching users: %s", e)
         return jsonify({"error": "Failed to fetch users"}), 500
 
 @admin_api.route("/users/<int:user_id>", methods=["GET"])
@@ -519,7 +716,7 @@ def get_user_details(user_id):
             "user": user_data
         })
     except Exception as e:
-        print(f"Error fetching user details: {e}")
+        logger.error("Error fetching user details: %s", e)
         return jsonify({"error": "Failed to fetch user details"}), 500
 
 @admin_api.route("/users/<int:user_id>", methods=["PUT"])
@@ -561,7 +758,7 @@ def update_user(user_id):
             "message": "User updated successfully"
         })
     except Exception as e:
-        print(f"Error updating user: {e}")
+        logger.error("Error updating user: %s", e)
         return jsonify({"error": "Failed to update user"}), 500
 
 @admin_api.route("/users/<int:user_id>/reset-password", methods=["POST"])
@@ -592,7 +789,7 @@ def reset_user_password(user_id):
             "new_password": new_password  # In production, you wouldn't return this
         })
     except Exception as e:
-        print(f"Error resetting password: {e}")
+        logger.error("Error resetting password: %s", e)
         return jsonify({"error": "Failed to reset password"}), 500
 
 # Analytics Endpoints
@@ -677,7 +874,7 @@ def get_dashboard_stats():
             }
         })
     except Exception as e:
-        print(f"Error fetching dashboard stats: {e}")
+        logger.error("Error fetching dashboard stats: %s", e)
         return jsonify({"error": "Failed to fetch dashboard statistics"}), 500
 
 @admin_api.route("/food-trends", methods=["GET"])
@@ -729,7 +926,7 @@ def get_food_trends():
             "trends": trends_data
         })
     except Exception as e:
-        print(f"Error fetching food trends: {e}")
+        logger.error("Error fetching food trends: %s", e)
         return jsonify({"error": "Failed to fetch food trends"}), 500
 
 # System Configuration Endpoints
@@ -751,15 +948,17 @@ def delete_user(user_id):
         
         # Delete all related food logs first (assuming cascade delete is not set up)
         UserFoodLog.query.filter_by(user_id=user_id).delete()
+        UserFoodPreference.query.filter_by(user_id=user_id).delete()
         
         # Delete the user
         db.session.delete(user)
         db.session.commit()
+        invalidate_user_history(user_id)
         
         return jsonify({
             "status": "success",
             "message": "User deleted successfully"
         })
     except Exception as e:
-        print(f"Error deleting user: {e}")
+        logger.error("Error deleting user: %s", e)
         return jsonify({"error": "Failed to delete user"}), 500
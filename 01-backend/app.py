@@ -1,8 +1,15 @@
 from flask import Flask
 from flask_cors import CORS
 from database.config import Config
+from logging_config import configure_logging
+
+# Set up logging before the modules below create their loggers
+configure_logging()
+
 from database.db_init import db, init_db  
 from api.routes import auth_api, emotion_api, food_api, explanation_api, admin_api
+from metrics import init_metrics
+from models.scoring_pool import init_scoring_pool
 
 app = Flask(__name__)
 CORS(app)
@@ -10,10 +17,16 @@ app.config.from_object(Config)
 
 db.init_app(app)  
 
+# Request counts and latency per blueprint route, served at /api/admin/metrics
+init_metrics(app)
+
 # Initialize database when app is created - this will run with 'flask run'
 with app.app_context():
     init_db()
 
+# Fork the scoring processes (SCORING_POOL_SIZE > 0) before any request thread starts
+init_scoring_pool()
+
 app.register_blueprint(auth_api, url_prefix='/api/auth')
 app.register_blueprint(emotion_api, url_prefix='/api/emotion')
 app.register_blueprint(food_api, url_prefix='/api/food')
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+import argparse
+import time
+from datetime import date
+from sqlalchemy import insert
+
+# Rows per INSERT statement; keeps the bound parameter count well under driver limits
+INSERT_BATCH_SIZE = 1000
+
+# Columns a user_food_log row can be written with
+FOOD_LOG_COLUMNS = ['user_id', 'mood', 'meal_time', 'food_type', 'recommended_food', 'feedback_rating']
+
+def insert_food_logs(rows, batch_size=INSERT_BATCH_SIZE):
+    """
+    Insert user_food_log rows (dicts keyed by FOOD_LOG_COLUMNS) and return the set of their
+    new ids, which says nothing about which id belongs to which row. The caller commits.
+
+    The rows are passed as one executemany, which SQLAlchemy sends as multi-row
+    INSERT ... VALUES ... RETURNING id statements of up to batch_size rows, compiled once
+    """
+    from database.db_init import UserFoodLog, db
+
+    if not rows:
+        return []
+
+    rows = [{column: row.get(column) for column in FOOD_LOG_COLUMNS} for row in rows]
+    result = db.session.execute(
+        insert(UserFoodLog).returning(UserFoodLog.id),
+        rows,
+        execution_options={'insertmanyvalues_page_size': batch_size}
+    )
+    # Matching ids to rows (sort_by_parameter_order) makes some drivers fall back to one INSERT
+    # per row, and a sequence cache or concurrent inserts can hand the ids out in any order
+    return {row_id for (row_id,) in result}
+
+def benchmark(row_counts=(10, 100, 1000), repeats=3):
+    """
+    Time one ORM object per row against insert_food_logs for each row count.
+    Everything runs inside a transaction that is rolled back, so no rows are kept
+    """
+    from database.db_init import UserFoodLog, User, db
+
+    user = User(name="Benchmark", email="bulk-writes-benchmark@example.com",
+                password_hash="-", date_of_birth=date(2000, 1, 1))
+    db.session.add(user)
+    db.session.flush()
+
+    def make_rows(count):
+        return [
+            {
+                'user_id': user.id,
+                'mood': 'happy',
+                'meal_time': 'Lunch',
+                'food_type': '',
+                'recommended_food': f"Food {i}",
+                'feedback_rating': 3
+            }
+            for i in range(count)
+        ]
+
+    def orm_insert(rows):
+        for row in rows:
+            db.session.add(UserFoodLog(**row))
+        db.session.flush()
+
+    try:
+        print(f"{'rows':>8}{'ORM ms':>12}{'bulk ms':>12}{'ORM rows/s':>14}{'bulk rows/s':>14}")
+        for count in row_counts:
+            timings = {}
+            for label, write in [('orm', orm_insert), ('bulk', insert_food_logs)]:
+                samples = []
+                for _ in range(repeats):
+                    rows = make_rows(count)
+                    start = time.perf_counter()
+                    write(rows)
+                    samples.append(time.perf_counter() - start)
+                timings[label] = min(samples)
+            print(f"{count:>8}{timings['orm'] * 1000:>12.2f}{timings['bulk'] * 1000:>12.2f}"
+                  f"{count / timings['orm']:>14.0f}{count / timings['bulk']:>14.0f}")
+    finally:
+        db.session.rollback()
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bulk user_food_log writes')
+    parser.add_argument('action', choices=['bench'],
+                        help='compare per-row ORM inserts with multi-row INSERT ... RETURNING (rolled back)')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000], help='Row counts to benchmark')
+    args = parser.parse_args()
+
+    from database.db_init import app
+
+    with app.app_context():
+        benchmark(args.rows)
@@ -50,6 +50,29 @@ class UserFoodLog(db.Model):
     # Metadata
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
 
+class UserFoodPreference(db.Model):
+    """Current preference state of a food in one context, maintained from user_food_log ratings"""
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "mood", "meal_time", "food_type", "food", name="uq_user_food_preference"),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    
+    # Context and food
+    mood = db.Column(db.String(50), nullable=False)
+    meal_time = db.Column(db.String(50), nullable=False)
+    food_type = db.Column(db.String(50), nullable=False, default="")  # "" = any food type
+    food = db.Column(db.String(255), nullable=False)
+    
+    # State after replaying every rating of this food in this context
+    state = db.Column(db.String(10), nullable=False, default="neutral")  # liked, neutral or disliked
+    consecutive_low = db.Column(db.Integer, nullable=False, default=0)  # Low ratings since last liked
+    latest_rating = db.Column(db.Integer)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
 def seed_default_users():
     admin_email = "admin@example.com"
     user_email = "user@example.com"
@@ -103,6 +126,22 @@ def check_tables_exist():
         logger.error(f"Error checking tables: {e}")
         return False
 
+def ensure_preference_table():
+    """Create the user_food_preference table if it is missing and backfill it from user_food_log"""
+    try:
+        inspector = db.inspect(db.engine)
+        if "user_food_preference" in inspector.get_table_names():
+            return
+        
+        UserFoodPreference.__table__.create(db.engine)
+        logger.info("✅ Created table 'user_food_preference'")
+        
+        from models.preference_state import rebuild_preference_state
+        count = rebuild_preference_state()
+        logger.info(f"✅ Backfilled {count} food preference states from user_food_log")
+    except Exception as e:
+        logger.error(f"Error creating food preference table: {e}")
+
 def find_pg_bin_path(binary_name):
     """Find path to PostgreSQL binary on Windows"""
     if os.name != 'nt':  # Not Windows
@@ -259,6 +298,7 @@ def init_db():
                 
                 if restore_success:
                     logger.info("✅ Database restored successfully from SQL file after reset")
+                    ensure_preference_table()
                     return
                 else:
                     logger.warning("⚠️ Failed to restore from SQL file after reset, creating new database from scratch")
@@ -278,6 +318,7 @@ def init_db():
             
             if restore_success:
                 logger.info("✅ Database restored successfully from SQL file")
+                ensure_preference_table()
                 return
             else:
                 logger.warning("⚠️ Failed to restore from SQL file, creating new database from scratch")
@@ -285,6 +326,7 @@ def init_db():
             logger.warning(f"No SQL file found at {sql_file_path}")
     else:
         logger.info("✅ Tables already exist in database")
+        ensure_preference_table()
         return
     
     # If we get here, we need to create tables and seed data
@@ -0,0 +1,106 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+# Listener thread writing queued records, started once by configure_logging() with _listener_format
+_listener = None
+_listener_format = None
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger and message, plus the structured
+    fields passed as extra={'fields': {...}}
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class DebugSampler(logging.Filter):
+    """Keep every record at INFO and above, and only a random share (rate) of DEBUG records"""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1.0 or random.random() < self.rate
+
+def parse_levels(spec):
+    """Parse 'module=LEVEL,module=LEVEL' into {module: level}, skipping malformed entries"""
+    levels = {}
+    for item in spec.split(','):
+        name, sep, level = item.strip().partition('=')
+        level = level.strip().upper()
+        if sep and name.strip() and isinstance(logging.getLevelName(level), int):
+            levels[name.strip()] = level
+    return levels
+
+def configure_logging(default_format="json"):
+    """
+    Route all logging through a queue so request threads never wait on stream I/O.
+
+    Settings (read from the environment when called):
+    - LOG_LEVEL: root level (default INFO)
+    - LOG_LEVELS: per-module levels, e.g. models.food_recommendation_model=DEBUG,werkzeug=WARNING
+    - LOG_FORMAT: json or text (default default_format)
+    - LOG_DEBUG_SAMPLE_RATE: share of DEBUG records kept (default 1.0)
+    """
+    global _listener, _listener_format
+
+    if _listener is not None:
+        return
+    _listener_format = default_format
+
+    log_format = os.getenv("LOG_FORMAT", default_format).lower()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    for name, level in parse_levels(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+def _restart_listener_after_fork():
+    """A forked child (e.g. a scoring pool worker) has the queue handler but not the listener thread"""
+    global _listener
+
+    if _listener is not None:
+        _listener = None
+        configure_logging(_listener_format)
+
+# Only POSIX can fork; elsewhere there are no forked children to restart it in
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+import argparse
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Collect metrics (METRICS_ENABLED=0 turns every call into a no-op)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Every worker process writes its own file here; clear it before starting the server
+METRICS_DIR = Path(os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "food-recommendation-metrics")))
+
+# Seconds between refreshes of the per-process gauges (caches, DB pool) after a request
+METRICS_SYNC_INTERVAL = float(os.getenv("METRICS_SYNC_INTERVAL", "5"))
+
+# Latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help); histograms and counters are summed over processes, gauges are reported per process
+METRICS = {
+    'http_requests_total': ('counter', 'HTTP requests by blueprint, route, method and status'),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by blueprint and route'),
+    'emotion_inference_duration_seconds': ('histogram', 'Emotion model inference latency'),
+    'scoring_queue_wait_seconds': ('histogram', 'Wait of scoring jobs before a scoring pool process starts them (SCORING_POOL_SIZE>0)'),
+    'recommendation_stage_duration_seconds': ('histogram', 'Wall time of recommend-food stages (STAGE_TIMING=1)'),
+    'recommendation_stage_cpu_seconds_total': ('counter', 'CPU time of recommend-food stages (STAGE_TIMING=1)'),
+    'user_history_cache_events_total': ('counter', 'User history cache hits, misses, evictions, expirations and invalidations'),
+    'user_history_cache_entries': ('gauge', 'Users held in the user history cache'),
+    'db_pool_connections': ('gauge', 'Database pool connections by state')
+}
+
+# One entry of a metrics file: key length, key (UTF-8, padded to 8 bytes), float64 value
+_HEADER = struct.Struct('<Q')
+_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+_INITIAL_FILE_SIZE = 64 * 1024
+
+class MetricsFile:
+    """
+    Append-only key/value file of one process, memory-mapped.
+
+    Each process is the only writer of its file, so counters from forked workers never
+    race; readers sum the files of every process. The header holds the used size and
+    is updated after an entry is complete, so a reader never sees a partial key
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(_INITIAL_FILE_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._positions = {}  # key -> offset of its value
+        for key, _, offset in read_entries(self._map):
+            self._positions[key] = offset
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+
+    def _grow(self, needed):
+        size = len(self._map)
+        while size < needed:
+            size *= 2
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def _offset(self, key):
+        offset = self._positions.get(key)
+        if offset is not None:
+            return offset
+
+        encoded = key.encode('utf-8')
+        padded = (_LENGTH.size + len(encoded) + 7) // 8 * 8
+        if self._used + padded + _VALUE.size > len(self._map):
+            self._grow(self._used + padded + _VALUE.size)
+
+        _LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _LENGTH.size:self._used + _LENGTH.size + len(encoded)] = encoded
+        offset = self._used + padded
+        _VALUE.pack_into(self._map, offset, 0.0)
+        self._used = offset + _VALUE.size
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = offset
+        return offset
+
+    def inc(self, key, amount=1.0):
+        offset = self._offset(key)
+        _VALUE.pack_into(self._map, offset, _VALUE.unpack_from(self._map, offset)[0] + amount)
+
+    def set(self, key, value):
+        _VALUE.pack_into(self._map, self._offset(key), value)
+
+def read_entries(buffer):
+    """(key, value, value offset) of every complete entry in a metrics file buffer"""
+    used = _HEADER.unpack_from(buffer, 0)[0]
+    position = _HEADER.size
+    while position + _LENGTH.size <= used:
+        length = _LENGTH.unpack_from(buffer, position)[0]
+        key = bytes(buffer[position + _LENGTH.size:position + _LENGTH.size + length]).decode('utf-8')
+        offset = position + (_LENGTH.size + length + 7) // 8 * 8
+        if offset + _VALUE.size > used:
+            break
+        yield key, _VALUE.unpack_from(buffer, offset)[0], offset
+        position = offset + _VALUE.size
+
+def metric_key(name, labels):
+    """Storage key of a sample: JSON of the name and its sorted labels"""
+    return json.dumps([name, sorted(labels.items())], separators=(',', ':'))
+
+# File of the current process, reopened after a fork
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+_last_sync = 0.0
+
+def _with_store(update):
+    global _store, _store_pid
+    with _store_lock:
+        if _store_pid != os.getpid():
+            _store = MetricsFile(METRICS_DIR / f"metrics_{os.getpid()}.db")
+            _store_pid = os.getpid()
+        update(_store)
+
+def inc(name, labels=None, amount=1.0):
+    """Add to a counter"""
+    if METRICS_ENABLED:
+        _with_store(lambda store: store.inc(metric_key(name, labels or {}), amount))
+
+def set_value(name, labels=None, value=0.0):
+    """Set a per-process value (a gauge, or a counter the process already keeps itself)"""
+    if METRICS_ENABLED:
+        _with_store(lambda store: store.set(metric_key(name, labels or {}), value))
+
+def observe(name, value, labels=None, buckets=LATENCY_BUCKETS):
+    """Add a value to a histogram; the bucket counts are stored per bucket and made cumulative on export"""
+    if not METRICS_ENABLED:
+        return
+    labels = labels or {}
+    bound = next((b for b in buckets if value <= b), '+Inf')
+
+    def update(store):
+        store.inc(metric_key(name + '_bucket', dict(labels, le=str(bound))))
+        store.inc(metric_key(name + '_sum', labels), value)
+        store.inc(metric_key(name + '_count', labels))
+    _with_store(update)
+
+@contextmanager
+def timed(name, labels=None):
+    """Observe the wall time of a block in a histogram"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, labels)
+
+def observe_stage_timer(timer):
+    """Record the stages of a finished StageTimer (see models/stage_timer.py)"""
+    for stage, (wall_ms, cpu_ms, _) in timer.stages.items():
+        observe('recommendation_stage_duration_seconds', wall_ms / 1000, {'stage': stage})
+        inc('recommendation_stage_cpu_seconds_total', {'stage': stage}, cpu_ms / 1000)
+
+def sync_process_gauges(engine=None, force=False):
+    """Copy the user history cache counters and DB pool state of this process into its file"""
+    global _last_sync
+    from models.history_cache import user_history_cache
+
+    if not METRICS_ENABLED:
+        return
+    now = time.monotonic()
+    if not force and now - _last_sync < METRICS_SYNC_INTERVAL:
+        return
+    _last_sync = now
+
+    pid = str(os.getpid())
+    stats = user_history_cache.stats()
+    for event in ['hits', 'misses', 'evictions', 'expirations', 'invalidations']:
+        set_value('user_history_cache_events_total', {'event': event, 'pid': pid}, stats[event])
+    set_value('user_history_cache_entries', {'pid': pid}, stats['size'])
+
+    pool = getattr(engine, 'pool', None)
+    for state, method in [('size', 'size'), ('checked_in', 'checkedin'),
+                          ('checked_out', 'checkedout'), ('overflow', 'overflow')]:
+        if callable(getattr(pool, method, None)):
+            set_value('db_pool_connections', {'state': state, 'pid': pid}, getattr(pool, method)())
+
+def _process_alive(pid):
+    """Whether a process still runs, without signalling it (os.kill on Windows terminates it)"""
+    try:
+        pid = int(pid)
+    except (TypeError, ValueError):
+        return True
+
+    if os.name == 'nt':
+        import ctypes
+
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return ctypes.get_last_error() == 5  # Access denied: it exists but belongs to someone else
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return True
+            return exit_code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def collect():
+    """Merge the files of every process into {name: {labels tuple: value}}"""
+    samples = {}
+    for path in sorted(METRICS_DIR.glob("metrics_*.db")):
+        with open(path, 'rb') as f:
+            buffer = f.read()
+        if len(buffer) < _HEADER.size:
+            continue
+        for key, value, _ in read_entries(buffer):
+            name, labels = json.loads(key)
+            labels = tuple(tuple(label) for label in labels)
+            base = name.rsplit('_', 1)[0] if name.endswith(('_bucket', '_sum', '_count')) else name
+            if METRICS.get(base, ('counter',))[0] == 'gauge' and not _process_alive(dict(labels).get('pid')):
+                continue
+            if METRICS.get(base, ('counter',))[0] != 'gauge':
+                # Summed over processes; the pid label only keeps per-process counters apart
+                labels = tuple(label for label in labels if label[0] != 'pid')
+            series = samples.setdefault(name, {})
+            series[labels] = series.get(labels, 0.0) + value
+    return samples
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = [
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    ]
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+def _format_value(value):
+    return repr(float(value))
+
+def render_prometheus(samples=None):
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    samples = collect() if samples is None else samples
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind != 'histogram':
+            for labels, value in sorted(samples.get(name, {}).items()):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            continue
+
+        # Stored bucket counts are per bucket; exported ones are cumulative and always end in +Inf
+        series = {}
+        for labels, value in samples.get(name + '_bucket', {}).items():
+            base = tuple(label for label in labels if label[0] != 'le')
+            series.setdefault(base, {})[dict(labels)['le']] = value
+        for base in sorted(series):
+            bounds = series[base]
+            cumulative = 0.0
+            for bound in [str(b) for b in LATENCY_BUCKETS] + ['+Inf']:
+                cumulative += bounds.get(bound, 0.0)
+                lines.append(f"{name}_bucket{_format_labels(base + (('le', bound),))} {_format_value(cumulative)}")
+            lines.append(f"{name}_sum{_format_labels(base)} {_format_value(samples.get(name + '_sum', {}).get(base, 0.0))}")
+            lines.append(f"{name}_count{_format_labels(base)} {_format_value(samples.get(name + '_count', {}).get(base, 0.0))}")
+    return '\n'.join(lines) + '\n'
+
+def init_metrics(app):
+    """Count and time every request of a Flask app by blueprint and route"""
+    from flask import g, request
+
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        labels = {'blueprint': request.blueprint or 'app', 'route': route}
+        observe('http_request_duration_seconds', time.perf_counter() - start, labels)
+        inc('http_requests_total', dict(labels, method=request.method, status=str(response.status_code)))
+        try:
+            from database.db_init import db
+            sync_process_gauges(db.engine)
+        except Exception:
+            pass
+        return response
+
+def reset():
+    """Delete the metrics files of every process"""
+    for path in METRICS_DIR.glob("metrics_*.db"):
+        path.unlink()
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Multiprocess metrics files')
+    parser.add_argument('action', choices=['show', 'reset'],
+                        help='print the merged metrics in Prometheus format, or delete the files before a restart')
+    args = parser.parse_args()
+
+    if args.action == 'show':
+        print(render_prometheus(), end='')
+    elif args.action == 'reset':
+        reset()
+        print(f"✅ Cleared metrics in {METRICS_DIR}")
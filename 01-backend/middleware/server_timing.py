@@ -0,0 +1,25 @@
+from flask import make_response
+from functools import wraps
+from models.stage_timer import begin_request_timing, end_request_timing
+from metrics import observe_stage_timer
+
+def server_timing(f):
+    """
+    Time the stages of a view (see models/stage_timer.py), report them in a Server-Timing header
+    and add them to the stage metrics
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        timer = begin_request_timing()
+        if timer is None:
+            return f(*args, **kwargs)
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        finally:
+            end_request_timing(timer)
+            observe_stage_timer(timer)
+
+        response.headers['Server-Timing'] = timer.server_timing()
+        return response
+    return decorated_function
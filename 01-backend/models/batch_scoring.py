@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+import argparse
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Worker processes of an offline scoring run (0 scores in the calling process)
+BATCH_SCORING_WORKERS = int(os.getenv("BATCH_SCORING_WORKERS", str(os.cpu_count() or 1)))
+
+# Input rows sent to a worker at once; rows of the same user within a chunk are scored as one batch
+BATCH_SCORING_CHUNK_SIZE = int(os.getenv("BATCH_SCORING_CHUNK_SIZE", "256"))
+
+OUTPUT_FIELDS = ['user_id', 'emotion', 'meal_time', 'food_type', 'status', 'food', 'type', 'food_state',
+                 'personalization_reason', 'image_url', 'alternatives', 'context_reset', 'error']
+
+def file_format(path, given=None):
+    """'csv' or 'ndjson', from the given format or the file extension"""
+    if given:
+        return given
+    return 'ndjson' if str(path).lower().endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+def read_contexts(path, input_format=None):
+    """
+    Yield the (user_id, emotion, meal_time, food_type) rows of a CSV file with those columns
+    or an NDJSON file with those keys, in file order. Unreadable rows are yielded as an error string
+    """
+    with open(path, newline='') as f:
+        if file_format(path, input_format) == 'csv':
+            rows = csv.DictReader(f)
+        else:
+            rows = (line for line in f if line.strip())
+
+        for number, row in enumerate(rows, start=1):
+            if isinstance(row, str):
+                try:
+                    row = json.loads(row)
+                except ValueError as e:
+                    yield f"Line {number}: invalid JSON: {e}"
+                    continue
+            if not isinstance(row, dict):
+                yield f"Line {number}: expected an object"
+                continue
+            yield (row.get('user_id'), row.get('emotion'), row.get('meal_time'), row.get('food_type') or None)
+
+def chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def result_record(user_id, emotion, meal_time, food_type, result):
+    """Output record of one context from a personalized_recommendation result"""
+    recommendation = (result.get('recommendation') or {}) if result.get('status') == 'success' else {}
+    needs_reset = result.get('status') == 'context_reset'
+    return {
+        'user_id': user_id,
+        'emotion': emotion,
+        'meal_time': meal_time,
+        'food_type': food_type,
+        'status': 'success' if recommendation else 'context_reset' if needs_reset else 'error',
+        'food': recommendation.get('food'),
+        'type': recommendation.get('type'),
+        'food_state': recommendation.get('food_state'),
+        'personalization_reason': recommendation.get('personalization_reason'),
+        'image_url': recommendation.get('image_url'),
+        'alternatives': [alternative.get('food') for alternative in result.get('alternatives') or []],
+        'context_reset': bool(result.get('context_reset')),
+        'error': None if recommendation or needs_reset else result.get('error', 'No recommendation'),
+    }
+
+def error_record(row, error):
+    user_id, emotion, meal_time, food_type = row if isinstance(row, tuple) else (None, None, None, None)
+    return dict(result_record(user_id, emotion, meal_time, food_type, {}), error=error)
+
+def context_error(row):
+    """Why a (user_id, emotion, meal_time, food_type) row cannot be scored, or None"""
+    from models.food_recommendation_model import SUPPORTED_EMOTIONS, SUPPORTED_FOOD_TYPES, SUPPORTED_MEAL_TYPES
+
+    user_id, emotion, meal_time, food_type = row
+    try:
+        int(user_id)
+    except (TypeError, ValueError):
+        return f"Invalid user_id: {user_id}"
+    if not isinstance(emotion, str) or emotion.lower() not in SUPPORTED_EMOTIONS:
+        return f"Unsupported emotion: {emotion}. Valid emotions are: {', '.join(SUPPORTED_EMOTIONS)}"
+    if not isinstance(meal_time, str) or meal_time not in SUPPORTED_MEAL_TYPES:
+        return f"Unsupported meal type: {meal_time}. Valid meal types are: {', '.join(SUPPORTED_MEAL_TYPES)}"
+    if food_type is not None and (not isinstance(food_type, str) or food_type not in SUPPORTED_FOOD_TYPES):
+        return f"Unsupported food type: {food_type}. Valid food types are: {', '.join(SUPPORTED_FOOD_TYPES)}"
+    return None
+
+def score_chunk(rows):
+    """
+    Records of a chunk of input rows, in row order. The rows of each user are scored with one
+    personalized_recommendation_batch call: one preference query and one batched scoring pass per user.
+    Rows that cannot be scored get their own error record and are left out of their user's batch.
+    Scoring is read-only: a context that would be auto-reset gets status 'context_reset' instead
+    """
+    from database.db_init import app, User
+    from models.context_snapshot import user_age
+    from models.food_recommendation_model import personalized_recommendation_batch
+
+    records = [None] * len(rows)
+    by_user = {}
+    for i, row in enumerate(rows):
+        error = row if isinstance(row, str) else context_error(row)
+        if error is not None:
+            records[i] = error_record(row, error)
+            continue
+        by_user.setdefault(int(row[0]), []).append(i)
+
+    with app.app_context():
+        users = {user.id: user for user in User.query.filter(User.id.in_(list(by_user))).all()} if by_user else {}
+        for user_id, indexes in by_user.items():
+            user = users.get(user_id)
+            if user is None:
+                for i in indexes:
+                    records[i] = error_record(rows[i], "User not found")
+                continue
+
+            contexts = [tuple(rows[i][1:]) for i in indexes]
+            try:
+                results = personalized_recommendation_batch(user_id, user_age(user), contexts, auto_reset=False)
+            except Exception as e:
+                results = [{'status': 'error', 'error': str(e)}] * len(contexts)
+            for i, (emotion, meal_time, food_type), result in zip(indexes, contexts, results):
+                records[i] = result_record(user_id, emotion, meal_time, food_type, result)
+    return records
+
+class RecordWriter:
+    """Writes output records as CSV rows (alternatives joined with '|') or NDJSON lines"""
+
+    def __init__(self, f, output_format):
+        self.f = f
+        self.output_format = output_format
+        self.writer = None
+        if output_format == 'csv':
+            self.writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
+            self.writer.writeheader()
+
+    def write(self, record):
+        if self.writer is not None:
+            self.writer.writerow(dict(record, alternatives='|'.join(record['alternatives'])))
+        else:
+            self.f.write(json.dumps(record) + '\n')
+
+def score_file(input_path, output_path, workers=BATCH_SCORING_WORKERS, chunk_size=BATCH_SCORING_CHUNK_SIZE,
+               input_format=None, output_format=None):
+    """
+    Score every context of an input file into an output file ('-' for stdout), in input order.
+    With stdout as the output, messages printed while loading and scoring go to stderr instead.
+    Returns (records, errors); contexts needing a reset are not errors
+    """
+    output_format = file_format(output_path, output_format)
+    if output_path == '-':
+        out = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            return score_contexts(input_path, out, output_format, workers, chunk_size, input_format)
+
+    with open(output_path, 'w', newline='') as out:
+        return score_contexts(input_path, out, output_format, workers, chunk_size, input_format)
+
+def score_contexts(input_path, out, output_format, workers, chunk_size, input_format=None):
+    """
+    Score every context of an input file into an open output file, see score_file.
+
+    Chunks are scored by forked worker processes that start with the models already loaded here;
+    at most two chunks per worker are in flight, so the input is streamed rather than held in memory
+    and records are written as soon as their chunk and all chunks before it are done.
+    Nothing is written to the database, see score_chunk
+    """
+    from database.db_init import app, db
+    from models import food_recommendation_model as frm
+
+    if not frm.model_loaded:
+        raise RuntimeError("Recommendation model not loaded")
+
+    writer = RecordWriter(out, output_format)
+    records = errors = 0
+
+    def write(chunk_records):
+        nonlocal records, errors
+        for record in chunk_records:
+            writer.write(record)
+            records += 1
+            errors += record['status'] == 'error'
+
+    rows = chunks(read_contexts(input_path, input_format), chunk_size)
+    if workers > 0 and 'fork' not in multiprocessing.get_all_start_methods():
+        print("⚠️ Worker processes need the 'fork' start method, not available on this platform: scoring in-process")
+        workers = 0
+    if workers <= 0:
+        for chunk in rows:
+            write(score_chunk(chunk))
+        return records, errors
+
+    # Forked workers must open their own database connections
+    with app.app_context():
+        db.engine.dispose()
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as executor:
+        pending = deque()
+        for chunk in rows:
+            pending.append(executor.submit(score_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+    return records, errors
+
+def write_sample_contexts(path, count, seed=0):
+    """Random contexts of the users in the database, grouped by user like a daily export"""
+    from database.db_init import app, User
+    from models.food_recommendation_model import SUPPORTED_EMOTIONS, SUPPORTED_FOOD_TYPES, SUPPORTED_MEAL_TYPES
+
+    rng = random.Random(seed)
+    with app.app_context():
+        user_ids = [user.id for user in User.query.all()]
+    if not user_ids:
+        raise RuntimeError("No users in the database")
+
+    rows = [
+        (rng.choice(user_ids), rng.choice(SUPPORTED_EMOTIONS), rng.choice(SUPPORTED_MEAL_TYPES),
+         rng.choice([''] + list(SUPPORTED_FOOD_TYPES)))
+        for _ in range(count)
+    ]
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['user_id', 'emotion', 'meal_time', 'food_type'])
+        writer.writerows(sorted(rows, key=lambda row: row[0]))
+
+def benchmark(input_path, count=2000, workers=(0, BATCH_SCORING_WORKERS), chunk_size=BATCH_SCORING_CHUNK_SIZE):
+    """
+    Contexts per second of personalized_recommendation called once per context, against
+    score_file with each worker count (0 scores in this process, batched per user)
+    """
+    from database.db_init import app, User
+    from models.context_snapshot import user_age
+    from models.food_recommendation_model import personalized_recommendation
+
+    if input_path is None:
+        input_path = f"/tmp/batch_scoring_bench.{os.getpid()}.csv"
+        write_sample_contexts(input_path, count)
+    rows = [row for row in read_contexts(input_path) if isinstance(row, tuple)]
+
+    with app.app_context():
+        score_chunk(rows[:chunk_size])  # Warm up the scoring tables
+        ages = {user.id: user_age(user) for user in User.query.all()}
+        start = time.perf_counter()
+        for user_id, emotion, meal_time, food_type in rows:
+            user_id = int(user_id)
+            if user_id in ages:
+                personalized_recommendation(user_id, emotion, ages[user_id], meal_time, food_type, auto_reset=False)
+        elapsed = time.perf_counter() - start
+    print(f"Batch scoring: {len(rows)} contexts, {os.cpu_count()} CPUs")
+    print(f"{'mode':<20}{'contexts/s':>12}{'seconds':>10}")
+    print(f"{'one by one':<20}{len(rows) / elapsed:>12.1f}{elapsed:>10.2f}")
+
+    for size in workers:
+        start = time.perf_counter()
+        score_file(input_path, os.devnull, size, chunk_size, output_format='ndjson')
+        elapsed = time.perf_counter() - start
+        print(f"{f'batched, {size} workers':<20}{len(rows) / elapsed:>12.1f}{elapsed:>10.2f}")
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Offline recommendation scoring of many user contexts')
+    parser.add_argument('action', choices=['run', 'sample', 'bench'],
+                        help='score an input file of contexts, write random contexts of the database users, '
+                             'or compare one-by-one scoring with batched scoring in worker processes')
+    parser.add_argument('--input', default=None,
+                        help='CSV or NDJSON file of user_id, emotion, meal_time, food_type contexts')
+    parser.add_argument('--output', default='-', help='CSV or NDJSON file for the results (- for stdout as NDJSON)')
+    parser.add_argument('--input-format', choices=['csv', 'ndjson'], default=None, help='Default from the extension')
+    parser.add_argument('--output-format', choices=['csv', 'ndjson'], default=None, help='Default from the extension')
+    parser.add_argument('--workers', type=int, nargs='+', default=[BATCH_SCORING_WORKERS],
+                        help='Worker processes (0 scores in this process); bench compares each value')
+    parser.add_argument('--chunk-size', type=int, default=BATCH_SCORING_CHUNK_SIZE, help='Input rows per worker task')
+    parser.add_argument('--count', type=int, default=2000, help='Contexts written by sample and bench')
+    args = parser.parse_args()
+
+    if args.action == 'run':
+        if not args.input:
+            parser.error('run needs --input')
+        output_format = args.output_format or ('ndjson' if args.output == '-' else None)
+        start = time.perf_counter()
+        records, errors = score_file(args.input, args.output, args.workers[0], args.chunk_size,
+                                     args.input_format, output_format)
+        elapsed = time.perf_counter() - start
+        print(f"✅ Scored {records} contexts ({errors} errors) in {elapsed:.1f}s, "
+              f"{records / max(elapsed, 1e-9):.0f} contexts/s", file=sys.stderr)
+    elif args.action == 'sample':
+        if not args.input:
+            parser.error('sample needs --input (the file to write)')
+        write_sample_contexts(args.input, args.count)
+        print(f"✅ Wrote {args.count} contexts to {args.input}")
+    elif args.action == 'bench':
+        benchmark(args.input, args.count, [0] + [count for count in args.workers if count > 0], args.chunk_size)
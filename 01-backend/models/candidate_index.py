@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+import argparse
+import os
+import threading
+import time
+import numpy as np
+
+# Foods passed to the forests per context when the eligible set is larger (0 scores every eligible food)
+CANDIDATE_K = int(os.getenv("CANDIDATE_K", "2000"))
+
+# Ratios above this all get a zero direct score factor, so they are equally far from the ideal
+MAX_IDEAL_RATIO = 5.0
+
+class CandidateIndex:
+    """
+    Nearest-to-ideal candidate generation in priority nutrient space.
+
+    For an emotion and age group each food is a vector of its priority nutrients divided by
+    their ideal values (the nutrient limits) and multiplied by the emotion's nutrient weights,
+    both taken from the DirectScoreTensor. The ideal profile is the weight vector itself
+    (every ratio at 1), and the weighted Manhattan distance to it is what the direct score
+    rewards: for ratios between 0.1 and 2 the direct score is 10 * (1 - distance).
+    A KD-tree per (emotion, age group, food type) is built over the foods select_candidate_foods
+    returns on first use, so a query only visits the nearest foods instead of the catalog.
+    """
+
+    def __init__(self, direct_scores):
+        self.direct_scores = direct_scores
+        self._trees = {}  # (emotion, age_group, food_type) -> (food ids, KDTree)
+        self._lock = threading.Lock()
+
+    def vectors(self, food_ids, emotion, age_group):
+        """Weighted ideal ratios (foods x nutrients) and the ideal point, or (None, None) without priorities"""
+        tensor = self.direct_scores
+        e = tensor._emotion_index.get(emotion)
+        g = tensor._age_group_index.get(age_group)
+        if e is None or g is None:
+            return None, None
+
+        weights = tensor.weights[e]
+        ideals = tensor.ideals[g]
+        # Nutrients the direct score skips (no weight, unusable ideal) carry no distance
+        cols = np.flatnonzero((weights > 0) & (ideals > 0))
+        if len(cols) == 0:
+            return None, None
+
+        ratios = tensor.values[np.asarray(food_ids)[:, None], cols] / ideals[cols]
+        # A missing value scores like a zero ratio
+        ratios = np.clip(np.nan_to_num(ratios, nan=0.0), 0.0, MAX_IDEAL_RATIO)
+        return ratios * weights[cols], weights[cols]
+
+    def _tree(self, food_ids, emotion, age_group, food_type):
+        from sklearn.neighbors import KDTree
+
+        key = (emotion, age_group, food_type or '')
+        entry = self._trees.get(key)
+        if entry is not None and np.array_equal(entry[0], food_ids):
+            return entry
+
+        vectors, ideal = self.vectors(food_ids, emotion, age_group)
+        entry = (np.array(food_ids), None if vectors is None else KDTree(vectors, metric='manhattan'), ideal)
+        with self._lock:
+            self._trees[key] = entry
+        return entry
+
+    def nearest(self, food_ids, emotion, age_group, food_type, k):
+        """
+        The k of food_ids closest to the ideal profile, in id order.
+        food_ids must be the select_candidate_foods result for this age group and food type
+        """
+        if k <= 0 or len(food_ids) <= k:
+            return food_ids
+
+        ids, tree, ideal = self._tree(food_ids, emotion, age_group, food_type)
+        if tree is None:
+            return food_ids
+
+        _, positions = tree.query(ideal[None, :], k=k)
+        return np.sort(ids[positions[0]])
+
+def recall_report(sizes=(10000, 100000), ks=(500, 1000, 2000, 5000), contexts=None, repeats=3, seed=0):
+    """
+    Compare recommendations from the top-K candidates with exhaustive scoring on synthetic catalogs.
+    Recall is the share of the exhaustive recommendation and alternatives that K still returns;
+    latency is the median ms of one live parallel_with_direct_scoring call
+    """
+    from models import food_recommendation_model as frm
+    from models.food_catalog import FoodCatalog
+    from models.pipeline_bench import BENCH_CONTEXTS, generate_catalog, use_catalog
+
+    contexts = contexts or BENCH_CONTEXTS
+    saved_k = frm.CANDIDATE_K
+
+    def run(context):
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            recommendation, alternatives = frm.parallel_with_direct_scoring(*context)
+            samples.append((time.perf_counter() - start) * 1000)
+        foods = [food['food'] for food in ([recommendation] if recommendation else []) + alternatives]
+        return foods, float(np.median(samples))
+
+    print(f"{'rows':>8}{'K':>8}{'top-1':>8}{'recall':>9}{'ms':>10}{'speedup':>10}")
+    try:
+        for rows in sizes:
+            catalog = FoodCatalog.from_dataframe(generate_catalog(rows, seed))
+            with use_catalog(catalog):
+                frm.CANDIDATE_K = 0
+                exhaustive = [run(context) for context in contexts]
+                exhaustive_ms = np.mean([ms for _, ms in exhaustive])
+                print(f"{rows:>8}{'all':>8}{'':>8}{'':>9}{exhaustive_ms:>10.2f}{'':>10}")
+
+                for k in ks:
+                    frm.CANDIDATE_K = k
+                    run(contexts[0])  # Builds the KD-trees outside the timing
+                    for context in contexts[1:]:
+                        run(context)
+                    results = [run(context) for context in contexts]
+
+                    top1 = np.mean([
+                        bool(foods) and bool(expected) and foods[0] == expected[0]
+                        for (foods, _), (expected, _) in zip(results, exhaustive)
+                    ])
+                    recall = np.mean([
+                        len(set(foods) & set(expected)) / len(expected) if expected else 1.0
+                        for (foods, _), (expected, _) in zip(results, exhaustive)
+                    ])
+                    ms = np.mean([ms for _, ms in results])
+                    print(f"{rows:>8}{k:>8}{top1:>8.0%}{recall:>9.0%}{ms:>10.2f}{exhaustive_ms / ms:>9.1f}x")
+    finally:
+        frm.CANDIDATE_K = saved_k
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Nutrient-space candidate generation')
+    parser.add_argument('action', choices=['report'],
+                        help='recall and latency of top-K candidates against exhaustive scoring')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='Synthetic catalog sizes')
+    parser.add_argument('--k', type=int, nargs='+', default=[500, 1000, 2000, 5000], help='Candidate counts')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed runs per context')
+    args = parser.parse_args()
+
+    recall_report(args.sizes, args.k, repeats=args.repeats)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+import argparse
+import time
+from contextlib import contextmanager
+from datetime import date
+from models.history_cache import cached_user_history
+
+class ContextSnapshot:
+    """
+    Rated history and food states of one (user, mood, meal_time, food_type) context.
+
+    A recommend-food request needs the same user_food_log rows for its statistics,
+    personalization and satisfaction estimate. The snapshot reads them once from the
+    user's history projection (see models/history_cache.py), loads the stored preference
+    states once, and is passed to every helper of the request. Call refresh() after
+    writing new ratings.
+    """
+
+    def __init__(self, user_id, emotion, meal_time, food_type=None):
+        self.user_id = user_id
+        self.emotion = emotion
+        self.meal_time = meal_time
+        self.food_type = food_type or None
+        self.refresh()
+
+    def refresh(self):
+        """Drop the fetched rows so the next access reads the database again"""
+        self._history = None
+        self._states = None
+
+    def matches(self, user_id, emotion, meal_time, food_type):
+        return (
+            user_id == self.user_id
+            and emotion.lower() == self.emotion.lower()
+            and meal_time == self.meal_time
+            and (food_type or None) == self.food_type
+        )
+
+    def history(self):
+        """Rated entries of the context as dicts (food, rating, food_type, timestamp), oldest id first"""
+        if self._history is None:
+            self._history = fetch_context_history(self.user_id, self.emotion, self.meal_time, self.food_type)
+        return self._history
+
+    def states(self):
+        """Stored preference states as (food, state, latest_rating)"""
+        if self._states is None:
+            from models.preference_state import load_context_preferences
+            self._states = load_context_preferences(self.user_id, self.emotion, self.meal_time, self.food_type)
+        return self._states
+
+def fetch_context_history(user_id, emotion, meal_time, food_type):
+    """Rated user_food_log rows of a context, taken from the user's cached history projection"""
+    mood = emotion.lower()
+    return [
+        {
+            'food': entry.food,
+            'rating': entry.rating,
+            'food_type': entry.food_type,
+            'timestamp': entry.timestamp
+        }
+        for entry in cached_user_history(user_id)
+        if entry.mood == mood
+        and entry.meal_time == meal_time
+        and (not food_type or entry.food_type == food_type)
+        and entry.rating is not None
+    ]
+
+def context_snapshot(snapshot, user_id, emotion, meal_time, food_type):
+    """The given snapshot if it covers this context, otherwise a fresh one"""
+    if snapshot is not None and snapshot.matches(user_id, emotion, meal_time, food_type):
+        return snapshot
+    return ContextSnapshot(user_id, emotion, meal_time, food_type)
+
+def context_snapshots(user_id, contexts):
+    """
+    ContextSnapshots of several (emotion, meal_time, food_type) contexts of one user, with the
+    preference states of all of them loaded by a single query
+    """
+    from models.preference_state import ANY_FOOD_TYPE, load_user_preferences
+
+    states = load_user_preferences(user_id, contexts)
+    snapshots = []
+    for emotion, meal_time, food_type in contexts:
+        snapshot = ContextSnapshot(user_id, emotion, meal_time, food_type)
+        snapshot._states = list(states[(emotion.lower(), meal_time, food_type or ANY_FOOD_TYPE)])
+        snapshots.append(snapshot)
+    return snapshots
+
+@contextmanager
+def counted_selects():
+    """Count the SELECTs sent to user_food_log and user_food_preference inside the block"""
+    from sqlalchemy import event
+    from database.db_init import db
+
+    counts = {'user_food_log': 0, 'user_food_preference': 0}
+
+    def count_select(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            for table in counts:
+                if f"FROM {table}" in statement:
+                    counts[table] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', count_select)
+    try:
+        yield counts
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_select)
+
+def user_age(user):
+    today = date.today()
+    birth = user.date_of_birth
+    return today.year - birth.year - ((today.month, today.day) < (birth.month, birth.day))
+
+def finish_context(user, emotion, meal_time, food_type, snapshot, result):
+    """Satisfaction estimate and context log of a personalized result, as recommend-food does"""
+    from models import food_recommendation_model as frm
+
+    food = result.get('recommendation', {}).get('food') if result.get('status') == 'success' else None
+    frm.predict_user_satisfaction(user.id, emotion, meal_time, food_type, food, snapshot=snapshot)
+    frm.log_recommendation_context(user.id, emotion, meal_time, food_type, food, snapshot=snapshot)
+
+def count_context_queries(user, emotion, meal_time, food_type=None, use_snapshot=True):
+    """
+    Run the recommend-food helper sequence for a user and count the SELECTs it sends
+    to user_food_log and user_food_preference. Read-only: a context needing an auto-reset
+    is left as it is (see personalized_recommendation's auto_reset)
+    """
+    from models import food_recommendation_model as frm
+
+    with counted_selects() as counts:
+        snapshot = ContextSnapshot(user.id, emotion, meal_time, food_type) if use_snapshot else None
+        frm.get_user_context_statistics(user.id, emotion, meal_time, food_type, snapshot=snapshot)
+        result = frm.personalized_recommendation(user.id, emotion, user_age(user), meal_time, food_type, snapshot=snapshot,
+                                                 auto_reset=False)
+        finish_context(user, emotion, meal_time, food_type, snapshot, result)
+
+    return counts, result.get('context_reset', False)
+
+def count_batch_queries(user, contexts):
+    """
+    Run the recommend-batch helper sequence for (emotion, meal_time, food_type) contexts and count
+    its SELECTs, as count_context_queries does for one context (read-only as well)
+    """
+    from models import food_recommendation_model as frm
+
+    with counted_selects() as counts:
+        snapshots = context_snapshots(user.id, contexts)
+        for (emotion, meal_time, food_type), snapshot in zip(contexts, snapshots):
+            frm.get_user_context_statistics(user.id, emotion, meal_time, food_type, snapshot=snapshot)
+        results = frm.personalized_recommendation_batch(user.id, user_age(user), contexts, snapshots=snapshots,
+                                                        auto_reset=False)
+        for (emotion, meal_time, food_type), snapshot, result in zip(contexts, snapshots, results):
+            finish_context(user, emotion, meal_time, food_type, snapshot, result)
+
+    return counts, results
+
+def compare_batch(user, contexts, repeat=5):
+    """
+    Time N sequential recommend-food sequences against one recommend-batch sequence for the same
+    contexts; returns the mean milliseconds of each and whether they recommend the same foods
+    """
+    from models import food_recommendation_model as frm
+
+    age = user_age(user)
+
+    def sequential():
+        results = []
+        for emotion, meal_time, food_type in contexts:
+            snapshot = ContextSnapshot(user.id, emotion, meal_time, food_type)
+            frm.get_user_context_statistics(user.id, emotion, meal_time, food_type, snapshot=snapshot)
+            result = frm.personalized_recommendation(user.id, emotion, age, meal_time, food_type, snapshot=snapshot,
+                                                     auto_reset=False)
+            finish_context(user, emotion, meal_time, food_type, snapshot, result)
+            results.append(result)
+        return results
+
+    timings = {}
+    outputs = {}
+    for name, run in [('sequential', sequential), ('batch', lambda: count_batch_queries(user, contexts)[1])]:
+        outputs[name] = run()  # Warm up the history projection and memoized tables
+        start = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        timings[name] = (time.perf_counter() - start) / repeat * 1000
+
+    same = [
+        (a.get('recommendation') or {}).get('food') == (b.get('recommendation') or {}).get('food')
+        for a, b in zip(outputs['sequential'], outputs['batch'])
+    ]
+    return timings['sequential'], timings['batch'], all(same)
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check the queries of a recommend-food request')
+    parser.add_argument('action', choices=['check', 'batch'],
+                        help='count user_food_log queries with and without a shared context snapshot, '
+                             'or compare a recommend-batch call with sequential recommend-food calls')
+    parser.add_argument('--user-id', type=int, required=True, help='User to run the request for')
+    parser.add_argument('--emotion', default='happy', help='Emotion of the context')
+    parser.add_argument('--meal-time', default='Lunch', help='Meal time of the context')
+    parser.add_argument('--food-type', default=None, help='Food type of the context')
+    parser.add_argument('--contexts', nargs='+', default=['happy:Breakfast', 'happy:Lunch', 'happy:Dinner', 'sad:Snack',
+                                                          'angry:Lunch:Vegetables', 'neutral:Dinner:Meat'],
+                        help='Contexts of the batch as emotion:meal_time[:food_type]')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs of each sequence')
+    args = parser.parse_args()
+
+    from database.db_init import app, User
+
+    with app.app_context():
+        user = User.query.get(args.user_id)
+        if user is None:
+            print(f"❌ User {args.user_id} not found")
+            raise SystemExit(1)
+
+        if args.action == 'batch':
+            contexts = [tuple(context.split(':')) + (None,) * (3 - len(context.split(':'))) for context in args.contexts]
+            counts, results = count_batch_queries(user, contexts)
+            print(f"📊 Batch of {len(contexts)} contexts: {counts}")
+            if any(result.get('context_reset') for result in results):
+                print("⚠️ Some contexts need a preference reset, left unchanged by this read-only check")
+            sequential_ms, batch_ms, same = compare_batch(user, contexts, args.repeat)
+            print(f"⏱️ Sequential: {sequential_ms:.1f} ms  Batch: {batch_ms:.1f} ms  ({sequential_ms / batch_ms:.2f}x)")
+
+            if counts['user_food_preference'] > 1:
+                print("❌ The batch loaded preference states more than once")
+                raise SystemExit(1)
+            if not same:
+                print("❌ The batch recommended other foods than the sequential calls")
+                raise SystemExit(1)
+            print("✅ Preference states loaded once and the same foods recommended")
+        else:
+            without, _ = count_context_queries(user, args.emotion, args.meal_time, args.food_type, use_snapshot=False)
+            shared, context_reset = count_context_queries(user, args.emotion, args.meal_time, args.food_type)
+            print(f"📊 Without snapshot: {without}")
+            print(f"📊 With snapshot:    {shared}")
+            if context_reset:
+                print("⚠️ The context needs a preference reset, left unchanged by this read-only check")
+
+            if shared['user_food_log'] > 1 or shared['user_food_preference'] > 1:
+                print("❌ The request queried the same context more than once")
+                raise SystemExit(1)
+            print("✅ Each context table was queried once")
@@ -0,0 +1,102 @@
+import numpy as np
+
+class DirectScoreTensor:
+    """
+    Direct (emotion compatibility) scores for every food under every emotion and age group.
+
+    The per-emotion nutrient weights form an (emotions x nutrients) weight matrix and the
+    nutrient limits an (age_groups x nutrients) ideal-value matrix. The scores are computed
+    once into a (foods x emotions x age_groups) tensor, so a request only needs an array gather.
+    A score is the weighted closeness of each priority nutrient to its age group limit (linearly
+    decreasing weights in priority order), times 10 and rounded to 2 decimals.
+    """
+
+    def __init__(self, catalog, nutrition_priorities, limits, age_groups=('child', 'adult'), values=None, tensor=None):
+        self.emotions = list(nutrition_priorities.keys())
+        self.age_groups = list(age_groups)
+        self._emotion_index = {e: i for i, e in enumerate(self.emotions)}
+        self._age_group_index = {g: i for i, g in enumerate(self.age_groups)}
+
+        # Every nutrient that is a priority for at least one emotion
+        self.nutrients = []
+        for priority_nutrients in nutrition_priorities.values():
+            for nutrient in priority_nutrients:
+                if nutrient not in self.nutrients:
+                    self.nutrients.append(nutrient)
+        nutrient_index = {n: i for i, n in enumerate(self.nutrients)}
+
+        # Weight matrix (emotions x nutrients), linearly decreasing in priority order.
+        # Ordered (nutrient column, normalized weight) pairs keep the original summation order.
+        self.weights = np.zeros((len(self.emotions), len(self.nutrients)))
+        self._weight_order = []
+        for e, emotion in enumerate(self.emotions):
+            priority_nutrients = nutrition_priorities.get(emotion, [])
+            order = []
+            if priority_nutrients:
+                weights = np.linspace(1.0, 0.1, num=len(priority_nutrients))
+                total_weight = np.sum(weights)
+                for idx, nutrient in enumerate(priority_nutrients):
+                    col = nutrient_index[nutrient]
+                    self.weights[e, col] = weights[idx] / total_weight
+                    order.append((col, weights[idx] / total_weight))
+            self._weight_order.append(order)
+
+        # Ideal value matrix (age_groups x nutrients); a missing limit defaults to 1
+        self.ideals = np.ones((len(self.age_groups), len(self.nutrients)))
+        for g, age_group in enumerate(self.age_groups):
+            for col, nutrient in enumerate(self.nutrients):
+                try:
+                    self.ideals[g, col] = float(limits.get(nutrient, {}).get(age_group, 1))
+                except (TypeError, ValueError):
+                    self.ideals[g, col] = np.nan
+
+        # Catalog values (foods x nutrients); missing columns and unreadable values are skipped.
+        # values and tensor can be stored copies of these arrays (see models/model_artifacts.py)
+        if values is None:
+            values = np.full((len(catalog), len(self.nutrients)), np.nan)
+            for col, nutrient in enumerate(self.nutrients):
+                if catalog.has_nutrient(nutrient):
+                    values[:, col] = catalog.nutrient_column(nutrient)
+        self.values = values
+
+        self.tensor = self._compute() if tensor is None else tensor
+        self.tensor.flags.writeable = False
+
+    def _factors(self, age_group_slot):
+        """Piecewise closeness factor (foods x nutrients) of each value to its ideal"""
+        ideal = self.ideals[age_group_slot]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = self.values / ideal
+            factor = np.where(
+                ratio > 2,
+                np.maximum(0, 1 - (ratio - 2) / 3),                      # Penalty for excessive values
+                np.where(
+                    ratio < 0.1,
+                    ratio * 2,                                           # Small penalty for very low values
+                    1 - np.minimum(1, np.abs(self.values - ideal) / ideal)
+                )
+            )
+        # Nutrients that were skipped contribute nothing
+        usable = ~np.isnan(self.values) & (ideal > 0)
+        return np.where(usable, np.nan_to_num(factor), 0.0)
+
+    def _compute(self):
+        """Build the (foods x emotions x age_groups) direct score tensor"""
+        tensor = np.zeros((len(self.values), len(self.emotions), len(self.age_groups)))
+        for g in range(len(self.age_groups)):
+            factors = self._factors(g)
+            for e, order in enumerate(self._weight_order):
+                # Accumulate in priority order, so the float sums and their rounding keep the original scoring order
+                score = np.zeros(len(self.values))
+                for col, weight in order:
+                    score = score + weight * factors[:, col] * 10
+                tensor[:, e, g] = np.round(score, 2)
+        return tensor
+
+    def scores(self, emotion, age_group):
+        """Direct scores of every catalog food (indexed by food id) for an emotion and age group"""
+        e = self._emotion_index.get(emotion)
+        g = self._age_group_index.get(age_group)
+        if e is None or g is None:
+            return np.zeros(len(self.values))
+        return self.tensor[:, e, g]
@@ -0,0 +1,49 @@
+import numpy as np
+
+class EligibleFoodIndex:
+    """
+    Foods within the nutrient limits for every (age_group, food_type), built once per catalog.
+
+    Each entry holds the sorted food ids (read-only array) and a frozenset of the food
+    names, so "which foods could this context recommend" is a dict lookup and comparisons
+    with a user's rated foods are plain set operations. food_type None means any type.
+    """
+
+    def __init__(self, catalog, limits, age_groups=('child', 'adult'), tolerance=1.5):
+        self.age_groups = list(age_groups)
+        self.food_types = list(catalog.food_types)
+        self._ids = {}
+        self._names = {}
+
+        for age_group in self.age_groups:
+            eligible = limits.eligible_mask(age_group, tolerance)
+            for food_type in [None] + self.food_types:
+                mask = eligible if food_type is None else eligible & catalog.type_mask(food_type)
+                ids = np.flatnonzero(mask)
+                ids.flags.writeable = False
+                self._ids[(age_group, food_type)] = ids
+                self._names[(age_group, food_type)] = frozenset(catalog.names_of(ids))
+
+    def ids(self, age_group, food_type=None):
+        """Sorted ids of the eligible foods; empty for an unknown age group or food type"""
+        ids = self._ids.get((age_group, food_type or None))
+        return ids if ids is not None else np.empty(0, dtype=np.intp)
+
+    def names(self, age_group, food_type=None):
+        """frozenset of the eligible food names"""
+        return self._names.get((age_group, food_type or None), frozenset())
+
+    def available(self, age_group, food_type=None, extra=()):
+        """Eligible food names plus extra ones (e.g. recommendations that fell back beyond the food type)"""
+        return self.names(age_group, food_type).union(extra)
+
+    def remaining(self, age_group, food_type, excluded, extra=()):
+        """Available food names minus the excluded ones (e.g. the disliked foods)"""
+        return self.available(age_group, food_type, extra).difference(excluded)
+
+    def excluded_ratio(self, age_group, food_type, excluded, extra=()):
+        """
+        Number of excluded foods over the number of available foods. Every excluded food counts,
+        also one outside the available set, as the auto-reset threshold always has
+        """
+        return len(excluded) / max(len(self.available(age_group, food_type, extra)), 1)
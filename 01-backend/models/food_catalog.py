@@ -0,0 +1,197 @@
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Catalog columns that are not nutrient values
+CATALOG_TEXT_COLUMNS = ['food', 'image_url', 'food_type']
+
+# Rows widened per step by nutrient_values()
+NUTRIENT_VALUE_CHUNK = 65536
+
+class FoodRecord:
+    """
+    Lightweight read-only view of one catalog food.
+    Supports record[column], column in record and record.get(column) like a DataFrame row
+    """
+
+    __slots__ = ('catalog', 'id')
+
+    def __init__(self, catalog, food_id):
+        self.catalog = catalog
+        self.id = food_id
+
+    @property
+    def name(self):
+        return self.catalog.names[self.id]
+
+    @property
+    def food_type(self):
+        return self.catalog.food_types[self.catalog.type_codes[self.id]]
+
+    @property
+    def image_url(self):
+        return self.catalog.image_urls[self.id] or ''
+
+    def get(self, column, default=None):
+        if column == 'food':
+            return self.name
+        if column == 'food_type':
+            return self.food_type
+        if column == 'image_url':
+            return self.catalog.image_urls[self.id]
+        col = self.catalog.nutrient_index.get(column)
+        if col is None:
+            return default
+        return self.catalog.nutrient_values()[self.id, col]
+
+    def __getitem__(self, column):
+        if column not in self:
+            raise KeyError(column)
+        return self.get(column)
+
+    def __contains__(self, column):
+        return column in CATALOG_TEXT_COLUMNS or column in self.catalog.nutrient_index
+
+    def items(self):
+        """(column, value) pairs in catalog column order, skipping missing values"""
+        for column in self.catalog.columns:
+            value = self.get(column)
+            if value is None or (isinstance(value, float) and np.isnan(value)):
+                continue
+            yield column, value
+
+    def __repr__(self):
+        return f"FoodRecord({self.id}, {self.name!r})"
+
+class FoodCatalog:
+    """
+    Columnar food catalog.
+
+    Nutrients are held as a float32 matrix (foods x nutrients) and food types as integer
+    codes into food_types, so filters and feature assembly are array operations. Food ids
+    are row positions; ids maps a food name to its id. The arrays can be saved to .npy
+    files and memory-mapped back instead of re-parsing the CSV.
+
+    Catalog values have at most 7 significant digits (checked on export), so the shortest
+    decimal form of each float32 reproduces the original float64 exactly; nutrient_values()
+    uses that for the float64 computations (limits, compatibility scores, response payloads).
+    """
+
+    def __init__(self, names, image_urls, food_types, type_codes, nutrient_columns, nutrients, columns):
+        self.names = list(names)
+        self.image_urls = list(image_urls)
+        self.food_types = list(food_types)  # type code -> food type name
+        self.type_codes = type_codes
+        self.nutrient_columns = list(nutrient_columns)
+        self.nutrients = nutrients
+        self.columns = list(columns)  # Original column order of the CSV
+
+        self.ids = {name: food_id for food_id, name in enumerate(self.names)}
+        self.nutrient_index = {nutrient: col for col, nutrient in enumerate(self.nutrient_columns)}
+        self._type_index = {food_type: code for code, food_type in enumerate(self.food_types)}
+        self._nutrient_values = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_dataframe(cls, foods):
+        """Build the catalog from a DataFrame with the reduced_nutrition_df.csv columns"""
+        nutrient_columns = [col for col in foods.columns if col not in CATALOG_TEXT_COLUMNS]
+        nutrients = np.column_stack([
+            pd.to_numeric(foods[col], errors='coerce').to_numpy(dtype=np.float32) for col in nutrient_columns
+        ]) if nutrient_columns else np.zeros((len(foods), 0), dtype=np.float32)
+
+        type_names = foods['food_type'].astype(str).tolist() if 'food_type' in foods.columns else [''] * len(foods)
+        food_types = sorted(set(type_names))
+        type_index = {food_type: code for code, food_type in enumerate(food_types)}
+
+        image_urls = foods['image_url'] if 'image_url' in foods.columns else pd.Series([None] * len(foods))
+        return cls(
+            names=foods['food'].astype(str).tolist(),
+            image_urls=[None if pd.isna(url) else str(url) for url in image_urls],
+            food_types=food_types,
+            type_codes=np.array([type_index[t] for t in type_names], dtype=np.int16),
+            nutrient_columns=nutrient_columns,
+            nutrients=np.ascontiguousarray(nutrients),
+            columns=list(foods.columns)
+        )
+
+    @classmethod
+    def from_csv(cls, path):
+        return cls.from_dataframe(pd.read_csv(path))
+
+    def save(self, directory, prefix="catalog"):
+        """Write the arrays (with the widened nutrient values) to <prefix>.*.npy and the names and columns to <prefix>.json"""
+        directory = Path(directory)
+        np.save(directory / f"{prefix}.nutrients.npy", self.nutrients)
+        np.save(directory / f"{prefix}.values.npy", self.nutrient_values())
+        np.save(directory / f"{prefix}.type_codes.npy", self.type_codes)
+        with open(directory / f"{prefix}.json", 'w') as f:
+            json.dump({
+                'names': self.names,
+                'image_urls': self.image_urls,
+                'food_types': self.food_types,
+                'nutrient_columns': self.nutrient_columns,
+                'columns': self.columns
+            }, f)
+
+    @classmethod
+    def load(cls, directory, prefix="catalog", mmap_mode=None):
+        """Read a catalog written by save(); mmap_mode='r' maps the arrays read-only"""
+        directory = Path(directory)
+        with open(directory / f"{prefix}.json", 'r') as f:
+            meta = json.load(f)
+        catalog = cls(
+            nutrients=np.load(directory / f"{prefix}.nutrients.npy", mmap_mode=mmap_mode, allow_pickle=False),
+            type_codes=np.load(directory / f"{prefix}.type_codes.npy", mmap_mode=mmap_mode, allow_pickle=False),
+            **meta
+        )
+        values_path = directory / f"{prefix}.values.npy"
+        if values_path.exists():
+            catalog._nutrient_values = np.load(values_path, mmap_mode=mmap_mode, allow_pickle=False)
+        return catalog
+
+    def id_of(self, name):
+        """Food id for a name, or None"""
+        return self.ids.get(name)
+
+    def record(self, food_id):
+        return FoodRecord(self, int(food_id))
+
+    def has_nutrient(self, nutrient):
+        return nutrient in self.nutrient_index
+
+    def nutrient_values(self):
+        """Nutrient matrix widened to the original float64 values, computed once"""
+        if self._nutrient_values is None:
+            # Converted in row chunks: the intermediate string array is ~30x the float32 size
+            values = np.empty(self.nutrients.shape, dtype=np.float64)
+            for start in range(0, len(values), NUTRIENT_VALUE_CHUNK):
+                stop = start + NUTRIENT_VALUE_CHUNK
+                values[start:stop] = self.nutrients[start:stop].astype(str).astype(np.float64)
+            self._nutrient_values = values
+        return self._nutrient_values
+
+    def nutrient_column(self, nutrient):
+        """float64 values of one nutrient for every food, or None if the catalog lacks it"""
+        col = self.nutrient_index.get(nutrient)
+        if col is None:
+            return None
+        return self.nutrient_values()[:, col]
+
+    def type_mask(self, food_type):
+        """Boolean mask of foods of the given type"""
+        code = self._type_index.get(food_type)
+        if code is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.type_codes == code
+
+    def types_of(self, food_ids):
+        """Food type names for an array of ids"""
+        return [self.food_types[code] for code in self.type_codes[food_ids].tolist()]
+
+    def names_of(self, food_ids):
+        """Food names for an array of ids"""
+        return [self.names[food_id] for food_id in np.asarray(food_ids).tolist()]
@@ -175,6 +175,11 @@ class FoodExplanationAI:
         emotion = user_data.get('emotion', 'neutral')
         nutrition_data = recommendation.get('nutrition_data', {})
         
+        # Fall back to the food catalog when the client did not send the nutrition data
+        if not nutrition_data and food_name:
+            from models.food_recommendation_model import get_food_nutrition_data
+            nutrition_data = get_food_nutrition_data(food_name)
+        
         # Generate overview explanation
         emotion_explanation = explainer.get_emotion_explanation(emotion)
         
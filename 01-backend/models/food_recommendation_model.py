@@ -1,10 +1,33 @@
 import joblib
 import json
+import logging
+import os
+import threading
 import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import date, timedelta
 import warnings
+from models.score_table import compute_table_version, load_score_table, build_score_table
+from models.nutrient_limits import NutrientLimitEngine
+from models.direct_scores import DirectScoreTensor
+from models.eligible_foods import EligibleFoodIndex
+from models.candidate_index import CANDIDATE_K, CandidateIndex
+from models.forest_engine import FlatForest
+from models.model_artifacts import artifact_generations, load_model_artifacts
+from models.score_table import score_table_generations
+from models.shared_state import shared_state
+from models.model_registry import BASE_MODEL_VERSION, bundle_sources, model_registry, model_swap, requested_model_version
+from models.food_catalog import FoodCatalog
+from models.nutrition_payloads import NutritionPayloadCache
+from models.preference_state import food_state_step, record_ratings
+from models.context_snapshot import ContextSnapshot, context_snapshot, context_snapshots
+from models.history_cache import cached_user_history
+from models.stage_timer import stage
+from models.scoring_pool import score_in_pool
+from models.meal_plan import MAX_PLAN_DAYS, budget_excess, solve_plan
+
+logger = logging.getLogger(__name__)
 
 # Ẩn warning về feature names
 warnings.filterwarnings("ignore", category=UserWarning, 
@@ -66,306 +89,572 @@ NUTRITION_GENERAL_LIMITS = {
     'Zinc': {'child': 12, 'adult': 40}
 }
 
+# Forest inference engine: "numpy" walks flattened tree arrays (much faster on request-sized
+# batches), "sklearn" always calls the pickled models. Both give identical scores, so batches
+# larger than FOREST_ENGINE_MAX_BATCH rows are handed to sklearn, which is faster there
+FOREST_ENGINE = os.getenv("FOREST_ENGINE", "numpy")
+FOREST_ENGINE_MAX_BATCH = int(os.getenv("FOREST_ENGINE_MAX_BATCH", "256"))
+
 # Define models path
 models_dir = Path(__file__).parent / "recommendation_models"
 data_dir = Path(__file__).parent / "../data"
 
-# Load models, encoders, and data
-try:
-    # Load trained models
-    rank_model = joblib.load(models_dir / "rank_model.pkl")
-    reg_model = joblib.load(models_dir / "score_model.pkl")
-    binary_model = joblib.load(models_dir / "binary_model.pkl")
+# Active model version, the paths of its files and the artifact generation it was mapped from, see load_model_bundle()
+model_version = None
+model_sources = bundle_sources()
+model_generation = 0
+
+# Pickled sklearn forests, see load_sklearn_models()
+rank_model = None
+reg_model = None
+binary_model = None
+sklearn_models_lock = threading.Lock()
+
+def load_sklearn_models():
+    """
+    Load the pickled forests on first use and return them by name.
+    Workers serving from the mapped artifacts only load them if a batch needs sklearn
+    """
+    global rank_model, reg_model, binary_model
+    
+    with sklearn_models_lock:
+        if rank_model is None:
+            rank_model = joblib.load(model_sources["rank_model.pkl"])
+            reg_model = joblib.load(model_sources["score_model.pkl"])
+            binary_model = joblib.load(model_sources["binary_model.pkl"])
+    
+    return {'rank_model': rank_model, 'reg_model': reg_model, 'binary_model': binary_model}
+
+# Module globals that make up a model bundle, replaced together by activate_model_bundle()
+BUNDLE_GLOBALS = [
+    'model_version', 'model_sources', 'model_artifacts', 'model_generation', 'rank_model', 'reg_model', 'binary_model',
+    'meal_type_encoder', 'food_type_encoder', 'emotion_encoder', 'nutrition_priorities', 'all_nutrients',
+    'feature_cols', 'food_catalog', 'nutrient_limits', 'eligible_foods', 'direct_score_tensor',
+    'candidate_index', 'scaler'
+]
+
+def load_model_bundle(version=BASE_MODEL_VERSION):
+    """
+    Load the models, encoders, nutrition info and catalog of a model version (see models/model_registry.py)
+    and build the structures derived from them, without touching the active globals.
+    Returns the values of BUNDLE_GLOBALS by name
+    """
+    sources = bundle_sources(version)
+    bundle = {'model_version': version, 'model_sources': sources}
+    
+    # Flattened forests, food catalog and catalog state, mapped read-only so all workers share one copy.
+    # They are exported from the base files, so other versions are loaded from their own files
+    artifacts = load_model_artifacts(NUTRITION_GENERAL_LIMITS) if version == BASE_MODEL_VERSION else None
+    bundle['model_artifacts'] = artifacts
+    bundle['model_generation'] = artifacts.generation if artifacts is not None else 0
+    state = artifacts.catalog_state if artifacts is not None else {}
+    
+    # Load trained models up front when they will not be served from the artifacts
+    load_models = artifacts is None or FOREST_ENGINE != "numpy"
+    bundle['rank_model'] = joblib.load(sources["rank_model.pkl"]) if load_models else None
+    bundle['reg_model'] = joblib.load(sources["score_model.pkl"]) if load_models else None
+    bundle['binary_model'] = joblib.load(sources["binary_model.pkl"]) if load_models else None
     
     # Load encoders
-    encoders = joblib.load(models_dir / "encoders.pkl")
-    meal_type_encoder = encoders['meal_type_encoder']
-    food_type_encoder = encoders['food_type_encoder']
-    emotion_encoder = encoders['emotion_encoder']
+    encoders = joblib.load(sources["encoders.pkl"])
+    bundle['meal_type_encoder'] = encoders['meal_type_encoder']
+    bundle['food_type_encoder'] = encoders['food_type_encoder']
+    bundle['emotion_encoder'] = encoders['emotion_encoder']
     
     # Load nutrition info
-    with open(models_dir / "nutrition_info.json", 'r') as f:
+    with open(sources["nutrition_info.json"], 'r') as f:
         nutrition_info = json.load(f)
-        nutrition_priorities = nutrition_info.get('nutrition_priorities', {})
-        all_nutrients = nutrition_info.get('all_nutrients', [])
-        feature_cols = nutrition_info.get('feature_cols', [])
+        bundle['nutrition_priorities'] = nutrition_info.get('nutrition_priorities', {})
+        bundle['all_nutrients'] = nutrition_info.get('all_nutrients', [])
+        bundle['feature_cols'] = nutrition_info.get('feature_cols', [])
     
-    # Use predefined nutrition limits
-    nutrition_general_limits = NUTRITION_GENERAL_LIMITS
+    # Load the food catalog from the artifacts, parsing the reduced dataset only without them
+    if artifacts is not None:
+        catalog = artifacts.catalog
+    else:
+        catalog = FoodCatalog.from_csv(sources["reduced_nutrition_df.csv"])
+    bundle['food_catalog'] = catalog
+    
+    # Vectorized nutrient limit masks indexed by food id
+    bundle['nutrient_limits'] = NutrientLimitEngine(catalog, NUTRITION_GENERAL_LIMITS, values=state.get('limit_values'))
+    
+    # Eligible food ids and names per (age group, food type)
+    bundle['eligible_foods'] = EligibleFoodIndex(catalog, bundle['nutrient_limits'])
     
-    # Load reduced dataset
-    food_data = pd.read_csv(data_dir / "reduced_nutrition_df.csv")
+    # Direct scores for every food, emotion and age group, indexed by food id
+    bundle['direct_score_tensor'] = DirectScoreTensor(
+        catalog, bundle['nutrition_priorities'], NUTRITION_GENERAL_LIMITS,
+        values=state.get('direct_values'), tensor=state.get('direct_tensor')
+    )
+    
+    # Nearest-to-ideal candidates for catalogs larger than CANDIDATE_K
+    bundle['candidate_index'] = CandidateIndex(bundle['direct_score_tensor'])
     
-    # Initialize scaler for feature scaling
+    # Initialize scaler for feature scaling, fitted on the nutrient columns of the catalog
     from sklearn.preprocessing import StandardScaler
-    scaler = StandardScaler()
+    numeric_data = pd.DataFrame(catalog.nutrient_values(), columns=catalog.nutrient_columns).fillna(0)
+    bundle['scaler'] = StandardScaler().fit(numeric_data)
+    
+    return bundle
+
+# Load models, encoders, and data of the requested version, falling back to the base files
+try:
+    try:
+        globals().update(load_model_bundle(requested_model_version()))
+    except Exception as e:
+        if requested_model_version() == BASE_MODEL_VERSION:
+            raise
+        print(f"❌ Error loading model version {requested_model_version()}, using {BASE_MODEL_VERSION}: {e}")
+        globals().update(load_model_bundle(BASE_MODEL_VERSION))
     
-    # Fit scaler on numeric columns of food data
-    numeric_columns = food_data.select_dtypes(include=['float64', 'int64']).columns
-    numeric_data = food_data[numeric_columns].fillna(0)
-    scaler.fit(numeric_data)
+    # Use predefined nutrition limits
+    nutrition_general_limits = NUTRITION_GENERAL_LIMITS
     
     model_loaded = True
-    print("✅ Food recommendation models loaded successfully")
+    print(f"✅ Food recommendation models loaded successfully (version {model_version})")
 except Exception as e:
     print(f"❌ Error loading food recommendation models: {e}")
     model_loaded = False
+    model_version = None
+    model_artifacts = None
+    food_catalog = None
     nutrition_priorities = {}
     all_nutrients = []
     feature_cols = []
     nutrition_general_limits = NUTRITION_GENERAL_LIMITS  # Always use predefined limits
+    nutrient_limits = None
+    eligible_foods = None
+    direct_score_tensor = None
+    candidate_index = None
 
-def check_nutrient_limits(food_row, age_group, tolerance=1.5):
+def build_feature_layout(catalog=None):
     """
-    Returns True if food is within nutritional limits, False if it violates limits.
+    Precompute the column positions used by build_feature_matrix so that
+    feature assembly does not have to walk feature_cols for every food
     """
-    for nutrient, group_limits in nutrition_general_limits.items():
-        if nutrient not in food_row:
-            continue
-        try:
-            value = float(food_row[nutrient])
-            limit = float(group_limits[age_group])
+    catalog = catalog or food_catalog
+    col_index = {col: i for i, col in enumerate(feature_cols)}
+    food_type_codes = {
+        food_type: code for code, food_type in enumerate(food_type_encoder.classes_)
+    } if model_loaded else {}
+    catalog_types = catalog.food_types if model_loaded else []
 
-            if value > limit * tolerance:
-                return False  # Violates nutrition limit
-        except:
-            continue  # Skip if error reading value
-    
-    return True  # Within limits if no violations found
+    # Raw nutrient columns copied into their *_scaled feature slots
+    nutrient_slots = [
+        (col_index[f'{nutrient}_scaled'], nutrient)
+        for nutrient in all_nutrients
+        if f'{nutrient}_scaled' in col_index
+    ]
 
-def calculate_compatibility_score(food_row, emotion, age_group='adult'):
-    """
-    Calculate compatibility score of food based on emotion with improved scaling
-    """
-    priority_nutrients = nutrition_priorities.get(emotion, [])
-    if not priority_nutrients:
-        return 0
+    # Interaction slots per emotion: (interaction column, source *_scaled column)
+    interaction_slots = {}
+    for e in nutrition_priorities.keys():
+        slots = []
+        for nutrient in nutrition_priorities.get(e, [])[:3]:
+            feature_name = f'interaction_{e}_{nutrient}'
+            scaled_name = f'{nutrient}_scaled'
+            if feature_name in col_index and scaled_name in col_index:
+                slots.append((col_index[feature_name], col_index[scaled_name]))
+        interaction_slots[e] = slots
 
-    weights = np.linspace(1.0, 0.1, num=len(priority_nutrients))
-    total_weight = np.sum(weights)
-    score = 0
+    return {
+        'size': len(feature_cols),
+        'age': col_index.get('age'),
+        'meal_type': col_index.get('Meal_Type_encoded'),
+        'emotion': col_index.get('emotion_encoded'),
+        'food_type': col_index.get('food_type_encoded'),
+        'month': col_index.get('month_encoded'),
+        'nutrients': nutrient_slots,
+        'interactions': interaction_slots,
+        'food_type_codes': food_type_codes,
+        # Encoder code of each catalog food type code, and whether the encoder knows the type
+        'catalog_type_codes': np.array([food_type_codes.get(t, 0) for t in catalog_types]),
+        'catalog_known_types': np.array([t in food_type_codes for t in catalog_types], dtype=bool)
+    }
 
-    for idx, nutrient in enumerate(priority_nutrients):
-        if nutrient not in food_row:
-            continue
+feature_layout = build_feature_layout()
 
-        try:
-            val = float(food_row.get(nutrient, 0))
-            ideal = nutrition_general_limits.get(nutrient, {}).get(age_group, 1)
-            ideal = float(ideal)
-
-            if ideal > 0:
-                # Calculate how close the value is to the ideal
-                ratio = val / ideal
-                if ratio > 2:  # More than double the ideal
-                    factor = max(0, 1 - (ratio - 2) / 3)  # Penalty for excessive values
-                elif ratio < 0.1:  # Less than 10% of ideal
-                    factor = ratio * 2  # Small penalty for very low values
-                else:
-                    factor = 1 - min(1, abs(val - ideal) / ideal)
+# Precomputed context score table, see init_score_table()
+score_table = None
 
-                score += (weights[idx] / total_weight) * factor * 10
-        except:
-            continue
+# Callbacks taking the new catalog, run by reload_food_catalog() and activate_model_bundle()
+catalog_reload_hooks = []
+
+def on_catalog_reload(hook):
+    """Register a callback to run after the food catalog is reloaded"""
+    catalog_reload_hooks.append(hook)
+    return hook
 
-    return round(score, 2)
+def build_catalog_state(catalog, state=None):
+    """
+    Build the structures derived from a catalog:
+    (feature layout, nutrient limits, eligible foods, direct scores, candidate index).
+    state can hold the stored arrays of the catalog (ModelArtifacts.catalog_state)
+    """
+    state = state or {}
+    limits = NutrientLimitEngine(catalog, nutrition_general_limits, values=state.get('limit_values'))
+    eligible = EligibleFoodIndex(catalog, limits)
+    tensor = DirectScoreTensor(
+        catalog, nutrition_priorities, nutrition_general_limits,
+        values=state.get('direct_values'), tensor=state.get('direct_tensor')
+    )
+    layout = build_feature_layout(catalog)
+    return layout, limits, eligible, tensor, CandidateIndex(tensor)
 
-def create_feature_vector(food_row, emotion, meal_type, age):
+def reload_food_catalog():
     """
-    Create a feature vector from food information and context with improved feature handling
+    Reload the food catalog (from the artifacts, or the CSV without them), rebuild the
+    state derived from it and fire the catalog reload hooks
     """
-    # Dictionary to store features with correct names
-    feature_dict = {}
+    global food_catalog, nutrient_limits, eligible_foods, direct_score_tensor, candidate_index, feature_layout
     
-    # Fill in basic information with proper names
-    for col in feature_cols:
-        feature_dict[col] = 0  # Default value
-        
-        if col == 'age':
-            feature_dict[col] = age
-        elif col == 'Meal_Type_encoded':
-            if meal_type in meal_type_encoder.classes_:
-                feature_dict[col] = meal_type_encoder.transform([meal_type])[0]
-        elif col == 'emotion_encoded':
-            if emotion in emotion_encoder.classes_:
-                feature_dict[col] = emotion_encoder.transform([emotion])[0]
-        elif col == 'food_type_encoded':
-            food_type = food_row['food_type']
-            if food_type in food_type_encoder.classes_:
-                feature_dict[col] = food_type_encoder.transform([food_type])[0]
-        elif col == 'month_encoded':
-            # Current month normalized to 0-1
-            current_month = date.today().month
-            feature_dict[col] = current_month / 12
-    
-    # Process nutrition data with proper feature names
-    for nutrient in all_nutrients:
-        if nutrient in food_row:
-            try:
-                val = float(food_row[nutrient])
-                scaled_name = f'{nutrient}_scaled'
-                if scaled_name in feature_cols:
-                    feature_dict[scaled_name] = val
-            except:
-                continue
+    if not model_loaded:
+        return None
     
-    # Create interaction features
-    for e in nutrition_priorities.keys():
-        priority_nutrients = nutrition_priorities.get(e, [])[:3]  # Top 3 priority nutrients
-        for nutrient in priority_nutrients:
-            feature_name = f'interaction_{e}_{nutrient}'
-            if feature_name in feature_cols:
-                if e == emotion:
-                    # Get scaled nutrient value
-                    scaled_name = f'{nutrient}_scaled'
-                    if scaled_name in feature_dict:
-                        feature_dict[feature_name] = feature_dict[scaled_name]
-                else:
-                    feature_dict[feature_name] = 0
+    artifacts = load_model_artifacts(NUTRITION_GENERAL_LIMITS) if model_version == BASE_MODEL_VERSION else None
+    if artifacts is not None:
+        catalog = artifacts.catalog
+    else:
+        catalog = FoodCatalog.from_csv(model_sources["reduced_nutrition_df.csv"])
     
-    # Convert the dict to a feature vector array with exact same ordering as feature_cols
-    feature_vector = np.zeros(len(feature_cols))
-    for i, col in enumerate(feature_cols):
-        feature_vector[i] = feature_dict.get(col, 0)
+    # Build everything before swapping so requests never see a half-updated catalog
+    layout, limits, eligible, tensor, index = build_catalog_state(
+        catalog, artifacts.catalog_state if artifacts is not None else None
+    )
+    with model_swap.writing():
+        food_catalog, feature_layout, nutrient_limits, eligible_foods, direct_score_tensor, candidate_index = (
+            catalog, layout, limits, eligible, tensor, index
+        )
     
-    return feature_vector
+    run_catalog_reload_hooks(catalog)
+    print(f"✅ Food catalog reloaded ({len(catalog)} foods)")
+    return catalog
 
-def parallel_with_direct_scoring(emotion, meal_type, age, food_type=None, num_recommendations=5):
+def run_catalog_reload_hooks(catalog):
+    for hook in catalog_reload_hooks:
+        try:
+            hook(catalog)
+        except Exception as e:
+            print(f"❌ Error in catalog reload hook {getattr(hook, '__name__', hook)}: {e}")
+
+def smoke_predict():
+    """Score one context end to end with the active globals; raises ValueError when the bundle cannot serve it"""
+    emotion, meal_type, age = SUPPORTED_EMOTIONS[0], SUPPORTED_MEAL_TYPES[0], 30
+    food_ids, features = candidate_features(select_candidate_foods('adult'), emotion, meal_type, age, 1)
+    if len(food_ids) == 0:
+        raise ValueError("No food can be scored")
+    
+    scores = predict_model_scores(features)
+    for name, values in zip(['rank', 'binary', 'reg'], scores):
+        if np.shape(values) != (len(food_ids),) or not np.isfinite(values).all():
+            raise ValueError(f"The {name} model returned invalid scores")
+    
+    recommendation, _ = format_recommendations(rank_scored_foods(food_ids, *scores, emotion, 'adult'))
+    if not recommendation:
+        raise ValueError("The smoke prediction returned no recommendation")
+
+def activate_model_bundle(bundle):
     """
-    Parallel approach but uses direct scoring for final sorting:
-    1. Get separate recommendations from each model
-    2. Combine and create consensus ranking
-    3. Final ordering based on direct scoring
+    Swap in a bundle from load_model_bundle(). Scoring is held back while the globals are replaced
+    and checked with a smoke prediction; on failure the previous bundle is restored and the error raised.
+    The catalog reload hooks (nutrition payloads, score table) then run for the new catalog
     """
-    # Age group determination
-    age_group = 'adult' if age > 15 else 'child'
+    global model_loaded, feature_layout, score_table
+    
+    module = globals()
+    swapped = BUNDLE_GLOBALS + ['model_loaded', 'feature_layout', 'flat_forests', 'score_table']
+    
+    with model_swap.writing():
+        previous = {name: module.get(name) for name in swapped}
+        try:
+            module.update(bundle)
+            model_loaded = True
+            feature_layout = build_feature_layout(food_catalog)
+            # The score table of the previous version is re-checked by the hooks below
+            score_table = None
+            init_forest_engine()
+            smoke_predict()
+        except Exception:
+            module.update(previous)
+            raise
+    
+    run_catalog_reload_hooks(food_catalog)
+    return bundle['model_version']
+
+def build_feature_matrix(food_ids, emotion, meal_type, age, month=None):
+    """
+    Create the feature matrix for all candidate foods (catalog ids) in one NumPy pass, in feature_cols
+    order: encoded context, scaled nutrients, and the interaction features of the requested emotion
+    (copies of its top priority nutrients, zero for the other emotions). month defaults to the current month
+    """
+    layout = feature_layout
+    food_ids = np.asarray(food_ids, dtype=np.intp)
+    features = np.zeros((len(food_ids), layout['size']))
+
+    # Context features are shared by every row
+    if layout['age'] is not None:
+        features[:, layout['age']] = age
+    if layout['meal_type'] is not None and meal_type in meal_type_encoder.classes_:
+        features[:, layout['meal_type']] = meal_type_encoder.transform([meal_type])[0]
+    if layout['emotion'] is not None and emotion in emotion_encoder.classes_:
+        features[:, layout['emotion']] = emotion_encoder.transform([emotion])[0]
+    if layout['month'] is not None:
+        features[:, layout['month']] = (month or date.today().month) / 12
+    if layout['food_type'] is not None:
+        features[:, layout['food_type']] = layout['catalog_type_codes'][food_catalog.type_codes[food_ids]]
+
+    # Nutrition columns are copied as whole columns from the float32 catalog matrix
+    nutrients = food_catalog.nutrients[food_ids]
+    for slot, nutrient in layout['nutrients']:
+        col = food_catalog.nutrient_index.get(nutrient)
+        if col is not None:
+            features[:, slot] = nutrients[:, col]
+
+    # Interaction features are only non-zero for the requested emotion
+    for slot, source in layout['interactions'].get(emotion, []):
+        features[:, slot] = features[:, source]
+
+    return features
+
+def consensus_ranking(food_names, rank_scores, binary_scores, reg_scores, top_n=5, max_candidates=10):
+    """
+    Combine the three model score arrays into consensus candidates.
+    Returns a list of (row position, votes, avg_position, consensus_score) in consensus order
+    """
+    # Stable sorts keep catalog order for ties, matching Python's sorted()
+    top_by_rank = np.argsort(rank_scores, kind='stable')[:top_n].tolist()
+    top_by_binary = np.argsort(-binary_scores, kind='stable')[:top_n].tolist()
+    top_by_reg = np.argsort(-reg_scores, kind='stable')[:top_n].tolist()
+
+    # Add foods with their "votes" (appearance count), keyed by name like the per-food version
+    unique_foods = {}
+    for pos in top_by_rank + top_by_binary + top_by_reg:
+        name = food_names[pos]
+        if name in unique_foods:
+            unique_foods[name]['votes'] += 1
+        else:
+            unique_foods[name] = {'pos': pos, 'votes': 1}
+
+    rank_lookup = {food_names[pos]: i + 1 for i, pos in enumerate(top_by_rank)}
+    binary_lookup = {food_names[pos]: i + 1 for i, pos in enumerate(top_by_binary)}
+    reg_lookup = {food_names[pos]: i + 1 for i, pos in enumerate(top_by_reg)}
+
+    for name, food in unique_foods.items():
+        # Normalize to 0-1 where 0 is best
+        positions = [
+            (lookup[name] - 1) / 4
+            for lookup in (rank_lookup, binary_lookup, reg_lookup)
+            if name in lookup
+        ]
+        food['avg_position'] = sum(positions)/len(positions) if positions else 1.0
+        food['consensus_score'] = food['votes'] - food['avg_position']
+
+    consensus_candidates = sorted(unique_foods.values(),
+                               key=lambda x: (x['votes'], -x['avg_position']),
+                               reverse=True)[:max_candidates]
+
+    return [
+        (food['pos'], food['votes'], food['avg_position'], food['consensus_score'])
+        for food in consensus_candidates
+    ]
+
+def extract_nutrition_data(record):
+    """Extract nutrition data from a catalog record, including all standard nutrients with zero values"""
+    nutrition_data = {}
+    for column, value in record.items():
+        try:
+            nutrition_data[column] = float(value)
+        except:
+            nutrition_data[column] = value
+
+    # Ensure all standard nutrients are present, even if zero
+    for nutrient in get_available_nutrients():
+        if nutrient not in nutrition_data:
+            nutrition_data[nutrient] = 0.0
+
+    return nutrition_data
+
+# Frozen nutrition_data of every catalog food, shared by all responses
+nutrition_payloads = NutritionPayloadCache(extract_nutrition_data)
+
+def select_candidate_foods(age_group, food_type=None):
+    """Filter the catalog down to the ids of foods that can be recommended for this age group and food type"""
+    # Filter by nutrition limits
+    mask = nutrient_limits.eligible_mask(age_group).copy()
     
     # Filter by food type if specified
     if food_type:
-        valid_foods = food_data[food_data['food_type'] == food_type]
-        if valid_foods.empty:  # If no foods match the filter, use all foods
-            valid_foods = food_data
-    else:
-        valid_foods = food_data
+        type_mask = food_catalog.type_mask(food_type)
+        if type_mask.any():  # If no foods match the filter, use all foods
+            mask &= type_mask
     
-    # Filter by nutrition limits
-    valid_foods = valid_foods[valid_foods.apply(
-        lambda row: check_nutrient_limits(row, age_group), axis=1
-    )]
+    # Skip foods whose type the encoder has never seen
+    mask &= feature_layout['catalog_known_types'][food_catalog.type_codes]
     
-    if valid_foods.empty:
-        return None, []
+    return np.flatnonzero(mask)
+
+def candidate_features(food_ids, emotion, meal_type, age, month=None):
+    """
+    Build the feature matrix of the candidate foods, dropping foods the models cannot score.
+    Returns the remaining food ids and their feature rows
+    """
+    # Build the full candidate feature matrix in one pass
+    features = build_feature_matrix(food_ids, emotion, meal_type, age, month)
+    
+    # Foods with unreadable nutrition values cannot be scored by the models
+    scorable = np.isfinite(features).all(axis=1)
+    if not scorable.all():
+        for food_name in food_catalog.names_of(food_ids[~scorable]):
+            logger.warning("Error processing food %s: invalid nutrition values", food_name)
+        food_ids = food_ids[scorable]
+        features = features[scorable]
+    
+    return food_ids, features
+
+def score_candidate_foods(food_ids, emotion, meal_type, age, month=None):
+    """
+    Score all candidate foods with one call per model.
+    Returns the ids of the foods that could be scored and their rank, binary and reg scores
+    """
+    food_ids, features = candidate_features(food_ids, emotion, meal_type, age, month)
     
-    # Process all valid foods through each model
-    food_scores = {}
+    if len(food_ids) == 0:
+        return food_ids, np.empty(0), np.empty(0), np.empty(0)
     
-    for _, food_row in valid_foods.iterrows():
-        food_name = food_row['food']
-        food_type_val = food_row['food_type']
-        
-        if food_type_val not in food_type_encoder.classes_:
-            continue
-            
-        try:
-            feature_vector = create_feature_vector(food_row, emotion, meal_type, age)
-            
-            # Get scores from all models
-            rank_prediction = rank_model.predict([feature_vector])[0]
-            binary_score = binary_model.predict_proba([feature_vector])[0][1]
-            reg_score = reg_model.predict([feature_vector])[0]
-            
-            # Calculate direct score
-            direct_score = calculate_compatibility_score(food_row, emotion, age_group)
-            
-            food_scores[food_name] = {
-                'food': food_name,
-                'food_type': food_type_val,
-                'rank_score': rank_prediction,  # Lower is better
-                'binary_score': binary_score,   # Higher is better
-                'reg_score': reg_score,         # Higher is better
-                'direct_score': direct_score,   # Higher is better
-                'feature_vector': feature_vector,
-                'food_row': food_row
-            }
-        except Exception as e:
-            print(f"Error processing food {food_name}: {e}")
+    rank_scores, binary_scores, reg_scores = predict_model_scores(features)
+    
+    return food_ids, rank_scores, binary_scores, reg_scores
+
+def score_candidate_batch(jobs):
+    """
+    score_candidate_foods for a list of (food_ids, emotion, meal_type, age) jobs, with one call per model
+    for all of them. Returns (food_ids, rank_scores, binary_scores, reg_scores) per job
+    """
+    with stage('features'):
+        candidates = [candidate_features(food_ids, emotion, meal_type, age) for food_ids, emotion, meal_type, age in jobs]
+    
+    scored = [(food_ids, np.empty(0), np.empty(0), np.empty(0)) for food_ids, _ in candidates]
+    if not any(len(food_ids) for food_ids, _ in candidates):
+        return scored
+    
+    with stage('models'):
+        rank_scores, binary_scores, reg_scores = predict_model_scores(np.vstack([
+            features for food_ids, features in candidates if len(food_ids)
+        ]))
+    
+    offset = 0
+    for j, (food_ids, _) in enumerate(candidates):
+        if len(food_ids) == 0:
             continue
+        rows = slice(offset, offset + len(food_ids))
+        offset += len(food_ids)
+        scored[j] = (food_ids, rank_scores[rows], binary_scores[rows], reg_scores[rows])
     
-    # Exit if no valid foods were processed
-    if not food_scores:
-        return None, []
+    return scored
+
+def predict_model_scores(features):
+    """
+    Run the three models over a feature matrix with the configured inference engine.
+    Returns rank scores (lower is better), binary and reg scores (higher is better)
+    """
+    if flat_forests and len(features) <= FOREST_ENGINE_MAX_BATCH:
+        return (
+            flat_forests['rank_model'].predict(features),
+            flat_forests['binary_model'].predict_proba(features)[:, 1],
+            flat_forests['reg_model'].predict(features)
+        )
     
-    # Get top recommendations by each model
-    top_by_rank = sorted(food_scores.values(), key=lambda x: x['rank_score'])[:5]
-    top_by_binary = sorted(food_scores.values(), key=lambda x: x['binary_score'], reverse=True)[:5]
-    top_by_reg = sorted(food_scores.values(), key=lambda x: x['reg_score'], reverse=True)[:5]
+    sklearn_models = load_sklearn_models()
+    return (
+        sklearn_models['rank_model'].predict(features),
+        sklearn_models['binary_model'].predict_proba(features)[:, 1],
+        sklearn_models['reg_model'].predict(features)
+    )
+
+def init_forest_engine(engine=None):
+    """
+    Prepare the NumPy forest engine when selected (FOREST_ENGINE=numpy).
+    The mapped artifacts are checked against the sklearn outputs recorded at export,
+    flattened pickles against sklearn itself; any mismatch falls back to sklearn
+    """
+    global flat_forests
     
-    # Create a set of unique foods from all models
-    unique_foods = {}
+    flat_forests = {}
+    if not model_loaded or (engine or FOREST_ENGINE) != "numpy":
+        return
     
-    # Add foods with their "votes" (appearance count)
-    for food in top_by_rank + top_by_binary + top_by_reg:
-        name = food['food']
-        if name in unique_foods:
-            unique_foods[name]['votes'] += 1
+    try:
+        if model_artifacts is not None:
+            forests = model_artifacts.forests
+            matches = model_artifacts.smoke_check()
         else:
-            unique_foods[name] = food.copy()
-            unique_foods[name]['votes'] = 1
-    
-    # Create consensus ranking
-    for name, food in unique_foods.items():
-        # Calculate average position
-        rank_pos = next((i+1 for i, f in enumerate(top_by_rank) if f['food'] == name), 999)
-        binary_pos = next((i+1 for i, f in enumerate(top_by_binary) if f['food'] == name), 999)
-        reg_pos = next((i+1 for i, f in enumerate(top_by_reg) if f['food'] == name), 999)
-        
-        # Normalize to 0-1 where 0 is best
-        positions = []
-        if rank_pos <= 5: positions.append((rank_pos-1)/4)
-        if binary_pos <= 5: positions.append((binary_pos-1)/4)
-        if reg_pos <= 5: positions.append((reg_pos-1)/4)
+            sklearn_models = load_sklearn_models()
+            forests = {name: FlatForest.from_sklearn(model) for name, model in sklearn_models.items()}
+            
+            features = np.nan_to_num(build_feature_matrix(np.arange(len(food_catalog)), SUPPORTED_EMOTIONS[0], SUPPORTED_MEAL_TYPES[0], 30, 1))
+            matches = (
+                np.array_equal(forests['rank_model'].predict(features), rank_model.predict(features)) and
+                np.array_equal(forests['reg_model'].predict(features), reg_model.predict(features)) and
+                np.array_equal(forests['binary_model'].predict_proba(features), binary_model.predict_proba(features))
+            )
         
-        food['avg_position'] = sum(positions)/len(positions) if positions else 1.0
+        if not matches:
+            print("⚠️ NumPy forest engine does not match sklearn, using sklearn inference")
+            return
         
-        # Calculate consensus score
-        food['consensus_score'] = food['votes'] - food['avg_position']
-    
-    # Identify top candidates by consensus
-    consensus_candidates = sorted(unique_foods.values(),
-                               key=lambda x: (x['votes'], -x['avg_position']),
-                               reverse=True)[:10]  # Take top 10 by consensus
+        flat_forests = forests
+        print("✅ NumPy forest engine ready")
+    except Exception as e:
+        print(f"❌ Error preparing NumPy forest engine, using sklearn inference: {e}")
+
+def rank_scored_foods(food_ids, rank_scores, binary_scores, reg_scores, emotion, age_group,
+                      direct_scores=None):
+    """
+    Combine model scores into a consensus and sort the consensus candidates by direct score.
+    direct_scores can hold precomputed direct scores aligned with food_ids, otherwise they
+    are gathered from the direct score tensor
+    """
+    food_names = food_catalog.names_of(food_ids)
+    consensus_candidates = consensus_ranking(food_names, rank_scores, binary_scores, reg_scores)
+    
+    if direct_scores is None:
+        direct_scores = direct_score_tensor.scores(emotion, age_group)[food_ids]
+    
+    scored_candidates = []
+    for pos, votes, avg_position, consensus_score in consensus_candidates:
+        record = food_catalog.record(food_ids[pos])
+        scored_candidates.append({
+            'food': food_names[pos],
+            'food_type': record.food_type,
+            'rank_score': rank_scores[pos],
+            'binary_score': binary_scores[pos],
+            'reg_score': reg_scores[pos],
+            'direct_score': direct_scores[pos],
+            'votes': votes,
+            'avg_position': avg_position,
+            'consensus_score': consensus_score,
+            'food_id': record.id,
+            'record': record
+        })
     
     # FINAL STEP: Use direct scoring to sort the consensus candidates
-    final_sorted = sorted(consensus_candidates, key=lambda x: x['direct_score'], reverse=True)
-    
-    # Get top recommendation and alternatives
+    return sorted(scored_candidates, key=lambda x: x['direct_score'], reverse=True)
+
+def format_recommendations(final_sorted):
+    """Format the sorted candidates into the top recommendation and up to three alternatives"""
     recommendation = None
     alternatives = []
     
     if final_sorted:
         top_food = final_sorted[0]
-        food_row = top_food['food_row']
-        
-        # Extract nutrition data, including all nutrients with zero values
-        nutrition_data = {}
-        for nutrient in food_row.index:
-            if not pd.isna(food_row[nutrient]):
-                try:
-                    nutrition_data[nutrient] = float(food_row[nutrient])
-                except:
-                    nutrition_data[nutrient] = food_row[nutrient]
-        
-        # Ensure all standard nutrients are present, even if zero
-        for nutrient in get_available_nutrients():
-            if nutrient not in nutrition_data:
-                nutrition_data[nutrient] = 0.0
+        record = top_food['record']
         
         # Format recommendation
         recommendation = {
             'food': top_food['food'],
             'type': top_food['food_type'],
-            'nutrition_data': nutrition_data,
-            'image_url': food_row.get('image_url', ''), 
+            'nutrition_data': nutrition_payloads.get(food_catalog, record.id),
+            'image_url': record.image_url, 
             'model_scores': {
                 'rank_score': float(top_food['rank_score']),
                 'binary_score': float(top_food['binary_score']),
@@ -378,96 +667,411 @@ def parallel_with_direct_scoring(emotion, meal_type, age, food_type=None, num_re
         
         # Format alternatives (up to 3)
         for alt_food in final_sorted[1:min(4, len(final_sorted))]:
-            food_row = alt_food['food_row']
-            
-            # Extract nutrition data with zero values
-            alt_nutrition_data = {}
-            for nutrient in food_row.index:
-                if not pd.isna(food_row[nutrient]):
-                    try:
-                        alt_nutrition_data[nutrient] = float(food_row[nutrient])
-                    except:
-                        alt_nutrition_data[nutrient] = food_row[nutrient]
-            
-            # Ensure all standard nutrients are present
-            for nutrient in get_available_nutrients():
-                if nutrient not in alt_nutrition_data:
-                    alt_nutrition_data[nutrient] = 0.0
-            
+            record = alt_food['record']
             alternatives.append({
                 'food': alt_food['food'],
                 'type': alt_food['food_type'],
-                'nutrition_data': alt_nutrition_data,
-                'image_url': food_row.get('image_url', '')
+                'nutrition_data': nutrition_payloads.get(food_catalog, record.id),
+                'image_url': record.image_url
             })
     
     return recommendation, alternatives
 
-def get_food_recommendations(emotion, birth_date, user_id=None, meal_time=None, food_type=None):
+def init_score_table(build_if_stale=None):
     """
-    Get food recommendations based on emotion, user info, and preferences using the parallel model approach
+    Load the precomputed context score table if it matches the current models and catalog.
+    When build_if_stale is set (or SCORE_TABLE_BUILD_ON_STARTUP=1) a missing or stale
+    table is rebuilt in a background thread while live scoring keeps serving requests
     """
+    global score_table
+    
     if not model_loaded:
-        return {"error": "Recommendation model not loaded"}
+        return
     
-    # Normalize input
-    emotion = emotion.lower() if emotion else "neutral"
-    if emotion not in SUPPORTED_EMOTIONS:
-        return {
-            "error": f"Unsupported emotion: {emotion}. Valid emotions are: {', '.join(SUPPORTED_EMOTIONS)}",
-            "status": "error"
-        }
+    version = compute_table_version(NUTRITION_GENERAL_LIMITS, model_sources.values())
+    score_table = load_score_table(version)
     
-    if not meal_time or meal_time not in SUPPORTED_MEAL_TYPES:
-        return {
-            "error": f"Unsupported meal type: {meal_time}. Valid meal types are: {', '.join(SUPPORTED_MEAL_TYPES)}",
-            "status": "error"
+    if build_if_stale is None:
+        build_if_stale = os.getenv("SCORE_TABLE_BUILD_ON_STARTUP", "0") == "1"
+    
+    if score_table is None and build_if_stale:
+        def build():
+            global score_table
+            try:
+                table = build_score_table()
+                table.save()
+                # A model version swapped in during the build keeps its own table
+                if table.version == compute_table_version(NUTRITION_GENERAL_LIMITS, model_sources.values()):
+                    score_table = table
+                print("✅ Context score table rebuilt")
+            except Exception as e:
+                print(f"❌ Error building context score table: {e}")
+        
+        threading.Thread(target=build, name="score-table-build", daemon=True).start()
+
+def lookup_score_table(emotion, meal_type, age, food_type):
+    """
+    Return the precomputed final ordering for a context in the same shape as rank_scored_foods,
+    or None when the table does not cover it
+    """
+    entry = score_table.lookup(emotion, meal_type, age, food_type, date.today().month)
+    if entry is None:
+        return None
+    
+    food_ids, top_scores = entry
+    final_sorted = []
+    for i, food_id in enumerate(food_ids):
+        record = food_catalog.record(food_id)
+        candidate = {
+            'food': record.name,
+            'food_type': record.food_type,
+            'food_id': record.id,
+            'record': record
         }
+        if i == 0:
+            candidate.update(top_scores)
+        final_sorted.append(candidate)
+    
+    return final_sorted
+
+def parallel_with_direct_scoring(emotion, meal_type, age, food_type=None, num_recommendations=5):
+    """
+    Parallel approach but uses direct scoring for final sorting:
+    1. Get separate recommendations from each model
+    2. Combine and create consensus ranking
+    3. Final ordering based on direct scoring
+    """
+    return parallel_with_direct_scoring_batch([(emotion, meal_type, age, food_type)])[0]
+
+def parallel_with_direct_scoring_batch(contexts):
+    """
+    parallel_with_direct_scoring for a list of (emotion, meal_type, age, food_type) contexts.
+    Contexts covered by the score table are looked up; the candidates of all other contexts
+    are stacked and scored with one call per model, in the scoring pool when it is running.
+    Returns (recommendation, alternatives) per context
+    """
+    results = [(None, []) for _ in contexts]
+    pending = []
+    
+    for i, (emotion, meal_type, age, food_type) in enumerate(contexts):
+        # Precomputed context table answers the whole pipeline with one lookup
+        if score_table is not None:
+            with stage('score_table'):
+                final_sorted = lookup_score_table(emotion, meal_type, age, food_type)
+            if final_sorted is not None:
+                results[i] = format_recommendations(final_sorted)
+                continue
+        
+        # Age group determination
+        age_group = 'adult' if age > 15 else 'child'
+        
+        with stage('candidates'):
+            food_ids = select_candidate_foods(age_group, food_type)
+            
+            # Large catalogs only send the foods nearest the emotion's ideal nutrients to the forests
+            if len(food_ids) > 0:
+                food_ids = candidate_index.nearest(food_ids, emotion, age_group, food_type, CANDIDATE_K)
+        if len(food_ids) == 0:
+            continue
+        
+        pending.append((i, emotion, age_group, (food_ids, emotion, meal_type, age)))
+    
+    if not pending:
+        return results
+    
+    # Build features and get scores from all models with one call per model for every pending context
+    jobs = [job for _, _, _, job in pending]
+    scored = score_in_pool(model_version, model_generation, jobs)
+    if scored is None:
+        scored = score_candidate_batch(jobs)
+    
+    for (i, emotion, age_group, _), (food_ids, rank_scores, binary_scores, reg_scores) in zip(pending, scored):
+        # Skip if no valid foods remain
+        if len(food_ids) == 0:
+            continue
+        with stage('ranking'):
+            final_sorted = rank_scored_foods(food_ids, rank_scores, binary_scores, reg_scores, emotion, age_group)
+            results[i] = format_recommendations(final_sorted)
+    
+    return results
+
+def get_food_recommendations(emotion, birth_date, user_id=None, meal_time=None, food_type=None):
+    """
+    Get food recommendations based on emotion, user info, and preferences using the parallel model approach
+    """
+    return get_food_recommendations_batch(emotion, birth_date, [(meal_time, food_type)], user_id=user_id)[0]
+
+def get_food_recommendations_batch(emotion, birth_date, variants, user_id=None):
+    """
+    get_food_recommendations for several (meal_time, food_type) variants of the same emotion and
+    birth date. Variants that need live scoring are scored together in one batched pass
+    """
+    return get_food_recommendations_multi(birth_date, [(emotion, meal_time, food_type) for meal_time, food_type in variants])
+
+def get_food_recommendations_multi(birth_date, requests):
+    """
+    get_food_recommendations for several (emotion, meal_time, food_type) requests of the same birth date.
+    Requests that need live scoring are scored together in one batched pass
+    """
+    # Pick up a model version requested through another worker and newly published shared files
+    model_registry.poll()
+    shared_state.poll()
+    
+    if not model_loaded:
+        return [{"error": "Recommendation model not loaded"} for _ in requests]
     
     # Calculate age
     today = date.today()
     age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
     
+    responses = [None] * len(requests)
+    contexts = []
+    slots = []
+    for i, (emotion, meal_time, food_type) in enumerate(requests):
+        # Normalize input
+        emotion = emotion.lower() if emotion else "neutral"
+        if emotion not in SUPPORTED_EMOTIONS:
+            responses[i] = {
+                "error": f"Unsupported emotion: {emotion}. Valid emotions are: {', '.join(SUPPORTED_EMOTIONS)}",
+                "status": "error"
+            }
+            continue
+        if not meal_time or meal_time not in SUPPORTED_MEAL_TYPES:
+            responses[i] = {
+                "error": f"Unsupported meal type: {meal_time}. Valid meal types are: {', '.join(SUPPORTED_MEAL_TYPES)}",
+                "status": "error"
+            }
+            continue
+        contexts.append((emotion, meal_time, age, food_type))
+        slots.append(i)
+    
     try:
-        # Get recommendations using parallel approach
-        recommendation, alternatives = parallel_with_direct_scoring(
-            emotion=emotion,
-            meal_type=meal_time,
-            age=age,
-            food_type=food_type
-        )
-        
+        # Get recommendations using parallel approach, with one model bundle for the whole pass
+        with model_swap.reading():
+            results = parallel_with_direct_scoring_batch(contexts)
+    except Exception as e:
+        logger.error("Error in recommendation process: %s", e)
+        for i in slots:
+            responses[i] = {
+                "error": f"Failed to generate recommendations: {str(e)}",
+                "status": "error"
+            }
+        return responses
+    
+    for i, (emotion, _, _, food_type), (recommendation, alternatives) in zip(slots, contexts, results):
         # Check to see if a recommendation is found.
         if not recommendation:
-            return {
+            responses[i] = {
                 "error": f"No suitable food found for {emotion} emotion" + 
                         (f" and {food_type} type" if food_type else ""),
                 "status": "error"
             }
+            continue
         
         # Check emotions directly in EMOTION_PRIORITY_NUTRIENTS
         if emotion not in EMOTION_PRIORITY_NUTRIENTS:
-            return {
+            responses[i] = {
                 "error": f"Priority nutrients not defined for emotion: {emotion}",
                 "status": "error"
             }
-            
-        # Get priority nutrients directly
-        priority_nutrients = EMOTION_PRIORITY_NUTRIENTS[emotion]
+            continue
         
-        return {
+        responses[i] = {
             'status': 'success',
             'recommendation': recommendation,
             'alternatives': alternatives,
-            'priority_nutrients': priority_nutrients
+            'priority_nutrients': EMOTION_PRIORITY_NUTRIENTS[emotion]
+        }
+    
+    return responses
+
+class ScoringContext:
+    """
+    Request-scoped memo of get_food_recommendations results for one emotion and birth date.
+    prefetch() scores every missing (meal_time, food_type) variant in one batched pass and
+    recommendations() serves memoized results, so fallback strategies never rescore a variant.
+    Results are shared between callers and must not be modified (copy them first)
+    """
+    
+    def __init__(self, emotion, birth_date):
+        self.emotion = emotion
+        self.birth_date = birth_date
+        self._results = {}
+    
+    def prefetch(self, variants):
+        """Score all variants that are not memoized yet together"""
+        missing = [v for v in dict.fromkeys((meal_time, food_type or None) for meal_time, food_type in variants)
+                   if v not in self._results]
+        if missing:
+            results = get_food_recommendations_batch(self.emotion, self.birth_date, missing)
+            self._results.update(zip(missing, results))
+    
+    def recommendations(self, meal_time, food_type=None):
+        """Same result as get_food_recommendations(emotion, birth_date, meal_time=..., food_type=...)"""
+        key = (meal_time, food_type or None)
+        if key not in self._results:
+            self.prefetch([key])
+        return self._results[key]
+    
+    @classmethod
+    def prefetch_many(cls, birth_date, requests):
+        """ScoringContexts by emotion for (emotion, meal_time, food_type) requests, all scored in one batched pass"""
+        scorings = {}
+        for emotion, _, _ in requests:
+            scorings.setdefault(emotion, cls(emotion, birth_date))
+        
+        missing = list(dict.fromkeys((emotion, meal_time, food_type or None) for emotion, meal_time, food_type in requests))
+        if not missing:
+            return scorings
+        for (emotion, meal_time, food_type), result in zip(missing, get_food_recommendations_multi(birth_date, missing)):
+            scorings[emotion]._results[(meal_time, food_type)] = result
+        return scorings
+
+def recommendation_variants(meal_time, food_type, disliked_foods):
+    """
+    (meal_time, food_type) variants personalized_recommendation may read: the context itself and,
+    for users with dislikes, the fallbacks to any food type and to the other meal times
+    """
+    variants = [(meal_time, food_type)]
+    if disliked_foods:
+        if food_type:
+            variants.append((meal_time, None))
+        variants.extend((mt, food_type) for mt in SUPPORTED_MEAL_TYPES if mt != meal_time)
+    return variants
+
+def meal_plan_problem(emotions, age_group, meal_times, disliked_foods=None):
+    """
+    Arrays of a meal plan for solve_plan: the (slots x foods) direct score matrix with -inf for
+    foods over the age group's limits or disliked in the slot's context, the nutrient values
+    (foods x nutrients), the daily budget (NUTRITION_GENERAL_LIMITS of the age group) and the day of each slot.
+    disliked_foods maps (emotion, meal_time) to food names
+    """
+    slots = [(day, emotion, meal_time) for day, emotion in enumerate(emotions) for meal_time in meal_times]
+    
+    # One direct score row per slot, gathered from the tensor
+    rows = {emotion: direct_score_tensor.scores(emotion, age_group) for emotion in set(emotions)}
+    scores = np.stack([rows[emotion] for _, emotion, _ in slots]).astype(float)
+    scores[:, ~nutrient_limits.eligible_mask(age_group)] = -np.inf
+    
+    for i, (_, emotion, meal_time) in enumerate(slots):
+        for food in (disliked_foods or {}).get((emotion, meal_time), ()):
+            food_id = food_catalog.id_of(food)
+            if food_id is not None:
+                scores[i, food_id] = -np.inf
+    
+    # Unreadable values count as zero towards the daily totals
+    values = np.nan_to_num(np.asarray(nutrient_limits.values, dtype=float), nan=0.0)
+    budget = nutrient_limits.limits[age_group]
+    return scores, values, budget, [day for day, _, _ in slots]
+
+def get_meal_plan(birth_date, emotions, meal_times=None, disliked_foods=None):
+    """
+    Plan one food per meal time for each day of an emotion trajectory (one emotion per day, up to
+    MAX_PLAN_DAYS), maximizing the summed compatibility scores with every day's nutrients within
+    NUTRITION_GENERAL_LIMITS for the user's age group. disliked_foods maps (emotion, meal_time)
+    to food names that are never planned for that context
+    """
+    # Pick up a model version requested through another worker and newly published shared files
+    model_registry.poll()
+    shared_state.poll()
+    
+    if not model_loaded:
+        return {"error": "Recommendation model not loaded"}
+    
+    # Normalize input
+    if not emotions or len(emotions) > MAX_PLAN_DAYS:
+        return {
+            "error": f"A meal plan covers 1 to {MAX_PLAN_DAYS} days, one emotion per day",
+            "status": "error"
         }
+    emotions = [emotion.lower() if emotion else "neutral" for emotion in emotions]
+    for emotion in emotions:
+        if emotion not in SUPPORTED_EMOTIONS:
+            return {
+                "error": f"Unsupported emotion: {emotion}. Valid emotions are: {', '.join(SUPPORTED_EMOTIONS)}",
+                "status": "error"
+            }
+    meal_times = meal_times or SUPPORTED_MEAL_TYPES
+    for meal_time in meal_times:
+        if meal_time not in SUPPORTED_MEAL_TYPES:
+            return {
+                "error": f"Unsupported meal type: {meal_time}. Valid meal types are: {', '.join(SUPPORTED_MEAL_TYPES)}",
+                "status": "error"
+            }
+    meal_times = [meal_time for meal_time in SUPPORTED_MEAL_TYPES if meal_time in meal_times]
+    
+    # Calculate age
+    today = date.today()
+    age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+    age_group = 'adult' if age > 15 else 'child'
     
+    try:
+        # One model bundle (catalog, limits, direct scores) for the whole plan
+        with model_swap.reading():
+            with stage('plan_scores'):
+                scores, values, budget, slot_days = meal_plan_problem(
+                    emotions, age_group, meal_times,
+                    {(emotion.lower(), meal_time): foods for (emotion, meal_time), foods in (disliked_foods or {}).items()}
+                )
+            with stage('plan_solver'):
+                choice, totals = solve_plan(scores, values, budget, slot_days)
+            
+            days = []
+            for day, emotion in enumerate(emotions):
+                meals = []
+                for slot in range(day * len(meal_times), (day + 1) * len(meal_times)):
+                    meal_time = meal_times[slot % len(meal_times)]
+                    food_id = choice[slot]
+                    if food_id < 0:
+                        meals.append({'meal_time': meal_time, 'food': None})
+                        continue
+                    record = food_catalog.record(food_id)
+                    meals.append({
+                        'meal_time': meal_time,
+                        'food': record.name,
+                        'type': record.food_type,
+                        'compatibility_score': float(scores[slot, food_id]),
+                        'nutrition_data': nutrition_payloads.get(food_catalog, record.id),
+                        'image_url': record.image_url
+                    })
+                
+                within_limits = bool(budget_excess(totals[day], budget) <= 0)
+                days.append({
+                    'day': day + 1,
+                    'emotion': emotion,
+                    'priority_nutrients': EMOTION_PRIORITY_NUTRIENTS[emotion],
+                    'meals': meals,
+                    'score': round(sum(meal.get('compatibility_score', 0.0) for meal in meals), 2),
+                    'within_limits': within_limits,
+                    'exceeded_nutrients': [
+                        nutrient for nutrient, total, limit in zip(nutrient_limits.nutrients, totals[day], budget)
+                        if total > limit
+                    ],
+                    'nutrient_totals': {
+                        nutrient: round(float(total), 6) for nutrient, total in zip(nutrient_limits.nutrients, totals[day])
+                    }
+                })
     except Exception as e:
-        print(f"Error in recommendation process: {e}")
+        logger.error("Error in meal plan process: %s", e)
         return {
-            "error": f"Failed to generate recommendations: {str(e)}",
+            "error": f"Failed to generate meal plan: {str(e)}",
             "status": "error"
         }
+    
+    return {
+        'status': 'success',
+        'age_group': age_group,
+        'meal_times': meal_times,
+        'days': days,
+        'total_score': round(sum(day['score'] for day in days), 2)
+    }
+
+def get_food_nutrition_data(food_name):
+    """Read-only nutrition data of a catalog food by name, empty if the food is unknown"""
+    food_id = food_catalog.id_of(food_name) if food_catalog is not None else None
+    if food_id is None:
+        return {}
+    return nutrition_payloads.get(food_catalog, food_id)
 
 def get_available_nutrients():
     """Return list of nutrients that can be selected by the user"""
@@ -480,103 +1084,45 @@ def get_available_nutrients():
     ]
 
 def get_user_history(user_id):
-    """Get user's food selection history from database"""
-    from database.db_init import UserFoodLog, db
-    
-    history_entries = UserFoodLog.query.filter_by(user_id=user_id).all()
+    """Get user's food selection history, cached until the user rates or selects a food"""
     user_history = []
     
-    for entry in history_entries:
-        if entry.feedback_rating:
+    for entry in cached_user_history(user_id):
+        if entry.rating:
             user_history.append({
-                'food': entry.recommended_food,
-                'rating': entry.feedback_rating,
+                'food': entry.food,
+                'rating': entry.rating,
                 'mood': entry.mood,
                 'meal_time': entry.meal_time,
-                'timestamp': entry.created_at
+                'timestamp': entry.timestamp
             })
     
     return user_history
 
-def get_user_context_history(user_id, emotion, meal_time, food_type):
-    """Get user's rating history for specific context (emotion + meal_time + food_type)"""
-    from database.db_init import UserFoodLog, db
-    
-    query = UserFoodLog.query.filter_by(
-        user_id=user_id,
-        mood=emotion.lower(),
-        meal_time=meal_time
-    )
-    
-    # Add food_type filter if specified
-    if food_type:
-        query = query.filter_by(food_type=food_type)
-    
-    history_entries = query.filter(UserFoodLog.feedback_rating.isnot(None)).all()
-    
-    context_history = []
-    for entry in history_entries:
-        context_history.append({
-            'food': entry.recommended_food,
-            'rating': entry.feedback_rating,
-            'food_type': entry.food_type,
-            'timestamp': entry.created_at
-        })
-    
-    return context_history
+def get_user_context_history(user_id, emotion, meal_time, food_type, snapshot=None):
+    """
+    Get user's rating history for specific context (emotion + meal_time + food_type).
+    A ContextSnapshot of the same context returns its already fetched rows
+    """
+    return context_snapshot(snapshot, user_id, emotion, meal_time, food_type).history()
 
-def get_all_available_foods_for_context(emotion, meal_time, age, food_type):
-    """Get all foods that could potentially be recommended for this context"""
-    try:
-        # Get base recommendations to see what foods are available
-        base_recs = get_food_recommendations(
-            emotion, 
-            date.today() - timedelta(days=age*365), 
-            meal_time=meal_time, 
-            food_type=food_type
-        )
-        
-        if 'error' in base_recs:
-            return []
-        
-        # Get all foods from recommendation and alternatives
-        all_foods = []
-        
-        if base_recs.get('recommendation'):
-            all_foods.append(base_recs['recommendation']['food'])
-        
-        for alt in base_recs.get('alternatives', []):
-            if alt.get('food'):
-                all_foods.append(alt['food'])
-        
-        # Also get from food_data directly if we have access
-        try:
-            age_group = 'adult' if age > 15 else 'child'
-            
-            # Filter by food type if specified
-            if food_type:
-                filtered_foods = food_data[food_data['food_type'] == food_type]
-            else:
-                filtered_foods = food_data
-            
-            # Filter by nutrition limits
-            valid_foods = filtered_foods[filtered_foods.apply(
-                lambda row: check_nutrient_limits(row, age_group), axis=1
-            )]
-            
-            for _, food_row in valid_foods.iterrows():
-                food_name = food_row['food']
-                if food_name not in all_foods:
-                    all_foods.append(food_name)
-        except Exception as e:
-            print(f"⚠️ Could not access food_data directly: {e}")
-            # Continue with just the foods from base recommendations
-        
-        return list(set(all_foods))  # Remove duplicates
-        
-    except Exception as e:
-        print(f"Error getting available foods: {e}")
+def get_recommended_foods_for_context(meal_time, food_type, scoring_context=None):
+    """
+    Foods of the memoized recommendations of a ScoringContext for this context. They may fall back
+    beyond the food type, so they are added to the eligible foods when counting the available ones
+    """
+    if scoring_context is None:
         return []
+    
+    base_recs = scoring_context.recommendations(meal_time, food_type)
+    if 'error' in base_recs:
+        return []
+    
+    foods = []
+    if base_recs.get('recommendation'):
+        foods.append(base_recs['recommendation']['food'])
+    foods.extend(alt['food'] for alt in base_recs.get('alternatives', []) if alt.get('food'))
+    return foods
 
 def analyze_food_state_transition(ratings):
     """
@@ -608,57 +1154,21 @@ def analyze_food_state_transition(ratings):
     
     current_state = 'neutral'  # All foods start neutral
     consecutive_low_from_liked = 0  # Track consecutive low ratings from liked state
+    debug = logger.isEnabledFor(logging.DEBUG)
     
-    for i, rating_entry in enumerate(ratings_chronological):
+    for rating_entry in ratings_chronological:
         rating = rating_entry['rating']
+        previous_state = current_state
+        current_state, consecutive_low_from_liked = food_state_step(
+            current_state, consecutive_low_from_liked, rating
+        )
         
-        if current_state == 'neutral':
-            if rating >= 4:
-                current_state = 'liked'
-                consecutive_low_from_liked = 0  # Reset counter
-                print(f"  State transition: NEUTRAL → LIKED (rating: {rating})")
-            elif rating <= 2:
-                current_state = 'disliked'
-                print(f"  State transition: NEUTRAL → DISLIKED (rating: {rating})")
-            # Rating = 3 stays neutral
-        
-        elif current_state == 'liked':
-            if rating <= 2:
-                consecutive_low_from_liked += 1
-                if consecutive_low_from_liked == 1:
-                    # First low rating from liked state → back to neutral
-                    current_state = 'neutral'
-                    print(f"  State transition: LIKED → NEUTRAL (1st low rating: {rating})")
-                elif consecutive_low_from_liked >= 2:
-                    # Second consecutive low rating from liked → disliked
-                    current_state = 'disliked'
-                    print(f"  State transition: LIKED → DISLIKED (2nd low rating: {rating})")
-            elif rating >= 4:
-                # High rating maintains liked state
-                consecutive_low_from_liked = 0  # Reset counter
-                print(f"  State maintained: LIKED (rating: {rating})")
-            else:
-                # Rating = 3 from liked goes to neutral
-                current_state = 'neutral'
-                consecutive_low_from_liked = 0  # Reset counter
-                print(f"  State transition: LIKED → NEUTRAL (rating: {rating})")
-        
-        elif current_state == 'disliked':
-            if rating >= 4:
-                # High rating from disliked gives second chance (neutral)
-                current_state = 'neutral'
-                consecutive_low_from_liked = 0  # Reset counter
-                print(f"  State transition: DISLIKED → NEUTRAL (2nd chance, rating: {rating})")
-            elif rating == 3:
-                # Neutral rating from disliked also gives second chance
-                current_state = 'neutral'
-                consecutive_low_from_liked = 0  # Reset counter
-                print(f"  State transition: DISLIKED → NEUTRAL (2nd chance, rating: {rating})")
-            # Low rating maintains disliked state
+        if debug and current_state != previous_state:
+            logger.debug("State transition: %s → %s (rating: %s)", previous_state.upper(), current_state.upper(), rating)
     
     return current_state
 
-def analyze_food_preferences_by_context(user_id, emotion, meal_time, food_type):
+def analyze_food_preferences_by_context(user_id, emotion, meal_time, food_type, snapshot=None):
     """
     Simplified food preference analysis:
     - All foods start as NEUTRAL
@@ -667,118 +1177,93 @@ def analyze_food_preferences_by_context(user_id, emotion, meal_time, food_type):
     - LIKED + Low rating (1st time) = NEUTRAL
     - LIKED + Low rating (2nd time) = DISLIKED
     """
-    context_history = get_user_context_history(user_id, emotion, meal_time, food_type)
+    # States are maintained incrementally as ratings arrive (see models/preference_state.py)
+    context_states = context_snapshot(snapshot, user_id, emotion, meal_time, food_type).states()
     
-    if not context_history:
-        print(f"No context history for {emotion}-{meal_time}-{food_type or 'Any'}")
+    if not context_states:
+        logger.debug("No context history for %s-%s-%s", emotion, meal_time, food_type or 'Any')
         return {}, {}, {}
     
-    # Group ratings by food and sort by timestamp (most recent first)
-    food_ratings = {}
-    for entry in context_history:
-        food = entry['food']
-        rating = entry['rating']
-        timestamp = entry['timestamp']
-        
-        if food not in food_ratings:
-            food_ratings[food] = []
-        
-        food_ratings[food].append({
-            'rating': rating,
-            'timestamp': timestamp
-        })
-    
-    # Sort ratings by timestamp for each food (most recent first)
-    for food in food_ratings:
-        food_ratings[food].sort(key=lambda x: x['timestamp'], reverse=True)
-    
-    # Categorize foods based on simplified logic
+    # Categorize foods based on their current state
     liked_foods = {}      # food -> latest_rating
     neutral_foods = {}    # food -> latest_rating  
     disliked_foods = {}   # food -> latest_rating
     
-    for food, ratings in food_ratings.items():
-        # Analyze rating history to determine current state
-        current_state = analyze_food_state_transition(ratings)
-        
-        latest_rating = ratings[0]['rating']  # Most recent rating
-        
+    for food, current_state, latest_rating in context_states:
         if current_state == 'liked':
             liked_foods[food] = latest_rating
-            print(f"👍 {food}: LIKED (latest rating: {latest_rating})")
         elif current_state == 'disliked':
             disliked_foods[food] = latest_rating
-            print(f"👎 {food}: DISLIKED (latest rating: {latest_rating})")
         else:  # neutral
             neutral_foods[food] = latest_rating
-            print(f"😐 {food}: NEUTRAL (latest rating: {latest_rating})")
     
-    print(f"Context analysis for {emotion}-{meal_time}-{food_type or 'Any'}:")
-    print(f"   👍 Liked: {list(liked_foods.keys())}")
-    print(f"   😐 Neutral: {list(neutral_foods.keys())}")
-    print(f"   👎 Disliked: {list(disliked_foods.keys())}")
+    # Per-food lines are only built when debug logging is on
+    if logger.isEnabledFor(logging.DEBUG):
+        for food, current_state, latest_rating in context_states:
+            logger.debug("%s: %s (latest rating: %s)", food, current_state.upper(), latest_rating)
+        logger.debug(
+            "Context analysis for %s-%s-%s", emotion, meal_time, food_type or 'Any',
+            extra={'fields': {
+                'liked': list(liked_foods.keys()),
+                'neutral': list(neutral_foods.keys()),
+                'disliked': list(disliked_foods.keys())
+            }}
+        )
     
     return liked_foods, neutral_foods, disliked_foods
 
-def reset_disliked_foods_to_neutral(user_id, emotion, meal_time, food_type):
+def reset_disliked_foods_to_neutral(user_id, emotion, meal_time, food_type, snapshot=None):
     """
     Reset all disliked foods to neutral for this specific context
     by adding new neutral ratings (rating = 3) instead of modifying existing ones
     """
-    from database.db_init import UserFoodLog, db
+    from database.db_init import db
     
     try:
         # Get current preferences
         liked_foods, neutral_foods, disliked_foods = analyze_food_preferences_by_context(
-            user_id, emotion, meal_time, food_type
+            user_id, emotion, meal_time, food_type, snapshot=snapshot
         )
         
         if not disliked_foods:
-            print("No disliked foods to reset")
+            logger.debug("No disliked foods to reset")
             return 0
         
-        # Add neutral ratings (3) for all currently disliked foods
-        reset_count = 0
-        for food_name in disliked_foods.keys():
-            # Create a new log entry with neutral rating
-            new_log = UserFoodLog(
-                user_id=user_id,
-                mood=emotion.lower(),
-                meal_time=meal_time,
-                food_type=food_type or '',
-                recommended_food=food_name,
-                feedback_rating=3  # Neutral rating
-            )
-            
-            db.session.add(new_log)
-            reset_count += 1
-            print(f"Added neutral rating for: {food_name}")
+        # Add neutral ratings (3) for all currently disliked foods, in one multi-row insert
+        neutral_ratings = [
+            {
+                'user_id': user_id,
+                'mood': emotion.lower(),
+                'meal_time': meal_time,
+                'food_type': food_type or '',
+                'recommended_food': food_name,
+                'feedback_rating': 3  # Neutral rating
+            }
+            for food_name in disliked_foods.keys()
+        ]
+        record_ratings(neutral_ratings)
+        reset_count = len(neutral_ratings)
         
-        db.session.commit()
+        if snapshot is not None:
+            snapshot.refresh()
         
-        print(f"Reset {reset_count} disliked foods to neutral for context {emotion}-{meal_time}-{food_type or 'Any'}")
+        logger.info(
+            "Reset %d disliked foods to neutral for context %s-%s-%s",
+            reset_count, emotion, meal_time, food_type or 'Any',
+            extra={'fields': {'user_id': user_id, 'foods': list(disliked_foods.keys())}}
+        )
         
         return reset_count
         
     except Exception as e:
-        print(f"Error resetting disliked foods: {e}")
+        logger.error("Error resetting disliked foods: %s", e)
         db.session.rollback()
         return 0
 
-def get_user_context_statistics(user_id, emotion, meal_time, food_type=None):
+def get_user_context_statistics(user_id, emotion, meal_time, food_type=None, snapshot=None):
     """Get statistics about user's rating history for a specific context with state analysis"""
-    from database.db_init import UserFoodLog, db
-    
-    query = UserFoodLog.query.filter_by(
-        user_id=user_id,
-        mood=emotion.lower(),
-        meal_time=meal_time
-    )
-    
-    if food_type:
-        query = query.filter_by(food_type=food_type)
-    
-    entries = query.filter(UserFoodLog.feedback_rating.isnot(None)).all()
+    snapshot = context_snapshot(snapshot, user_id, emotion, meal_time, food_type)
+    entries = snapshot.history()
     
     if not entries:
         return {
@@ -790,8 +1275,8 @@ def get_user_context_statistics(user_id, emotion, meal_time, food_type=None):
         }
     
     # Calculate basic statistics
-    ratings = [entry.feedback_rating for entry in entries]
-    unique_foods = set([entry.recommended_food for entry in entries])
+    ratings = [entry['rating'] for entry in entries]
+    unique_foods = set([entry['food'] for entry in entries])
     
     rating_distribution = {}
     for rating in range(1, 6):
@@ -799,7 +1284,7 @@ def get_user_context_statistics(user_id, emotion, meal_time, food_type=None):
     
     # Calculate current state distribution
     liked_foods, neutral_foods, disliked_foods = analyze_food_preferences_by_context(
-        user_id, emotion, meal_time, food_type
+        user_id, emotion, meal_time, food_type, snapshot=snapshot
     )
     
     state_distribution = {
@@ -817,33 +1302,38 @@ def get_user_context_statistics(user_id, emotion, meal_time, food_type=None):
         'latest_ratings': ratings[-5:] if len(ratings) >= 5 else ratings
     }
 
-def log_recommendation_context(user_id, emotion, meal_time, food_type, recommended_food, context_info=None):
-    """Log additional context information when making recommendations"""
+def log_recommendation_context(user_id, emotion, meal_time, food_type, recommended_food, context_info=None,
+                               snapshot=None):
+    """Log additional context information when making recommendations, as one structured record"""
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    
     try:
-        # This could be used to log recommendation context for analytics
-        # For now, we'll just print debug info
-        stats = get_user_context_statistics(user_id, emotion, meal_time, food_type)
-        
-        print(f"📊 Context Statistics for user {user_id}:")
-        print(f"   Context: {emotion}-{meal_time}-{food_type or 'Any'}")
-        print(f"   Total ratings: {stats['total_ratings']}")
-        print(f"   Unique foods tried: {stats['unique_foods']}")
-        print(f"   Average rating: {stats['avg_rating']:.2f}")
-        print(f"   Rating distribution: {stats['rating_distribution']}")
-        print(f"   State distribution: {stats['state_distribution']}")
-        print(f"   Recommended: {recommended_food}")
+        stats = get_user_context_statistics(user_id, emotion, meal_time, food_type, snapshot=snapshot)
         
-        if context_info:
-            print(f"   Context info: {context_info}")
+        logger.info(
+            "Recommendation context for user %s: %s-%s-%s", user_id, emotion, meal_time, food_type or 'Any',
+            extra={'fields': {
+                'user_id': user_id,
+                'context': f"{emotion}-{meal_time}-{food_type or 'Any'}",
+                'total_ratings': stats['total_ratings'],
+                'unique_foods': stats['unique_foods'],
+                'avg_rating': round(stats['avg_rating'], 2),
+                'rating_distribution': stats['rating_distribution'],
+                'state_distribution': stats['state_distribution'],
+                'recommended': recommended_food,
+                'context_info': context_info
+            }}
+        )
             
     except Exception as e:
-        print(f"Error logging recommendation context: {e}")
+        logger.error("Error logging recommendation context: %s", e)
 
-def predict_user_satisfaction(user_id, emotion, meal_time, food_type, recommended_food):
+def predict_user_satisfaction(user_id, emotion, meal_time, food_type, recommended_food, snapshot=None):
     """Predict how likely the user is to like the recommended food based on context history"""
     try:
         # Get user's history for this context
-        context_history = get_user_context_history(user_id, emotion, meal_time, food_type)
+        context_history = get_user_context_history(user_id, emotion, meal_time, food_type, snapshot=snapshot)
         
         if not context_history:
             return 0.5  # Neutral probability for new context
@@ -864,10 +1354,11 @@ def predict_user_satisfaction(user_id, emotion, meal_time, food_type, recommende
         return (avg_context_rating - 1) / 4  # Scale from 1-5 to 0-1
         
     except Exception as e:
-        print(f"Error predicting user satisfaction: {e}")
+        logger.error("Error predicting user satisfaction: %s", e)
         return 0.5  # Default neutral probability
 
-def personalized_recommendation(user_id, emotion, age, meal_time, preferred_food_type=None):
+def personalized_recommendation(user_id, emotion, age, meal_time, preferred_food_type=None, snapshot=None,
+                                scoring=None, auto_reset=True):
     """
     Personalized recommendation system with simplified state logic:
     - All foods start NEUTRAL
@@ -875,6 +1366,10 @@ def personalized_recommendation(user_id, emotion, age, meal_time, preferred_food
     - NEUTRAL + Low rating (≤2) = DISLIKED
     - LIKED + Low rating (1st time) = NEUTRAL
     - LIKED + Low rating (2nd time) = DISLIKED
+    snapshot is the request's ContextSnapshot, shared with the statistics and satisfaction helpers;
+    scoring is a ScoringContext of this emotion and age already holding other contexts' results.
+    With auto_reset off a context whose options are (nearly) all disliked is not reset: nothing is
+    written and the result has status 'context_reset' instead of recommendations
     """
     # Input validation
     if emotion.lower() not in SUPPORTED_EMOTIONS:
@@ -896,21 +1391,26 @@ def personalized_recommendation(user_id, emotion, age, meal_time, preferred_food
         }
     
     try:
-        print(f"Getting personalized recommendations for user {user_id}")
-        print(f"   Context: {emotion} + {meal_time} + {preferred_food_type or 'Any'}")
+        logger.debug("Getting personalized recommendations for user %s: %s + %s + %s",
+                     user_id, emotion, meal_time, preferred_food_type or 'Any')
         
         # Get context-specific user preferences with simplified logic
-        liked_foods, neutral_foods, disliked_foods = analyze_food_preferences_by_context(
-            user_id, emotion, meal_time, preferred_food_type
-        )
+        with stage('preferences'):
+            snapshot = context_snapshot(snapshot, user_id, emotion, meal_time, preferred_food_type)
+            liked_foods, neutral_foods, disliked_foods = analyze_food_preferences_by_context(
+                user_id, emotion, meal_time, preferred_food_type, snapshot=snapshot
+            )
+        
+        # Every recommendation variant of this request is scored once and memoized
+        if scoring is None:
+            scoring = ScoringContext(emotion, date.today() - timedelta(days=age*365))
+        
+        # Users with dislikes may need the fallback variants, so score them with the base in one pass
+        with stage('base_scoring'):
+            scoring.prefetch(recommendation_variants(meal_time, preferred_food_type, disliked_foods))
         
         # Get base recommendations for this context
-        base_recs = get_food_recommendations(
-            emotion, 
-            date.today() - timedelta(days=age*365), 
-            meal_time=meal_time, 
-            food_type=preferred_food_type
-        )
+        base_recs = scoring.recommendations(meal_time, preferred_food_type)
         
         if 'error' in base_recs:
             return base_recs
@@ -941,7 +1441,7 @@ def personalized_recommendation(user_id, emotion, age, meal_time, preferred_food
                 rec_copy['food_state'] = 'liked'
                 rec_copy['context_rating'] = liked_foods[rec['food']]
                 personalized_recommendations.append(rec_copy)
-                print(f"Found LIKED food: {rec.get('food')} (rating: {liked_foods[rec['food']]})")
+                logger.debug("Found LIKED food: %s (rating: %s)", rec.get('food'), liked_foods[rec['food']])
         
         # Priority 2: NEUTRAL foods (both rated neutral and never tried)
         for rec in all_recommendations:
@@ -959,114 +1459,115 @@ def personalized_recommendation(user_id, emotion, age, meal_time, preferred_food
                 
                 personalized_recommendations.append(rec_copy)
         
-        # *** CHECK IF ALL AVAILABLE OPTIONS ARE DISLIKED ***
-        if not personalized_recommendations and disliked_foods:
-            print(f"⚠️ All available options are DISLIKED for this context!")
-            
-            # Get all possible foods for this context
-            all_available_foods = get_all_available_foods_for_context(
-                emotion, meal_time, age, preferred_food_type
-            )
-            
-            print(f"Total available foods for context: {len(all_available_foods)}")
-            print(f"Currently disliked foods: {len(disliked_foods)}")
-            
-            # Check if we've disliked most available options (threshold: 80%)
-            disliked_ratio = len(disliked_foods) / max(len(all_available_foods), 1)
-            
-            if disliked_ratio >= 0.8:  # If 80% or more are disliked
-                print(f"AUTO-RESET: Disliked ratio is {disliked_ratio:.2f} (≥80%)")
-                print(f"Resetting {len(disliked_foods)} disliked foods to NEUTRAL...")
+        with stage('fallback'):
+            # *** CHECK IF ALL AVAILABLE OPTIONS ARE DISLIKED ***
+            if not personalized_recommendations and disliked_foods:
+                logger.debug("All available options are DISLIKED for this context")
                 
-                # Reset all disliked foods to neutral by adding neutral ratings
-                reset_count = reset_disliked_foods_to_neutral(
-                    user_id, emotion, meal_time, preferred_food_type
-                )
+                # All possible foods for this context: the eligible ones plus the recommendations
+                age_group = 'adult' if age > 15 else 'child'
+                recommended_foods = get_recommended_foods_for_context(meal_time, preferred_food_type, scoring_context=scoring)
                 
-                if reset_count > 0:
-                    # Re-analyze preferences after reset
-                    print("🔄 Re-analyzing preferences after reset...")
-                    liked_foods, neutral_foods, disliked_foods = analyze_food_preferences_by_context(
-                        user_id, emotion, meal_time, preferred_food_type
-                    )
-                    
-                    # Now all previously disliked foods should be neutral
-                    for rec in all_recommendations:
-                        if rec:
-                            rec_copy = rec.copy()
-                            rec_copy['personalization_reason'] = "Fresh start! We reset your preferences for this context."
-                            rec_copy['adaptation_note'] = f"We reset {reset_count} foods to neutral to give you fresh options."
-                            rec_copy['food_state'] = 'reset_to_neutral'
-                            rec_copy['context_reset'] = True
-                            personalized_recommendations.append(rec_copy)
-                            print(f"Added reset food: {rec.get('food')}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Available foods: %d, disliked: %d, left after dislikes: %d",
+                                 len(eligible_foods.available(age_group, preferred_food_type, recommended_foods)),
+                                 len(disliked_foods),
+                                 len(eligible_foods.remaining(age_group, preferred_food_type, disliked_foods, recommended_foods)))
                 
-            else:
-                # Not enough foods are disliked yet, try alternative strategies
-                print(f"Trying alternative strategies (disliked ratio: {disliked_ratio:.2f} < 80%)")
+                # Check if we've disliked most available options (threshold: 80%)
+                disliked_ratio = eligible_foods.excluded_ratio(age_group, preferred_food_type, disliked_foods, recommended_foods)
                 
-                # Strategy 1: Expand food type
-                if preferred_food_type:
-                    print("Strategy 1: Expanding beyond preferred food type...")
-                    alt_recs = get_food_recommendations(
-                        emotion, 
-                        date.today() - timedelta(days=age*365), 
-                        meal_time=meal_time, 
-                        food_type=None  # Remove food type restriction
-                    )
+                if disliked_ratio >= 0.8:  # If 80% or more are disliked
+                    if not auto_reset:
+                        logger.info("Context of user %s needs a reset: disliked ratio is %.2f (≥80%%), left unchanged",
+                                    user_id, disliked_ratio)
+                        return {
+                            'status': 'context_reset',
+                            'context_reset': True,
+                            'message': "All options of this context are disliked: it needs a preference reset",
+                            'context': f"{emotion}-{meal_time}-{preferred_food_type or 'Any'}",
+                        }
                     
-                    if 'recommendation' in alt_recs and alt_recs['status'] == 'success':
-                        new_rec = alt_recs.get('recommendation')
-                        if new_rec and new_rec.get('food') not in disliked_foods:
-                            new_rec_copy = new_rec.copy()
-                            new_rec_copy['personalization_reason'] = f"Trying beyond {preferred_food_type} foods for variety!"
-                            new_rec_copy['adaptation_note'] = f"Expanded beyond {preferred_food_type} since you've tried most options."
-                            new_rec_copy['food_state'] = 'expanded_type'
-                            personalized_recommendations.append(new_rec_copy)
-                            print(f"Found expanded food type: {new_rec.get('food')} ({new_rec.get('type')})")
-                
-                # Strategy 2: Try different meal times
-                if not personalized_recommendations:
-                    print("Strategy 2: Trying different meal times...")
-                    alternative_meal_types = [mt for mt in SUPPORTED_MEAL_TYPES if mt != meal_time]
+                    logger.info("AUTO-RESET for user %s: disliked ratio is %.2f (≥80%%)", user_id, disliked_ratio)
+                    
+                    # Reset all disliked foods to neutral by adding neutral ratings
+                    reset_count = reset_disliked_foods_to_neutral(
+                        user_id, emotion, meal_time, preferred_food_type, snapshot=snapshot
+                    )
                     
-                    for alt_meal_type in alternative_meal_types:
-                        alt_recs = get_food_recommendations(
-                            emotion, 
-                            date.today() - timedelta(days=age*365), 
-                            meal_time=alt_meal_type, 
-                            food_type=preferred_food_type
+                    if reset_count > 0:
+                        # Re-analyze preferences after reset
+                        liked_foods, neutral_foods, disliked_foods = analyze_food_preferences_by_context(
+                            user_id, emotion, meal_time, preferred_food_type, snapshot=snapshot
                         )
                         
+                        # Now all previously disliked foods should be neutral
+                        for rec in all_recommendations:
+                            if rec:
+                                rec_copy = rec.copy()
+                                rec_copy['personalization_reason'] = "Fresh start! We reset your preferences for this context."
+                                rec_copy['adaptation_note'] = f"We reset {reset_count} foods to neutral to give you fresh options."
+                                rec_copy['food_state'] = 'reset_to_neutral'
+                                rec_copy['context_reset'] = True
+                                personalized_recommendations.append(rec_copy)
+                                logger.debug("Added reset food: %s", rec.get('food'))
+                    
+                else:
+                    # Not enough foods are disliked yet, try alternative strategies
+                    logger.debug("Trying alternative strategies (disliked ratio: %.2f < 80%%)", disliked_ratio)
+                    
+                    # Strategy 1: Expand food type
+                    if preferred_food_type:
+                        logger.debug("Strategy 1: Expanding beyond preferred food type")
+                        alt_recs = scoring.recommendations(meal_time, None)  # Remove food type restriction
+                        
                         if 'recommendation' in alt_recs and alt_recs['status'] == 'success':
                             new_rec = alt_recs.get('recommendation')
                             if new_rec and new_rec.get('food') not in disliked_foods:
                                 new_rec_copy = new_rec.copy()
-                                new_rec_copy['personalization_reason'] = f"This {alt_meal_type} food matches your {emotion} mood!"
-                                new_rec_copy['adaptation_note'] = f"Trying {alt_meal_type} options for variety."
-                                new_rec_copy['food_state'] = 'different_meal_time'
+                                new_rec_copy['personalization_reason'] = f"Trying beyond {preferred_food_type} foods for variety!"
+                                new_rec_copy['adaptation_note'] = f"Expanded beyond {preferred_food_type} since you've tried most options."
+                                new_rec_copy['food_state'] = 'expanded_type'
                                 personalized_recommendations.append(new_rec_copy)
-                                print(f"Found different meal time: {new_rec.get('food')} ({alt_meal_type})")
-                                break
-        
-        # Final fallback: Use least disliked foods if nothing else works
-        if not personalized_recommendations and disliked_foods:
-            print("Final fallback: Using least disliked foods...")
-            
-            # Sort disliked foods by rating (highest rating among disliked)
-            sorted_disliked = sorted(disliked_foods.items(), key=lambda x: x[1], reverse=True)
+                                logger.debug("Found expanded food type: %s (%s)", new_rec.get('food'), new_rec.get('type'))
+                    
+                    # Strategy 2: Try different meal times
+                    if not personalized_recommendations:
+                        logger.debug("Strategy 2: Trying different meal times")
+                        alternative_meal_types = [mt for mt in SUPPORTED_MEAL_TYPES if mt != meal_time]
+                        
+                        for alt_meal_type in alternative_meal_types:
+                            alt_recs = scoring.recommendations(alt_meal_type, preferred_food_type)
+                            
+                            if 'recommendation' in alt_recs and alt_recs['status'] == 'success':
+                                new_rec = alt_recs.get('recommendation')
+                                if new_rec and new_rec.get('food') not in disliked_foods:
+                                    new_rec_copy = new_rec.copy()
+                                    new_rec_copy['personalization_reason'] = f"This {alt_meal_type} food matches your {emotion} mood!"
+                                    new_rec_copy['adaptation_note'] = f"Trying {alt_meal_type} options for variety."
+                                    new_rec_copy['food_state'] = 'different_meal_time'
+                                    personalized_recommendations.append(new_rec_copy)
+                                    logger.debug("Found different meal time: %s (%s)", new_rec.get('food'), alt_meal_type)
+                                    break
             
-            for food, rating in sorted_disliked[:2]:
-                for rec in all_recommendations:
-                    if rec and rec.get('food') == food:
-                        rec_copy = rec.copy()
-                        rec_copy['personalization_reason'] = f"Your best option among tried foods (Rating: {rating}/5)"
-                        rec_copy['adaptation_note'] = "This was your highest-rated option. Rate again to help us learn!"
-                        rec_copy['food_state'] = 'least_disliked'
-                        rec_copy['context_rating'] = rating
-                        personalized_recommendations.append(rec_copy)
-                        print(f"Added least disliked: {food} (rating: {rating})")
-                        break
+            # Final fallback: Use least disliked foods if nothing else works
+            if not personalized_recommendations and disliked_foods:
+                logger.debug("Final fallback: Using least disliked foods")
+                
+                # Sort disliked foods by rating (highest rating among disliked)
+                sorted_disliked = sorted(disliked_foods.items(), key=lambda x: x[1], reverse=True)
+                
+                for food, rating in sorted_disliked[:2]:
+                    for rec in all_recommendations:
+                        if rec and rec.get('food') == food:
+                            rec_copy = rec.copy()
+                            rec_copy['personalization_reason'] = f"Your best option among tried foods (Rating: {rating}/5)"
+                            rec_copy['adaptation_note'] = "This was your highest-rated option. Rate again to help us learn!"
+                            rec_copy['food_state'] = 'least_disliked'
+                            rec_copy['context_rating'] = rating
+                            personalized_recommendations.append(rec_copy)
+                            logger.debug("Added least disliked: %s (rating: %s)", food, rating)
+                            break
         
         # Absolute last resort
         if not personalized_recommendations and recommendation:
@@ -1075,7 +1576,7 @@ def personalized_recommendation(user_id, emotion, age, meal_time, preferred_food
             rec_copy['adaptation_note'] = "Building your preference profile for this context."
             rec_copy['food_state'] = 'fallback'
             personalized_recommendations.append(rec_copy)
-            print(f"Added fallback: {recommendation.get('food')}")
+            logger.debug("Added fallback: %s", recommendation.get('food'))
         
         # Ensure we have recommendations
         if not personalized_recommendations:
@@ -1091,8 +1592,8 @@ def personalized_recommendation(user_id, emotion, age, meal_time, preferred_food
         adapted = any('adaptation_note' in rec for rec in personalized_recommendations)
         context_reset = any('context_reset' in rec for rec in personalized_recommendations)
         
-        print(f"  Returning {len(personalized_recommendations)} personalized recommendations")
-        print(f"   Adapted: {adapted}, Context Reset: {context_reset}")
+        logger.debug("Returning %d personalized recommendations (adapted: %s, context reset: %s)",
+                     len(personalized_recommendations), adapted, context_reset)
         
         return {
             'status': 'success',
@@ -1111,10 +1612,92 @@ def personalized_recommendation(user_id, emotion, age, meal_time, preferred_food
         }
         
     except Exception as e:
-        print(f" Error in simplified personalized recommendation: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in simplified personalized recommendation: %s", e)
         return {
             "error": f"Failed to generate personalized recommendations: {str(e)}",
             "status": "error"
-        }
\ No newline at end of file
+        }
+
+def personalized_recommendation_batch(user_id, age, contexts, snapshots=None, auto_reset=True):
+    """
+    personalized_recommendation for several (emotion, meal_time, food_type) contexts of one user.
+    The preference states of every context come from one query (see context_snapshots) and the base
+    recommendations of all contexts, fallback variants included, are scored in one batched pass.
+    Returns the results in context order
+    """
+    if snapshots is None:
+        with stage('preferences'):
+            snapshots = context_snapshots(user_id, contexts)
+    
+    # The variants each context may read depend on its dislikes, so analyze them before scoring
+    requests = []
+    with stage('preferences'):
+        for (emotion, meal_time, food_type), snapshot in zip(contexts, snapshots):
+            if (emotion.lower() not in SUPPORTED_EMOTIONS or meal_time not in SUPPORTED_MEAL_TYPES
+                    or (food_type and food_type not in SUPPORTED_FOOD_TYPES)):
+                continue
+            _, _, disliked_foods = analyze_food_preferences_by_context(
+                user_id, emotion, meal_time, food_type, snapshot=snapshot
+            )
+            requests.extend((emotion, mt, ft) for mt, ft in recommendation_variants(meal_time, food_type, disliked_foods))
+    
+    with stage('base_scoring'):
+        scorings = ScoringContext.prefetch_many(date.today() - timedelta(days=age*365), requests)
+    
+    results = []
+    for (emotion, meal_time, food_type), snapshot in zip(contexts, snapshots):
+        result = personalized_recommendation(user_id, emotion, age, meal_time, food_type, snapshot=snapshot,
+                                             scoring=scorings.get(emotion), auto_reset=auto_reset)
+        # An auto-reset wrote ratings that the any-type context of the same mood and meal time also reads
+        if auto_reset and result.get('context_reset'):
+            for other in snapshots:
+                if other.emotion.lower() == emotion.lower() and other.meal_time == meal_time:
+                    other.refresh()
+        results.append(result)
+    return results
+
+# Prepare the inference engine and load the precomputed context score table now that the scoring pipeline is defined
+flat_forests = {}
+init_forest_engine()
+init_score_table()
+
+# Build the nutrition payloads once; a catalog reload rebuilds them and re-checks the score table
+if model_loaded:
+    nutrition_payloads.load(food_catalog)
+on_catalog_reload(nutrition_payloads.invalidate)
+on_catalog_reload(lambda catalog: init_score_table())
+
+# Artifact generation the last background reload started by attach_artifacts was for
+attaching_generation = None
+
+def attach_artifacts():
+    """
+    Reload the base version from a newly published artifact generation (other versions do not use them).
+    The reload runs in the background: this returns True once it succeeded, and starts it again
+    on a later poll when it failed or could not start because another reload was running
+    """
+    global attaching_generation
+    
+    if model_version != BASE_MODEL_VERSION:
+        return True
+    
+    published = artifact_generations.generation()
+    if attaching_generation == published:
+        state = model_registry.status()['state']
+        if state == 'active':
+            return True
+        if state == 'loading':
+            return False
+    
+    if model_registry.reload(BASE_MODEL_VERSION):
+        attaching_generation = published
+    return False
+
+def attach_score_table():
+    """Map a newly published score table generation"""
+    init_score_table()
+    return True
+
+# Workers re-attach when `python -m models.shared_state preload` publishes new files
+shared_state.watch('artifacts', artifact_generations, attach_artifacts)
+shared_state.watch('score_table', score_table_generations, attach_score_table)
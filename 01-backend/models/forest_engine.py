@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+import argparse
+import hashlib
+import json
+import time
+import numpy as np
+from pathlib import Path
+
+# Forests shipped with the recommendation model: name -> pickle file
+FOREST_FILES = {
+    'rank_model': "rank_model.pkl",
+    'reg_model': "score_model.pkl",
+    'binary_model': "binary_model.pkl",
+}
+
+# Rows traversed per chunk, keeps the (trees x rows) node index array small
+CHUNK_NODES = 1 << 20
+
+def file_digest(path):
+    """SHA-256 of a file, used to tie exported arrays to the pickle they came from"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class FlatForest:
+    """
+    A fitted sklearn RandomForest flattened into contiguous NumPy arrays.
+
+    All trees share one node table (feature, threshold, children, leaf value);
+    roots holds the offset of each tree. Leaves point to themselves so a batch can be
+    walked for a fixed number of steps without masking. Predictions follow sklearn's
+    float32 input cast and tree-by-tree accumulation, so results are bit-for-bit equal.
+
+    The arrays are only read, so they can be memory-mapped from files written by save().
+    """
+
+    # Arrays written by save(), one .npy file each
+    ARRAY_FIELDS = ['feature', 'threshold', 'children', 'value', 'roots']
+
+    def __init__(self, kind, feature, threshold, children, value, roots, max_depth,
+                 n_features, classes=None, source_digest=''):
+        self.kind = kind  # 'regressor' or 'classifier'
+        self.feature = feature
+        self.threshold = threshold
+        # Interleaved (right, left) children: the next node is children[2 * node + go_left]
+        self.children = children
+        self.value = value  # (n_nodes,) for regressors, (n_nodes, n_classes) for classifiers
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.classes = classes
+        self.source_digest = source_digest
+
+    @property
+    def left(self):
+        return self.children[1::2]
+
+    @property
+    def right(self):
+        return self.children[0::2]
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model, source_digest=''):
+        """Flatten a fitted RandomForestRegressor or RandomForestClassifier"""
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError("Only single-output forests are supported")
+
+        is_classifier = hasattr(model, 'classes_')
+        n_classes = len(model.classes_) if is_classifier else 1
+
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            children.append(np.stack([
+                np.where(is_leaf, node_ids, tree.children_right),
+                np.where(is_leaf, node_ids, tree.children_left)
+            ], axis=1).ravel() + offset)
+            if is_classifier:
+                values.append(tree.value[:, 0, :n_classes])
+            else:
+                values.append(tree.value[:, 0, 0])
+            offset += tree.node_count
+
+        return cls(
+            kind='classifier' if is_classifier else 'regressor',
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.int64),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            children=np.ascontiguousarray(np.concatenate(children), dtype=np.int32),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.array(roots, dtype=np.int32),
+            max_depth=max(estimator.tree_.max_depth for estimator in model.estimators_),
+            n_features=model.n_features_in_,
+            classes=np.asarray(model.classes_) if is_classifier else None,
+            source_digest=source_digest
+        )
+
+    def save(self, directory, name):
+        """Write each array to <name>.<field>.npy and the scalar attributes to <name>.json"""
+        directory = Path(directory)
+        for field in self.ARRAY_FIELDS:
+            np.save(directory / f"{name}.{field}.npy", getattr(self, field))
+        if self.classes is not None:
+            np.save(directory / f"{name}.classes.npy", self.classes)
+        with open(directory / f"{name}.json", 'w') as f:
+            json.dump({
+                'kind': self.kind,
+                'max_depth': self.max_depth,
+                'n_features': self.n_features,
+                'source_digest': self.source_digest
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, directory, name, mmap_mode=None):
+        """Read arrays written by save(); mmap_mode='r' maps them read-only instead of copying"""
+        directory = Path(directory)
+        with open(directory / f"{name}.json", 'r') as f:
+            meta = json.load(f)
+        arrays = {
+            field: np.load(directory / f"{name}.{field}.npy", mmap_mode=mmap_mode, allow_pickle=False)
+            for field in cls.ARRAY_FIELDS
+        }
+        classes_path = directory / f"{name}.classes.npy"
+        return cls(
+            kind=meta['kind'],
+            max_depth=meta['max_depth'],
+            n_features=meta['n_features'],
+            classes=np.load(classes_path, allow_pickle=False) if classes_path.exists() else None,
+            source_digest=meta['source_digest'],
+            **arrays
+        )
+
+    def _check_input(self, X):
+        """Cast input the same way sklearn does before tree traversal"""
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[-1]} features, but the forest expects {self.n_features}")
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity")
+        return X
+
+    def _leaf_values(self, X):
+        """Leaf values reached by every (tree, row) pair, shape (n_trees, n_rows[, n_classes])"""
+        n_rows = X.shape[0]
+        columns = X.T.ravel()  # feature-major, so a (feature, row) pair is one flat index
+        nodes = np.repeat(self.roots[:, None], n_rows, axis=1)
+        rows = np.arange(n_rows, dtype=np.int64)[None, :]
+        for _ in range(self.max_depth):
+            # float32 inputs are compared against float64 thresholds, as in sklearn
+            go_left = columns[self.feature[nodes] * n_rows + rows] <= self.threshold[nodes]
+            nodes = self.children[2 * nodes + go_left]
+        return self.value[nodes]
+
+    def _accumulate(self, X):
+        """Sum leaf values tree by tree (sklearn's accumulation order) and average"""
+        X = self._check_input(X)
+        chunk_rows = max(1, CHUNK_NODES // max(self.n_trees, 1))
+        out_shape = (X.shape[0],) + self.value.shape[1:]
+        out = np.empty(out_shape, dtype=np.float64)
+        for start in range(0, X.shape[0], chunk_rows):
+            leaf_values = self._leaf_values(X[start:start + chunk_rows])
+            # Sequential (not pairwise) summation over trees; + 0.0 mirrors starting from zeros
+            out[start:start + chunk_rows] = np.add.accumulate(leaf_values, axis=0)[-1] + 0.0
+        out /= self.n_trees
+        return out
+
+    def predict(self, X):
+        """Same as RandomForestRegressor.predict / RandomForestClassifier.predict"""
+        if self.kind == 'classifier':
+            return self.classes.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+        return self._accumulate(X)
+
+    def predict_proba(self, X):
+        """Same as RandomForestClassifier.predict_proba"""
+        if self.kind != 'classifier':
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._accumulate(X)
+
+def sample_features(n_rows, seed=0):
+    """Realistic feature rows: random catalog foods under random contexts"""
+    from models import food_recommendation_model as frm
+
+    rng = np.random.default_rng(seed)
+    rows = []
+    remaining = n_rows
+    while remaining > 0:
+        foods = rng.choice(len(frm.food_catalog), size=min(remaining, len(frm.food_catalog)), replace=False)
+        emotion = rng.choice(frm.SUPPORTED_EMOTIONS)
+        meal_type = rng.choice(frm.SUPPORTED_MEAL_TYPES)
+        age = int(rng.integers(5, 90))
+        rows.append(frm.build_feature_matrix(foods, emotion, meal_type, age, int(rng.integers(1, 13))))
+        remaining -= len(foods)
+    return np.vstack(rows)[:n_rows]
+
+def threshold_features(forest, n_rows, seed=0):
+    """Rows with values placed exactly on split thresholds, to exercise the <= comparison"""
+    rng = np.random.default_rng(seed)
+    X = sample_features(n_rows, seed).astype(np.float32)
+    internal = np.flatnonzero(forest.left != np.arange(len(forest.left)))
+    picks = rng.choice(internal, size=(n_rows, 8))
+    for row in range(n_rows):
+        for node in picks[row]:
+            X[row, forest.feature[node]] = np.float32(forest.threshold[node])
+    return X
+
+def check_equivalence(n_rows=2000):
+    """Compare NumPy and sklearn predictions bit for bit; returns True when all match"""
+    from models import food_recommendation_model as frm
+
+    all_equal = True
+    for name in FOREST_FILES:
+        model = frm.load_sklearn_models()[name]
+        forest = FlatForest.from_sklearn(model)
+        for label, X in [('catalog rows', sample_features(n_rows)),
+                         ('threshold rows', threshold_features(forest, n_rows))]:
+            if forest.kind == 'classifier':
+                expected, actual = model.predict_proba(X), forest.predict_proba(X)
+            else:
+                expected, actual = model.predict(X), forest.predict(X)
+            equal = np.array_equal(expected, actual)
+            all_equal = all_equal and equal
+            print(f"{'✅' if equal else '❌'} {name} ({label}): "
+                  f"{'bit-for-bit equal' if equal else f'max diff {np.max(np.abs(expected - actual))}'}")
+    return all_equal
+
+def benchmark(batch_sizes=(1, 10, 100, 1000, 10000), repeats=5):
+    """Print median latency of sklearn vs NumPy inference for each batch size"""
+    from models import food_recommendation_model as frm
+
+    print(f"{'model':<14}{'batch':>8}{'sklearn ms':>14}{'numpy ms':>12}{'speedup':>10}")
+    for name in FOREST_FILES:
+        model = frm.load_sklearn_models()[name]
+        forest = FlatForest.from_sklearn(model)
+        for batch_size in batch_sizes:
+            X = sample_features(batch_size)
+            timings = {}
+            for engine, fn in [('sklearn', model.predict_proba if forest.kind == 'classifier' else model.predict),
+                               ('numpy', forest.predict_proba if forest.kind == 'classifier' else forest.predict)]:
+                samples = []
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    fn(X)
+                    samples.append(time.perf_counter() - start)
+                timings[engine] = float(np.median(samples)) * 1000
+            print(f"{name:<14}{batch_size:>8}{timings['sklearn']:>14.2f}{timings['numpy']:>12.2f}"
+                  f"{timings['sklearn'] / timings['numpy']:>9.1f}x")
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Flattened RandomForest inference utility')
+    parser.add_argument('action', choices=['check', 'bench'],
+                        help='check equivalence with sklearn or benchmark latency')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 100, 1000, 10000],
+                        help='Batch sizes for bench')
+    args = parser.parse_args()
+
+    if args.action == 'check':
+        if not check_equivalence():
+            raise SystemExit(1)
+    elif args.action == 'bench':
+        benchmark(args.batch_sizes)
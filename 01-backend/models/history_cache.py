@@ -0,0 +1,206 @@
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: no file locks, so the counters stay in each process
+    fcntl = None
+
+# One user_food_log row, only the columns the history helpers read
+HistoryEntry = namedtuple('HistoryEntry', ['id', 'food', 'rating', 'mood', 'meal_time', 'food_type', 'timestamp'])
+
+# Cache limits (USER_HISTORY_CACHE_SIZE=0 disables the cache)
+USER_HISTORY_CACHE_SIZE = int(os.getenv("USER_HISTORY_CACHE_SIZE", "1024"))
+USER_HISTORY_CACHE_TTL = float(os.getenv("USER_HISTORY_CACHE_TTL", "300"))
+
+# Per-user history generations shared by every worker process of this host
+USER_HISTORY_GENERATIONS_FILE = Path(os.getenv(
+    "USER_HISTORY_GENERATIONS_FILE", os.path.join(tempfile.gettempdir(), "food-recommendation-history-generations")
+))
+
+# Counters in that file; users are hashed into them, so users sharing one only cause extra reloads
+USER_HISTORY_GENERATION_SLOTS = 65536
+
+_SLOT = struct.Struct('<Q')
+
+class HistoryGenerations:
+    """
+    Write counters of the users' histories, in a file every worker process maps.
+
+    A write to a user's user_food_log rows bumps the user's counter under an exclusive lock of
+    the file, and a worker only serves a cached history while the counter still holds the value
+    it read before loading that history. When the file cannot be opened the counters read as
+    None, which never matches, so nothing is served from the cache. Without fcntl (Windows) the
+    counters are kept in memory, so a write only invalidates the cache of its own process and
+    other workers see it once their entries expire after USER_HISTORY_CACHE_TTL
+    """
+
+    def __init__(self, path=USER_HISTORY_GENERATIONS_FILE, slots=USER_HISTORY_GENERATION_SLOTS):
+        self.path = Path(path)
+        self.slots = slots
+        self._file = None
+        self._map = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def _mapped(self):
+        # Opened on first use; a forked worker keeps the shared mapping of its parent
+        if self._map is None and not self._failed:
+            with self._lock:
+                if self._map is None and fcntl is None:
+                    self._map = bytearray(self.slots * _SLOT.size)
+                    print("⚠️ File locks are not available, user history invalidation only covers this process")
+                elif self._map is None and not self._failed:
+                    try:
+                        self.path.parent.mkdir(parents=True, exist_ok=True)
+                        f = open(self.path, 'a+b')
+                        size = self.slots * _SLOT.size
+                        fcntl.flock(f, fcntl.LOCK_EX)
+                        try:
+                            if os.fstat(f.fileno()).st_size < size:
+                                f.truncate(size)
+                        finally:
+                            fcntl.flock(f, fcntl.LOCK_UN)
+                        self._file, self._map = f, mmap.mmap(f.fileno(), size)
+                    except OSError as e:
+                        self._failed = True
+                        print(f"❌ Error opening user history generations at {self.path}, history cache disabled: {e}")
+        return self._map
+
+    def current(self, user_id):
+        """Counter of a user, or None without the shared file"""
+        buffer = self._mapped()
+        if buffer is None:
+            return None
+        return _SLOT.unpack_from(buffer, int(user_id) % self.slots * _SLOT.size)[0]
+
+    def bump(self, user_id):
+        """Mark a user's history as changed for every worker"""
+        buffer = self._mapped()
+        if buffer is None:
+            return
+        offset = int(user_id) % self.slots * _SLOT.size
+        if self._file is None:
+            with self._lock:
+                _SLOT.pack_into(buffer, offset, _SLOT.unpack_from(buffer, offset)[0] + 1)
+            return
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            _SLOT.pack_into(buffer, offset, _SLOT.unpack_from(buffer, offset)[0] + 1)
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+class UserHistoryCache:
+    """
+    Bounded LRU cache of each user's user_food_log rows, as tuples of HistoryEntry.
+
+    A user's history only changes through rate-food, select-food, an auto-reset or the
+    admin deleting the user; those paths call invalidate(user_id) after committing, which
+    bumps the user's counter in the shared HistoryGenerations. Every worker compares that
+    counter with the one read before the cached rows were loaded, so a write on any worker
+    is seen by the next request everywhere while unchanged history is never re-read.
+    Entries also expire after ttl seconds and least recently used users are evicted beyond max_users.
+    """
+
+    def __init__(self, max_users=USER_HISTORY_CACHE_SIZE, ttl=USER_HISTORY_CACHE_TTL, generations=None):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.generations = generations or HistoryGenerations()
+        self._entries = OrderedDict()  # user_id -> (expires_at, generation, rows)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, user_id, loader):
+        """Cached rows of a user, calling loader(user_id) on a miss"""
+        now = time.monotonic()
+        # Read before loading: a write committed meanwhile bumps it, so those rows are never served again
+        generation = self.generations.current(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                if entry[0] > now and generation is not None and entry[1] == generation:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return entry[2]
+                del self._entries[user_id]
+                if entry[0] > now:
+                    self.invalidations += 1  # Changed by another worker
+                else:
+                    self.expirations += 1
+            self.misses += 1
+
+        # Query outside the lock so other users are not blocked behind the database
+        rows = loader(user_id)
+
+        with self._lock:
+            if self.max_users > 0 and generation is not None:
+                self._entries[user_id] = (now + self.ttl, generation, rows)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return rows
+
+    def invalidate(self, user_id):
+        """Forget a user's history in every worker after a write to their user_food_log rows"""
+        self.generations.bump(user_id)
+        with self._lock:
+            self.invalidations += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Drop the entries of this process"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters and size of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_users': self.max_users,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+def load_user_history(user_id):
+    """Single projected query for every user_food_log row of a user, oldest id first"""
+    from database.db_init import UserFoodLog
+
+    entries = UserFoodLog.query.with_entities(
+        UserFoodLog.id,
+        UserFoodLog.recommended_food,
+        UserFoodLog.feedback_rating,
+        UserFoodLog.mood,
+        UserFoodLog.meal_time,
+        UserFoodLog.food_type,
+        UserFoodLog.created_at
+    ).filter_by(user_id=user_id).order_by(UserFoodLog.id).all()
+
+    return tuple(HistoryEntry(*entry) for entry in entries)
+
+# Shared by every request of this process
+user_history_cache = UserHistoryCache()
+
+def cached_user_history(user_id):
+    """All user_food_log rows of a user, from the cache when they have not changed"""
+    return user_history_cache.get(user_id, load_user_history)
+
+def invalidate_user_history(user_id):
+    user_history_cache.invalidate(user_id)
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+import argparse
+import os
+import time
+import numpy as np
+
+# Longest plan a request may ask for, in days
+MAX_PLAN_DAYS = 7
+
+# Score taken off a food for every earlier day of the plan it already appears in
+MEAL_PLAN_REPEAT_PENALTY = float(os.getenv("MEAL_PLAN_REPEAT_PENALTY", "2.0"))
+
+# Partial days kept while filling the slots of a day, and candidate foods per slot and ordering
+MEAL_PLAN_BEAM_WIDTH = 32
+MEAL_PLAN_CANDIDATES = 48
+
+# Replacements tried per day while repairing a day over its nutrient budget
+MAX_REPAIR_MOVES = 32
+
+def budget_excess(totals, budget):
+    """Summed relative excess over the budget, per row of totals (0 when every nutrient fits)"""
+    with np.errstate(invalid='ignore'):
+        excess = np.maximum(totals - budget, 0.0) / budget
+    return np.nan_to_num(excess, nan=0.0, posinf=0.0).sum(axis=-1)
+
+def budget_shares(values, budget):
+    """Share of the daily budget each food uses per nutrient (foods x nutrients), 0 for unlimited nutrients"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(np.isfinite(budget) & (budget > 0), values / budget, 0.0)
+
+def top_foods(ranking, candidates, count):
+    """The count candidates with the highest ranking (all of them when there are fewer)"""
+    if len(candidates) <= count:
+        return candidates
+    return candidates[np.argpartition(-ranking[candidates], count - 1)[:count]]
+
+def solve_day(scores, values, budget, load=None):
+    """
+    Pick one food per meal slot of a day, maximizing the summed score with the day's nutrient
+    totals within the budget and no food twice.
+
+    scores is (slots x foods) with -inf for foods a slot may not take, values (foods x nutrients)
+    and budget (nutrients, inf without limit); load is each food's summed budget_shares, computed
+    when not given. Greedy with repair:
+    1. Fill the slots in order, keeping the MEAL_PLAN_BEAM_WIDTH best partial days that fit the
+       budget (a greedy fill keeps one). Each slot considers its MEAL_PLAN_CANDIDATES best foods
+       by score and as many by score per share of the budget, since the best-scoring foods sit
+       near the limits and crowd each other out; the lightest foods when none of those fit.
+    2. Slots nothing fits get the allowed food exceeding the budget least; then single-slot
+       replacements with the least score lost per unit of excess removed run until the day fits.
+    3. Each slot is upgraded to its best food in the whole catalog that keeps the day within the budget.
+    Returns the food id per slot (-1 when no food is allowed) and the day's nutrient totals
+    """
+    slots, foods = scores.shape
+    allowed = np.isfinite(scores)
+    if load is None:
+        load = budget_shares(values, budget).sum(axis=1)
+
+    # 1. Beam fill: partial days (food per slot), their totals and scores
+    beam = np.full((1, slots), -1)
+    beam_totals = np.zeros((1, values.shape[1]))
+    beam_scores = np.zeros(1)
+    open_slots = np.zeros(slots, dtype=bool)
+    for slot in range(slots):
+        allowed_foods = np.flatnonzero(allowed[slot])
+        if len(allowed_foods) == 0:
+            continue
+
+        # When none of the best foods fit any partial day, the foods using the least budget are tried
+        for candidates in (
+            np.union1d(top_foods(scores[slot], allowed_foods, MEAL_PLAN_CANDIDATES),
+                       top_foods(scores[slot] / (load + 1e-3), allowed_foods, MEAL_PLAN_CANDIDATES)),
+            top_foods(-load, allowed_foods, MEAL_PLAN_CANDIDATES)
+        ):
+            totals = beam_totals[:, None, :] + values[candidates][None, :, :]
+            fits = (totals <= budget).all(axis=2) & ~(beam[:, :, None] == candidates[None, None, :]).any(axis=1)
+            days, picks = np.nonzero(fits)
+            if len(days):
+                break
+        if len(days) == 0:
+            open_slots[slot] = True
+            continue
+
+        day_scores = beam_scores[days] + scores[slot, candidates[picks]]
+        order = np.argsort(-day_scores, kind='stable')[:4 * MEAL_PLAN_BEAM_WIDTH]
+        expanded = beam[days[order]]
+        expanded[:, slot] = candidates[picks[order]]
+        # Partial days with the same foods leave the same budget and foods to the other slots: keep the best one
+        _, first = np.unique(np.sort(expanded, axis=1), axis=0, return_index=True)
+        keep = order[np.sort(first)[:MEAL_PLAN_BEAM_WIDTH]]
+        beam = expanded[np.sort(first)[:MEAL_PLAN_BEAM_WIDTH]]
+        beam_totals = totals[days[keep], picks[keep]]
+        beam_scores = day_scores[keep]
+
+    choice = beam[0].copy()
+    totals = beam_totals[0]
+    used = np.zeros(foods, dtype=bool)
+    used[choice[choice >= 0]] = True
+
+    # 2. Repair: fill the remaining slots, then trade excess for score
+    for slot in np.flatnonzero(open_slots):
+        candidates = np.flatnonzero(allowed[slot] & ~used)
+        if len(candidates) == 0:
+            continue
+        excess = budget_excess(totals + values[candidates], budget)
+        food = candidates[np.lexsort((-scores[slot, candidates], excess))[0]]
+        choice[slot] = food
+        used[food] = True
+        totals = totals + values[food]
+
+    filled = np.flatnonzero(choice >= 0)
+    excess = budget_excess(totals, budget)
+    for _ in range(MAX_REPAIR_MOVES):
+        if excess <= 0:
+            break
+        best = None
+        for slot in filled:
+            current = choice[slot]
+            new_excess = budget_excess(totals - values[current] + values, budget)
+            reduction = excess - new_excess
+            valid = allowed[slot] & ~used & (reduction > 1e-12)
+            if not valid.any():
+                continue
+            loss = np.where(valid, scores[slot, current] - scores[slot], np.inf)
+            rate = np.where(valid, np.maximum(loss, 0.0) / np.where(valid, reduction, 1.0), np.inf)
+            food = int(np.argmin(rate))
+            if best is None or rate[food] < best[0]:
+                best = (rate[food], slot, food, new_excess[food])
+        if best is None:
+            break
+        _, slot, food, excess = best
+        used[choice[slot]] = False
+        totals = totals - values[choice[slot]] + values[food]
+        choice[slot] = food
+        used[food] = True
+
+    # 3. Upgrade slots while the day stays within the budget
+    if excess <= 0:
+        improved = True
+        while improved:
+            improved = False
+            for slot in filled:
+                current = choice[slot]
+                better = np.flatnonzero((scores[slot] > scores[slot, current] + 1e-9) & ~used)
+                fits = better[(totals - values[current] + values[better] <= budget).all(axis=1)]
+                if len(fits):
+                    food = fits[np.argmax(scores[slot, fits])]
+                    used[current] = False
+                    totals = totals - values[current] + values[food]
+                    choice[slot] = food
+                    used[food] = True
+                    improved = True
+
+    return choice, totals
+
+def solve_plan(scores, values, budget, slot_days, repeat_penalty=MEAL_PLAN_REPEAT_PENALTY):
+    """
+    solve_day for every day of a plan, in day order. slot_days gives the day of each score row;
+    foods already planned on earlier days lose repeat_penalty per appearance, so the plan varies.
+    Returns the food id per slot and the nutrient totals per day
+    """
+    slot_days = np.asarray(slot_days)
+    days = np.unique(slot_days)
+    choice = np.full(len(scores), -1)
+    totals = np.zeros((len(days), values.shape[1]))
+    appearances = np.zeros(scores.shape[1])
+    load = budget_shares(values, budget).sum(axis=1)
+
+    for d, day in enumerate(days):
+        rows = np.flatnonzero(slot_days == day)
+        day_scores = scores[rows] - repeat_penalty * appearances
+        choice[rows], totals[d] = solve_day(day_scores, values, budget, load)
+        planned = choice[rows][choice[rows] >= 0]
+        appearances[planned] += 1
+
+    return choice, totals
+
+def solve_day_ilp(scores, values, budget):
+    """
+    Exact optimum of solve_day's problem as an integer program (scipy.optimize.milp), for checking
+    the greedy solver. Returns the food id per slot, or None when no assignment fits the budget
+    """
+    from scipy.optimize import Bounds, LinearConstraint, milp
+    from scipy.sparse import coo_matrix
+
+    slots, foods = scores.shape
+    allowed = np.isfinite(scores)
+    cells = np.flatnonzero(allowed.ravel())
+    if len(cells) == 0:
+        return None
+    slot_of, food_of = np.divmod(cells, foods)
+    variables = np.arange(len(cells))
+
+    # Slots that allow some food take exactly one; a food is used at most once a day
+    filled_slots = np.flatnonzero(allowed.any(axis=1))
+    slot_rows = np.searchsorted(filled_slots, slot_of)
+    limited = np.flatnonzero(np.isfinite(budget))
+    constraints = [
+        LinearConstraint(coo_matrix((np.ones(len(cells)), (slot_rows, variables)), shape=(len(filled_slots), len(cells))), 1, 1),
+        LinearConstraint(coo_matrix((np.ones(len(cells)), (food_of, variables)), shape=(foods, len(cells))), 0, 1),
+        LinearConstraint(values[food_of][:, limited].T, -np.inf, budget[limited])
+    ]
+
+    # Slots with the same scores are interchangeable: their food ids must increase, or the solver explores every order
+    rows, columns, ids = [], [], []
+    for first, second in zip(filled_slots[:-1], filled_slots[1:]):
+        if np.array_equal(scores[first], scores[second]):
+            for slot, sign in ((first, 1), (second, -1)):
+                picked = np.flatnonzero(slot_of == slot)
+                rows.append(np.full(len(picked), len(rows) // 2))
+                columns.append(picked)
+                ids.append(sign * food_of[picked])
+    if rows:
+        order = coo_matrix((np.concatenate(ids), (np.concatenate(rows), np.concatenate(columns))),
+                           shape=(len(rows) // 2, len(cells)))
+        constraints.append(LinearConstraint(order, -np.inf, -1))
+    result = milp(-scores.ravel()[cells], constraints=constraints, integrality=np.ones(len(cells)),
+                  bounds=Bounds(0, 1))
+    if result.x is None:
+        return None
+
+    choice = np.full(slots, -1)
+    picked = result.x > 0.5
+    choice[slot_of[picked]] = food_of[picked]
+    return choice
+
+def random_dislikes(emotions, meal_times, count, rng):
+    """{(emotion, meal_time): food names} with count random catalog foods per context"""
+    from models import food_recommendation_model as frm
+
+    return {
+        (emotion, meal_time): set(rng.choice(frm.food_catalog.names, count, replace=False))
+        for emotion in emotions for meal_time in meal_times
+    }
+
+def random_trajectories(count, days, seed=0):
+    """Random emotion trajectories (one emotion per day) for the bench and check actions"""
+    from models.food_recommendation_model import SUPPORTED_EMOTIONS
+
+    rng = np.random.default_rng(seed)
+    return [list(rng.choice(SUPPORTED_EMOTIONS, days)) for _ in range(count)]
+
+def benchmark(rows=(146, 10000), plans=20, days=MAX_PLAN_DAYS):
+    """Latency of week-long meal plans against asking get_food_recommendations for every slot"""
+    from datetime import date
+    from models import food_recommendation_model as frm
+    from models.food_catalog import FoodCatalog
+    from models.pipeline_bench import generate_catalog, use_catalog
+
+    birth_date = date(1990, 1, 1)
+    trajectories = random_trajectories(plans, days)
+
+    print(f"{'rows':>8}{'plan p50 ms':>14}{'plan p95 ms':>14}{'per-slot calls ms':>20}{'within limits':>16}")
+    for count in rows:
+        catalog = frm.food_catalog if count == len(frm.food_catalog) else FoodCatalog.from_dataframe(generate_catalog(count))
+        with use_catalog(catalog):
+            frm.get_meal_plan(birth_date, trajectories[0])  # Warm up the eligibility masks
+            latencies = []
+            fitting = 0
+            for emotions in trajectories:
+                start = time.perf_counter()
+                plan = frm.get_meal_plan(birth_date, emotions)
+                latencies.append((time.perf_counter() - start) * 1000)
+                fitting += all(day['within_limits'] for day in plan['days'])
+
+            # One live recommendation per slot, the way a client would build the plan without this endpoint
+            start = time.perf_counter()
+            for emotion in trajectories[0]:
+                for meal_time in frm.SUPPORTED_MEAL_TYPES:
+                    frm.get_food_recommendations(emotion, birth_date, meal_time=meal_time)
+            per_slot = (time.perf_counter() - start) * 1000
+
+        print(f"{count:>8}{np.percentile(latencies, 50):>14.2f}{np.percentile(latencies, 95):>14.2f}"
+              f"{per_slot:>20.1f}{f'{fitting}/{plans}':>16}")
+
+def check(samples=2, dislikes=10):
+    """
+    Compare solve_day with the integer program optimum for one day of every emotion and age group.
+    The first sample has no dislikes; the others dislike random foods per meal time, so slots differ
+    """
+    from models import food_recommendation_model as frm
+
+    rng = np.random.default_rng(1)
+    gaps = []
+    infeasible = 0
+    for sample in range(samples):
+        for age_group in ['child', 'adult']:
+            for emotion in frm.SUPPORTED_EMOTIONS:
+                disliked = random_dislikes([emotion], frm.SUPPORTED_MEAL_TYPES, dislikes, rng) if sample else None
+                scores, values, budget, _ = frm.meal_plan_problem([emotion], age_group, frm.SUPPORTED_MEAL_TYPES, disliked)
+                slots = np.arange(len(scores))
+
+                start = time.perf_counter()
+                greedy, totals = solve_day(scores, values, budget)
+                greedy_ms = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                optimum = solve_day_ilp(scores, values, budget)
+                optimum_ms = (time.perf_counter() - start) * 1000
+
+                if optimum is None:
+                    infeasible += 1
+                    continue
+                best = scores[slots, optimum].sum()
+                found = scores[slots, greedy].sum() if budget_excess(totals, budget) <= 0 else 0.0
+                gaps.append((best - found) / best if best > 0 else 0.0)
+                print(f"{emotion:<10}{age_group:<7}{sample:>3}{found:>9.2f}{best:>9.2f}{gaps[-1]:>8.2%}"
+                      f"{greedy_ms:>9.1f} ms{optimum_ms:>9.0f} ms")
+
+    gaps = np.array(gaps)
+    print(f"Days checked: {len(gaps)} (no feasible plan: {infeasible})")
+    if len(gaps):
+        print(f"Optimal: {(gaps <= 1e-9).mean():.1%}  mean gap: {gaps.mean():.2%}  max gap: {gaps.max():.2%}")
+    return gaps
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Meal plans within the daily nutrient limits')
+    parser.add_argument('action', choices=['bench', 'check'],
+                        help='time week-long plans, or compare the greedy solver with the integer program optimum')
+    parser.add_argument('--rows', type=int, nargs='+', default=[146, 10000], help='Catalog sizes for bench (146 is the real catalog)')
+    parser.add_argument('--plans', type=int, default=20, help='Random emotion trajectories for bench')
+    parser.add_argument('--days', type=int, default=MAX_PLAN_DAYS, help='Days per plan for bench')
+    parser.add_argument('--samples', type=int, default=2, help='Days per emotion and age group for check')
+    parser.add_argument('--dislikes', type=int, default=10, help='Disliked foods per meal time in later check samples')
+    args = parser.parse_args()
+
+    if args.action == 'bench':
+        benchmark(args.rows, args.plans, args.days)
+    elif args.action == 'check':
+        gaps = check(args.samples, args.dislikes)
+        if len(gaps) == 0:
+            print("❌ No sampled day has a feasible plan, so nothing was compared")
+            raise SystemExit(1)
+        if gaps.max() > 0.1:
+            print("❌ The greedy solver is more than 10% below the optimum on some days")
+            raise SystemExit(1)
+        print(f"✅ Greedy days are within {gaps.max():.1%} of the optimum")
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from models.forest_engine import FOREST_FILES, FlatForest, file_digest
+from models.food_catalog import FoodCatalog, CATALOG_TEXT_COLUMNS
+from models.nutrient_limits import NutrientLimitEngine
+from models.direct_scores import DirectScoreTensor
+from models.shared_state import GenerationStore
+
+# Bump when the layout of the stored files changes
+ARTIFACTS_FORMAT_VERSION = 3
+
+models_dir = Path(__file__).parent / "recommendation_models"
+data_dir = Path(__file__).parent / "../data"
+ARTIFACTS_DIR = models_dir / "artifacts"
+CATALOG_CSV = data_dir / "reduced_nutrition_df.csv"
+
+# Every export publishes a new generation under ARTIFACTS_DIR, see GenerationStore
+artifact_generations = GenerationStore(ARTIFACTS_DIR)
+
+# Arrays derived from the catalog, nutrition priorities and limits, stored so workers map them instead of computing them
+CATALOG_STATE_FILES = {
+    'limit_values': "nutrient_limits.values.npy",
+    'direct_values': "direct_scores.values.npy",
+    'direct_tensor': "direct_scores.tensor.npy"
+}
+
+def source_digests(limits=None):
+    """Digest of every file (and the nutrient limits) the artifacts are derived from"""
+    sources = [models_dir / filename for filename in FOREST_FILES.values()] + [models_dir / "nutrition_info.json", CATALOG_CSV]
+    digests = {path.name: file_digest(path) for path in sources}
+    if limits is not None:
+        digests['nutrition_limits'] = hashlib.sha256(json.dumps(limits, sort_keys=True).encode()).hexdigest()
+    return digests
+
+class ModelArtifacts:
+    """
+    Flattened forests and the food catalog, stored as plain .npy files.
+
+    Loaded with mmap_mode='r' every worker maps the same files read-only, so the
+    operating system keeps a single copy of the pages however many workers run.
+    smoke_features/smoke_expected are sklearn outputs recorded at export time, letting a
+    worker validate the arrays without loading the pickled models.
+    """
+
+    def __init__(self, forests, catalog, smoke_features, smoke_expected, manifest, catalog_state=None, generation=0):
+        self.forests = forests
+        self.catalog = catalog
+        self.smoke_features = smoke_features
+        self.smoke_expected = smoke_expected
+        self.manifest = manifest
+        self.catalog_state = catalog_state or {}  # CATALOG_STATE_FILES keys -> mapped arrays
+        self.generation = generation
+
+    def smoke_check(self):
+        """True when the forests reproduce the sklearn outputs recorded at export"""
+        for name, forest in self.forests.items():
+            if forest.kind == 'classifier':
+                actual = forest.predict_proba(self.smoke_features)
+            else:
+                actual = forest.predict(self.smoke_features)
+            if not np.array_equal(actual, self.smoke_expected[name]):
+                return False
+        return True
+
+def export_artifacts(store=artifact_generations):
+    """
+    Flatten the pickled forests and the catalog, with the arrays derived from it, into a new
+    artifact generation. Running workers attach to it on their next poll
+    """
+    from models import food_recommendation_model as frm
+
+    if not frm.model_loaded:
+        raise RuntimeError("Recommendation model not loaded")
+
+    with store.publish() as directory:
+        write_artifacts(frm, directory)
+    print(f"✅ Published artifacts generation {store.generation()}")
+
+def write_artifacts(frm, directory):
+    """Write every artifact file into a staging directory, the manifest last"""
+    manifest_path = directory / "manifest.json"
+    digests = source_digests(frm.NUTRITION_GENERAL_LIMITS)
+    sklearn_models = frm.load_sklearn_models()
+
+    smoke_features = np.nan_to_num(frm.build_feature_matrix(
+        np.arange(len(frm.food_catalog)), frm.SUPPORTED_EMOTIONS[0], frm.SUPPORTED_MEAL_TYPES[0], 30, 1
+    ))
+    np.save(directory / "smoke_features.npy", smoke_features)
+
+    for name, filename in FOREST_FILES.items():
+        model = sklearn_models[name]
+        forest = FlatForest.from_sklearn(model, source_digest=digests[filename])
+        forest.save(directory, name)
+        if forest.kind == 'classifier':
+            np.save(directory / f"{name}.smoke.npy", model.predict_proba(smoke_features))
+        else:
+            np.save(directory / f"{name}.smoke.npy", model.predict(smoke_features))
+        print(f"✅ Exported {name}: {forest.n_trees} trees, {len(forest.feature)} nodes")
+
+    foods = pd.read_csv(CATALOG_CSV)
+    catalog = FoodCatalog.from_dataframe(foods)
+    catalog.save(directory)
+    print(f"✅ Exported catalog: {len(catalog)} foods x {len(catalog.nutrient_columns)} nutrients")
+
+    # float32 storage is lossless when every value survives the decimal round trip
+    exact = np.column_stack([
+        pd.to_numeric(foods[col], errors='coerce').to_numpy(dtype=float)
+        for col in foods.columns if col not in CATALOG_TEXT_COLUMNS
+    ])
+    lossy = ~((catalog.nutrient_values() == exact) | (np.isnan(exact) & np.isnan(catalog.nutrient_values())))
+    if lossy.any():
+        print(f"⚠️ {int(lossy.sum())} catalog values need more precision than float32 keeps")
+
+    # Priorities and limits of the base version, which is the only one served from the artifacts
+    limits = NutrientLimitEngine(catalog, frm.NUTRITION_GENERAL_LIMITS)
+    direct_scores = DirectScoreTensor(catalog, frm.nutrition_priorities, frm.NUTRITION_GENERAL_LIMITS)
+    np.save(directory / CATALOG_STATE_FILES['limit_values'], limits.values)
+    np.save(directory / CATALOG_STATE_FILES['direct_values'], direct_scores.values)
+    np.save(directory / CATALOG_STATE_FILES['direct_tensor'], direct_scores.tensor)
+    print(f"✅ Exported catalog state: nutrient limits and {direct_scores.tensor.shape} direct scores")
+
+    with open(manifest_path, 'w') as f:
+        json.dump({
+            'format_version': ARTIFACTS_FORMAT_VERSION,
+            'sources': digests,
+            'forests': list(FOREST_FILES)
+        }, f, indent=2)
+
+def load_model_artifacts(limits=None, store=artifact_generations, mmap_mode='r'):
+    """
+    Map the current artifact generation read-only if it exists and matches the current pickles,
+    nutrition info, catalog and nutrient limits
+    """
+    generation = store.generation()
+    directory = store.path(generation)
+    if directory is None or not (directory / "manifest.json").exists():
+        print(f"⚠️ Model artifacts not found at {store.root}, loading pickled models")
+        return None
+
+    try:
+        with open(directory / "manifest.json", 'r') as f:
+            manifest = json.load(f)
+
+        if (manifest.get('format_version') != ARTIFACTS_FORMAT_VERSION or
+                manifest.get('sources') != source_digests(limits)):
+            print("⚠️ Model artifacts are stale (models or catalog changed), loading pickled models")
+            return None
+
+        artifacts = ModelArtifacts(
+            forests={name: FlatForest.load(directory, name, mmap_mode=mmap_mode) for name in manifest['forests']},
+            catalog=FoodCatalog.load(directory, mmap_mode=mmap_mode),
+            smoke_features=np.load(directory / "smoke_features.npy", allow_pickle=False),
+            smoke_expected={
+                name: np.load(directory / f"{name}.smoke.npy", allow_pickle=False) for name in manifest['forests']
+            },
+            manifest=manifest,
+            catalog_state={
+                key: np.load(directory / filename, mmap_mode=mmap_mode, allow_pickle=False)
+                for key, filename in CATALOG_STATE_FILES.items()
+            },
+            generation=generation
+        )
+    except Exception as e:
+        print(f"❌ Error loading model artifacts: {e}")
+        return None
+
+    print(f"✅ Model artifacts mapped successfully (generation {generation})")
+    return artifacts
+
+def read_memory(pid, mapped_dir=None):
+    """RSS, PSS and shared memory (KB) of a process, plus the part mapped from mapped_dir"""
+    totals = {}
+    with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+        for line in f:
+            match = re.match(r'(\w+):\s+(\d+) kB', line)
+            if match:
+                totals[match.group(1)] = int(match.group(2))
+
+    mapped = {'Rss': 0, 'Pss': 0}
+    if mapped_dir is not None:
+        in_dir = False
+        with open(f"/proc/{pid}/smaps", 'r') as f:
+            for line in f:
+                if re.match(r'^[0-9a-f]+-[0-9a-f]+ ', line):
+                    in_dir = str(mapped_dir) in line
+                elif in_dir:
+                    match = re.match(r'(Rss|Pss):\s+(\d+) kB', line)
+                    if match:
+                        mapped[match.group(1)] += int(match.group(2))
+
+    return {
+        'rss': totals.get('Rss', 0),
+        'pss': totals.get('Pss', 0),
+        'shared': totals.get('Shared_Clean', 0) + totals.get('Shared_Dirty', 0),
+        'mapped_rss': mapped['Rss'],
+        'mapped_pss': mapped['Pss']
+    }
+
+def memory_report(workers=8):
+    """
+    Start `workers` processes that import the recommendation model, once loading the
+    pickled forests and once mapping the artifacts, and print per-worker memory
+    """
+    backend_dir = Path(__file__).resolve().parent.parent
+    worker_code = (
+        "import sys; from datetime import date; import models.food_recommendation_model as frm; "
+        "frm.get_food_recommendations('happy', date(1990, 1, 1), meal_time='Lunch'); "
+        "print('ready', flush=True); sys.stdin.read()"
+    )
+
+    for label, engine in [('pickled models', 'sklearn'), ('mapped artifacts', 'numpy')]:
+        env = dict(os.environ, FOREST_ENGINE=engine)
+        procs = [
+            subprocess.Popen([sys.executable, '-c', worker_code], cwd=backend_dir, env=env,
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            for _ in range(workers)
+        ]
+        try:
+            for proc in procs:
+                while proc.stdout.readline().strip() != 'ready':
+                    if proc.poll() is not None:
+                        raise RuntimeError("Worker exited before loading the models")
+
+            stats = [read_memory(proc.pid, models_dir.resolve()) for proc in procs]
+        finally:
+            for proc in procs:
+                proc.stdin.close()
+                proc.wait()
+
+        print(f"\n📊 {workers} workers with {label}")
+        print(f"{'worker':>8}{'RSS MB':>10}{'PSS MB':>10}{'shared MB':>12}{'mapped RSS':>12}{'mapped PSS':>12}")
+        for i, stat in enumerate(stats):
+            print(f"{i:>8}{stat['rss'] / 1024:>10.1f}{stat['pss'] / 1024:>10.1f}{stat['shared'] / 1024:>12.1f}"
+                  f"{stat['mapped_rss'] / 1024:>12.2f}{stat['mapped_pss'] / 1024:>12.2f}")
+        print(f"   Total PSS: {sum(stat['pss'] for stat in stats) / 1024:.1f} MB")
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Memory-mapped model artifact utility')
+    parser.add_argument('action', choices=['export', 'check', 'clean', 'report'],
+                        help='export artifacts, check they are current, remove them, or report per-worker memory')
+    parser.add_argument('--workers', type=int, default=8, help='Number of worker processes for report')
+    args = parser.parse_args()
+
+    if args.action == 'export':
+        export_artifacts()
+    elif args.action == 'check':
+        from models.food_recommendation_model import NUTRITION_GENERAL_LIMITS
+        artifacts = load_model_artifacts(NUTRITION_GENERAL_LIMITS)
+        if artifacts is None or not artifacts.smoke_check():
+            print("❌ Model artifacts are not usable, run `python -m models.model_artifacts export`")
+            raise SystemExit(1)
+        print("✅ Model artifacts are current")
+    elif args.action == 'clean':
+        shutil.rmtree(ARTIFACTS_DIR, ignore_errors=True)
+        print(f"✅ Removed {ARTIFACTS_DIR}")
+    elif args.action == 'report':
+        memory_report(args.workers)
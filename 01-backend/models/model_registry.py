@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+import argparse
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+models_dir = Path(__file__).parent / "recommendation_models"
+data_dir = Path(__file__).parent / "../data"
+
+# Versioned bundles live in bundles/<version>/; "base" is the files in recommendation_models and data
+MODEL_BUNDLES_DIR = models_dir / "bundles"
+BASE_MODEL_VERSION = "base"
+
+# Version every worker should serve, written by request_model_version()
+ACTIVE_VERSION_FILE = models_dir / "active_model_version"
+
+# Seconds between checks of ACTIVE_VERSION_FILE by each worker
+MODEL_VERSION_POLL_INTERVAL = float(os.getenv("MODEL_VERSION_POLL_INTERVAL", "5"))
+
+# Files of a bundle; a bundle directory only needs the ones that differ from the base
+BASE_BUNDLE_FILES = {
+    "rank_model.pkl": models_dir / "rank_model.pkl",
+    "score_model.pkl": models_dir / "score_model.pkl",
+    "binary_model.pkl": models_dir / "binary_model.pkl",
+    "encoders.pkl": models_dir / "encoders.pkl",
+    "nutrition_info.json": models_dir / "nutrition_info.json",
+    "reduced_nutrition_df.csv": data_dir / "reduced_nutrition_df.csv",
+}
+
+def list_model_versions():
+    """The base version followed by every bundle directory, sorted by name"""
+    versions = [BASE_MODEL_VERSION]
+    if MODEL_BUNDLES_DIR.is_dir():
+        versions += sorted(path.name for path in MODEL_BUNDLES_DIR.iterdir() if path.is_dir())
+    return versions
+
+def bundle_sources(version=BASE_MODEL_VERSION):
+    """Path of every bundle file of a version, falling back to the base file when the bundle lacks it"""
+    if version == BASE_MODEL_VERSION:
+        return dict(BASE_BUNDLE_FILES)
+
+    directory = MODEL_BUNDLES_DIR / version
+    if not directory.is_dir() or directory.parent != MODEL_BUNDLES_DIR:
+        raise ValueError(f"Unknown model version: {version}")
+    return {
+        filename: directory / filename if (directory / filename).exists() else base_path
+        for filename, base_path in BASE_BUNDLE_FILES.items()
+    }
+
+def requested_model_version():
+    """Version named in ACTIVE_VERSION_FILE, or the base version"""
+    try:
+        version = ACTIVE_VERSION_FILE.read_text().strip()
+    except FileNotFoundError:
+        return BASE_MODEL_VERSION
+    return version or BASE_MODEL_VERSION
+
+def request_model_version(version):
+    """Ask every worker to serve a version: they pick it up from ACTIVE_VERSION_FILE within the poll interval"""
+    bundle_sources(version)  # Reject unknown versions right away
+    staging = ACTIVE_VERSION_FILE.with_suffix(f".{os.getpid()}.tmp")
+    staging.write_text(version)
+    os.replace(staging, ACTIVE_VERSION_FILE)
+
+class SwapLock:
+    """
+    Readers/writer lock around the active model bundle.
+
+    Scoring holds a read for its whole pass, so it never mixes the globals of two bundles.
+    A swap waits for the passes in flight to finish and holds new ones back until the globals
+    are replaced, which only takes the cheap final steps of a reload. Reads are reentrant per thread
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._local = threading.local()
+
+    @contextmanager
+    def reading(self):
+        depth = getattr(self._local, 'depth', 0)
+        if depth == 0:
+            with self._cond:
+                while self._writing:
+                    self._cond.wait()
+                self._readers += 1
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                with self._cond:
+                    self._readers -= 1
+                    if self._readers == 0:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def writing(self):
+        with self._cond:
+            while self._writing:
+                self._cond.wait()
+            self._writing = True
+            while self._readers:
+                self._cond.wait()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+class ModelRegistry:
+    """
+    Loads model versions in the background and swaps them in.
+
+    Loading (pickles, catalog, derived tables) happens without any lock while requests keep
+    using the active bundle; food_recommendation_model.activate_model_bundle then validates the
+    new bundle with a smoke prediction and swaps it in under the SwapLock. On any failure the
+    active bundle stays in place and the error is kept in status()
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_poll = 0.0
+        self._failed_version = None
+        self._status = {'state': 'idle', 'version': None, 'error': None, 'started_at': None, 'finished_at': None,
+                        'duration_seconds': None}
+
+    def status(self):
+        from models import food_recommendation_model as frm
+
+        with self._lock:
+            status = dict(self._status)
+        status['active_version'] = frm.model_version if frm.model_loaded else None
+        status['requested_version'] = requested_model_version()
+        status['available_versions'] = list_model_versions()
+        return status
+
+    def reload(self, version=BASE_MODEL_VERSION, background=True, publish=False):
+        """
+        Load and activate a version; returns False if a reload is already running.
+        With publish set, every worker is asked to serve the version once it is active here,
+        so a version that fails to load or smoke-test never reaches the other workers
+        """
+        bundle_sources(version)  # Reject unknown versions right away
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._status = {'state': 'loading', 'version': version, 'error': None,
+                            'started_at': datetime.now().isoformat(timespec='seconds'), 'finished_at': None,
+                            'duration_seconds': None}
+            thread = threading.Thread(target=self._reload, args=(version, publish), name="model-reload", daemon=True)
+            self._thread = thread if background else None
+
+        if background:
+            thread.start()
+        else:
+            self._reload(version, publish)
+        return True
+
+    def poll(self):
+        """
+        Start a background reload when ACTIVE_VERSION_FILE names another version than the active one.
+        Checks the file at most every MODEL_VERSION_POLL_INTERVAL seconds; a version that failed is not retried
+        """
+        from models import food_recommendation_model as frm
+
+        now = time.monotonic()
+        if now - self._last_poll < MODEL_VERSION_POLL_INTERVAL:
+            return
+        self._last_poll = now
+
+        version = requested_model_version()
+        if version == frm.model_version or version == self._failed_version:
+            return
+        try:
+            self.reload(version)
+        except ValueError as e:
+            self._failed_version = version
+            print(f"❌ Cannot load requested model version: {e}")
+
+    def _reload(self, version, publish=False):
+        from models import food_recommendation_model as frm
+
+        start = time.perf_counter()
+        try:
+            bundle = frm.load_model_bundle(version)
+            frm.activate_model_bundle(bundle)
+            if publish:
+                request_model_version(version)
+            state, error = 'active', None
+            self._failed_version = None
+            print(f"✅ Model version {version} is active")
+        except Exception as e:
+            state, error = 'failed', str(e)
+            self._failed_version = version
+            print(f"❌ Error reloading model version {version}, keeping {frm.model_version}: {e}")
+
+        with self._lock:
+            self._status.update(
+                state=state,
+                error=error,
+                finished_at=datetime.now().isoformat(timespec='seconds'),
+                duration_seconds=round(time.perf_counter() - start, 3)
+            )
+
+# Shared by the recommendation pipeline and the admin endpoints
+model_swap = SwapLock()
+model_registry = ModelRegistry()
+
+def publish_bundle(version, source):
+    """Copy the bundle files found in a source directory into bundles/<version>"""
+    source = Path(source)
+    if version == BASE_MODEL_VERSION or not version or '/' in version or version.startswith('.'):
+        raise ValueError(f"Invalid model version: {version}")
+
+    files = [source / filename for filename in BASE_BUNDLE_FILES if (source / filename).exists()]
+    if not files:
+        raise ValueError(f"No bundle files in {source}: expected any of {', '.join(BASE_BUNDLE_FILES)}")
+
+    # Copied next to the final directory and renamed, so a reload never sees a partial bundle
+    target = MODEL_BUNDLES_DIR / version
+    staging = MODEL_BUNDLES_DIR / f".{version}.partial"
+    if target.exists():
+        raise ValueError(f"Model version {version} already exists")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    for path in files:
+        shutil.copy2(path, staging / path.name)
+    staging.rename(target)
+    return [path.name for path in files]
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Versioned recommendation model bundles')
+    parser.add_argument('action', choices=['list', 'publish', 'check'],
+                        help='list versions, publish a bundle directory, or load and smoke-test a version')
+    parser.add_argument('--version', default=None, help='Version name for publish and check')
+    parser.add_argument('--source', default=None, help='Directory holding the bundle files for publish')
+    args = parser.parse_args()
+
+    if args.action == 'list':
+        for version in list_model_versions():
+            sources = bundle_sources(version)
+            overrides = [name for name, path in sources.items() if path != BASE_BUNDLE_FILES[name]]
+            print(f"{version:<24}{', '.join(overrides) if overrides else '(base files)'}")
+    elif args.action == 'publish':
+        if not args.version or not args.source:
+            parser.error('publish needs --version and --source')
+        copied = publish_bundle(args.version, args.source)
+        print(f"✅ Published model version {args.version}: {', '.join(copied)}")
+    elif args.action == 'check':
+        from models import food_recommendation_model as frm
+
+        version = args.version or BASE_MODEL_VERSION
+        try:
+            frm.activate_model_bundle(frm.load_model_bundle(version))
+        except Exception as e:
+            print(f"❌ Model version {version} failed: {e}")
+            raise SystemExit(1)
+        print(f"✅ Model version {version} loads and passes the smoke prediction")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+import argparse
+from collections import Counter
+import numpy as np
+
+class NutrientLimitEngine:
+    """
+    Vectorized nutrient limit checks over the whole food catalog.
+
+    The catalog nutrients are held as a float matrix (foods x nutrients) and the
+    limits as one vector per age group, so eligibility for every food is a single
+    comparison. Masks are cached per (age_group, tolerance) and are indexed by
+    the food ids of the FoodCatalog the engine was built from.
+    """
+
+    def __init__(self, catalog, limits, values=None):
+        # Only nutrients present in the catalog can violate a limit
+        self.nutrients = [nutrient for nutrient in limits if catalog.has_nutrient(nutrient)]
+
+        # Unreadable values are NaN, which never exceeds a limit. values can be a stored copy
+        # of this matrix (see models/model_artifacts.py)
+        if values is not None:
+            self.values = values
+        elif self.nutrients:
+            self.values = np.column_stack([catalog.nutrient_column(nutrient) for nutrient in self.nutrients])
+        else:
+            self.values = np.zeros((len(catalog), 0))
+
+        # Missing or unreadable limits never exclude a food
+        age_groups = sorted({group for group_limits in limits.values() for group in group_limits})
+        self.limits = {}
+        for age_group in age_groups:
+            vector = np.full(len(self.nutrients), np.inf)
+            for i, nutrient in enumerate(self.nutrients):
+                try:
+                    vector[i] = float(limits[nutrient][age_group])
+                except (KeyError, TypeError, ValueError):
+                    continue
+            self.limits[age_group] = vector
+
+        self.food_names = catalog.names
+        self._mask_cache = {}
+
+    def violations(self, age_group, tolerance=1.5):
+        """Boolean matrix (foods x nutrients) of values above limit * tolerance"""
+        limits = self.limits.get(age_group)
+        if limits is None:
+            return np.zeros(self.values.shape, dtype=bool)
+        return self.values > limits * tolerance
+
+    def eligible_mask(self, age_group, tolerance=1.5):
+        """Read-only boolean mask of foods within all limits for this age group"""
+        key = (age_group, float(tolerance))
+        mask = self._mask_cache.get(key)
+        if mask is None:
+            mask = ~self.violations(age_group, tolerance).any(axis=1)
+            mask.flags.writeable = False
+            self._mask_cache[key] = mask
+        return mask
+
+    def exclusion_reasons(self, age_group, tolerance=1.5):
+        """
+        Map each excluded food to the nutrient that excluded it.
+        The first violated nutrient in limit order is reported
+        """
+        violations = self.violations(age_group, tolerance)
+        excluded = np.flatnonzero(violations.any(axis=1))
+        first_violation = violations[excluded].argmax(axis=1)
+        return {
+            self.food_names[row]: self.nutrients[col]
+            for row, col in zip(excluded.tolist(), first_violation.tolist())
+        }
+
+    def clear_cache(self):
+        """Drop cached masks, so the next eligible_mask call computes them again (see pipeline_bench)"""
+        self._mask_cache = {}
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Nutrient limit checks of the food catalog')
+    parser.add_argument('action', choices=['report'],
+                        help='count the foods each nutrient limit excludes per age group')
+    parser.add_argument('--age-group', choices=['child', 'adult'], nargs='+', default=['child', 'adult'],
+                        help='Age groups to report')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='Multiple of the limit a food may reach')
+    parser.add_argument('--foods', action='store_true', help='Also list every excluded food with its nutrient')
+    args = parser.parse_args()
+
+    from models import food_recommendation_model as frm
+
+    if not frm.model_loaded:
+        print("❌ Recommendation model not loaded")
+        raise SystemExit(1)
+
+    engine = frm.nutrient_limits
+    for age_group in args.age_group:
+        reasons = engine.exclusion_reasons(age_group, args.tolerance)
+        eligible = int(engine.eligible_mask(age_group, args.tolerance).sum())
+        print(f"📊 {age_group}: {eligible} of {len(engine.food_names)} foods within limits, {len(reasons)} excluded")
+        for nutrient, count in Counter(reasons.values()).most_common():
+            print(f"   {nutrient:<32}{count:>6}")
+        if args.foods:
+            for food, nutrient in sorted(reasons.items()):
+                print(f"   - {food}: {nutrient}")
@@ -0,0 +1,52 @@
+class FrozenPayload(dict):
+    """
+    Read-only dict shared between responses.
+    It serializes like a plain dict; copy() returns a mutable plain dict
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Cached nutrition payloads are read-only, use copy() to modify")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+    __ior__ = _readonly
+
+    def copy(self):
+        return dict(self)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+class NutritionPayloadCache:
+    """
+    nutrition_data payload of every catalog food, built once per catalog.
+
+    build_payload turns a FoodRecord into the payload dict; the results are frozen and
+    indexed by food id, so responses reference them instead of rebuilding dicts per request.
+    Call invalidate() (registered as a catalog reload hook) whenever the catalog changes.
+    """
+
+    def __init__(self, build_payload):
+        self.build_payload = build_payload
+        self._catalog = None
+        self._payloads = ()
+
+    def load(self, catalog):
+        """Build the payloads for every food in the catalog"""
+        self._payloads = tuple(
+            FrozenPayload(self.build_payload(catalog.record(food_id))) for food_id in range(len(catalog))
+        )
+        self._catalog = catalog
+
+    def invalidate(self, catalog=None):
+        """Drop the cached payloads, rebuilding them right away when a new catalog is given"""
+        self._catalog = None
+        self._payloads = ()
+        if catalog is not None:
+            self.load(catalog)
+
+    def get(self, catalog, food_id):
+        """Payload of a food; built on demand if the cache does not belong to this catalog"""
+        if catalog is not self._catalog:
+            self.load(catalog)
+        return self._payloads[food_id]
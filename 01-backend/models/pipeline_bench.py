@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+import argparse
+import json
+import platform
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from models.food_catalog import CATALOG_TEXT_COLUMNS, FoodCatalog
+
+# Catalog sizes benchmarked by default, from the real catalog up to 1M foods
+BENCH_SIZES = [146, 10000, 100000, 1000000]
+
+# (emotion, meal_type, age, food_type) contexts timed on every catalog
+BENCH_CONTEXTS = [
+    ('happy', 'Lunch', 30, None),
+    ('sad', 'Dinner', 10, 'Fruits'),
+    ('angry', 'Breakfast', 45, 'Grains')
+]
+
+# Per-request stages, in pipeline order
+BENCH_STAGES = ['filter', 'candidates', 'features', 'rank_model', 'binary_model', 'reg_model', 'consensus', 'direct_scoring', 'format']
+
+# One-off work per catalog
+SETUP_STAGES = ['catalog_state', 'payload_cache']
+
+def generate_catalog(rows, seed=0):
+    """
+    Synthetic catalog with the reduced_nutrition_df.csv columns.
+    The real foods come first; extra rows resample them with each nutrient scaled by
+    log-normal noise (rounded to 4 significant digits) and a numbered name
+    """
+    from models.model_artifacts import CATALOG_CSV
+
+    foods = pd.read_csv(CATALOG_CSV)
+    if rows <= len(foods):
+        return foods.head(rows).reset_index(drop=True)
+
+    rng = np.random.default_rng(seed)
+    extra = foods.iloc[rng.integers(0, len(foods), rows - len(foods))].reset_index(drop=True)
+    extra['food'] = [f"{name} #{i}" for i, name in enumerate(extra['food'], start=len(foods))]
+
+    for column in foods.columns:
+        if column in CATALOG_TEXT_COLUMNS:
+            continue
+        values = pd.to_numeric(extra[column], errors='coerce').to_numpy(dtype=np.float64)
+        values = values * rng.lognormal(0.0, 0.25, len(values))
+        extra[column] = [float(f"{value:.4g}") for value in values]
+
+    return pd.concat([foods, extra], ignore_index=True)
+
+@contextmanager
+def use_catalog(catalog):
+    """Serve the recommendation pipeline from another catalog, restoring the loaded one afterwards"""
+    from models import food_recommendation_model as frm
+
+    saved = (frm.food_catalog, frm.feature_layout, frm.nutrient_limits, frm.eligible_foods,
+             frm.direct_score_tensor, frm.candidate_index, frm.score_table)
+    try:
+        (frm.feature_layout, frm.nutrient_limits, frm.eligible_foods, frm.direct_score_tensor,
+         frm.candidate_index) = frm.build_catalog_state(catalog)
+        frm.food_catalog = catalog
+        # The precomputed table only covers the real catalog
+        frm.score_table = None
+        yield
+    finally:
+        (frm.food_catalog, frm.feature_layout, frm.nutrient_limits, frm.eligible_foods,
+         frm.direct_score_tensor, frm.candidate_index, frm.score_table) = saved
+        frm.nutrition_payloads.invalidate()
+
+def time_call(timings, stage, fn, *args, **kwargs):
+    """Call fn, adding its wall time in ms to timings[stage]; returns its result"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - start) * 1000
+    return result
+
+def time_context(timings, emotion, meal_type, age, food_type):
+    """Run the live scoring pipeline for one context, timing every stage; returns the candidate count"""
+    from models import food_recommendation_model as frm
+
+    age_group = 'adult' if age > 15 else 'child'
+
+    # Cached masks would hide the limit check itself
+    frm.nutrient_limits.clear_cache()
+    food_ids = time_call(timings, 'filter', frm.select_candidate_foods, age_group, food_type)
+    food_ids = time_call(timings, 'candidates', frm.candidate_index.nearest,
+                         food_ids, emotion, age_group, food_type, frm.CANDIDATE_K)
+    food_ids, features = time_call(timings, 'features', frm.candidate_features, food_ids, emotion, meal_type, age)
+    if len(food_ids) == 0:
+        return 0
+
+    # Same engine choice as predict_model_scores
+    if frm.flat_forests and len(features) <= frm.FOREST_ENGINE_MAX_BATCH:
+        models = frm.flat_forests
+    else:
+        models = frm.load_sklearn_models()
+    rank_scores = time_call(timings, 'rank_model', models['rank_model'].predict, features)
+    binary_scores = time_call(timings, 'binary_model', models['binary_model'].predict_proba, features)[:, 1]
+    reg_scores = time_call(timings, 'reg_model', models['reg_model'].predict, features)
+
+    def consensus():
+        food_names = frm.food_catalog.names_of(food_ids)
+        return frm.consensus_ranking(food_names, rank_scores, binary_scores, reg_scores)
+
+    def direct_scoring(candidates):
+        direct_scores = frm.direct_score_tensor.scores(emotion, age_group)[food_ids]
+        return direct_scores, sorted(candidates, key=lambda c: direct_scores[c[0]], reverse=True)
+
+    candidates = time_call(timings, 'consensus', consensus)
+    direct_scores, _ = time_call(timings, 'direct_scoring', direct_scoring, candidates)
+
+    final_sorted = frm.rank_scored_foods(food_ids, rank_scores, binary_scores, reg_scores, emotion, age_group,
+                                         direct_scores=direct_scores)
+    time_call(timings, 'format', frm.format_recommendations, final_sorted)
+    return len(food_ids)
+
+def benchmark_catalog(rows, repeats=5, contexts=BENCH_CONTEXTS, seed=0):
+    """
+    Time the setup and the per-request stages on a synthetic catalog of the given size.
+    Stage times are in ms per request: the median over repeats of the mean over contexts
+    """
+    from models import food_recommendation_model as frm
+
+    catalog = FoodCatalog.from_dataframe(generate_catalog(rows, seed))
+    setup = {}
+    state = time_call(setup, 'catalog_state', frm.build_catalog_state, catalog)
+
+    with use_catalog(catalog):
+        time_call(setup, 'payload_cache', frm.nutrition_payloads.load, catalog)
+
+        # Warm-up run so lazily loaded models are not counted
+        candidates = [time_context({}, *context) for context in contexts]
+
+        samples = {stage: [] for stage in BENCH_STAGES}
+        for _ in range(repeats):
+            timings = {}
+            for context in contexts:
+                time_context(timings, *context)
+            for stage in BENCH_STAGES:
+                samples[stage].append(timings.get(stage, 0.0) / len(contexts))
+
+    del state
+    return {
+        'rows': rows,
+        'candidates': candidates,
+        'setup': setup,
+        'stages': {stage: float(np.median(values)) for stage, values in samples.items()}
+    }
+
+def run_benchmarks(sizes=BENCH_SIZES, repeats=5, seed=0):
+    """Benchmark every catalog size and return the results as a JSON-ready dict"""
+    import sklearn
+    from models import food_recommendation_model as frm
+
+    if not frm.model_loaded:
+        raise RuntimeError("Recommendation model not loaded")
+
+    results = {}
+    for rows in sizes:
+        print(f"🔨 Benchmarking {rows} foods...")
+        results[str(rows)] = benchmark_catalog(rows, repeats, seed=seed)
+        print_result(results[str(rows)])
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'forest_engine': 'numpy' if frm.flat_forests else 'sklearn',
+        'forest_engine_max_batch': frm.FOREST_ENGINE_MAX_BATCH,
+        'repeats': repeats,
+        'seed': seed,
+        'contexts': [list(context) for context in BENCH_CONTEXTS],
+        'results': results
+    }
+
+def print_result(result):
+    setup = ', '.join(f"{stage} {ms:.1f} ms" for stage, ms in result['setup'].items())
+    print(f"   Setup: {setup}")
+    print(f"   Candidates per context: {result['candidates']}")
+    for stage in BENCH_STAGES:
+        print(f"   {stage:<16}{result['stages'][stage]:>12.3f} ms")
+    print(f"   {'total':<16}{sum(result['stages'].values()):>12.3f} ms")
+
+def compare_benchmarks(baseline, current, threshold=0.2, min_ms=0.05):
+    """
+    Compare two run_benchmarks results and print every stage side by side.
+    A stage regresses when it is more than threshold (relative) and min_ms (absolute) slower.
+    Returns the regressions as (rows, stage, baseline ms, current ms)
+    """
+    regressions = []
+    print(f"{'rows':>8}  {'stage':<16}{'baseline ms':>14}{'current ms':>14}{'change':>10}")
+    for rows, current_result in current['results'].items():
+        baseline_result = baseline['results'].get(rows)
+        if baseline_result is None:
+            print(f"⚠️ No baseline for {rows} foods")
+            continue
+
+        for group in ['setup', 'stages']:
+            for stage, current_ms in current_result[group].items():
+                baseline_ms = baseline_result[group].get(stage)
+                if baseline_ms is None:
+                    continue
+                change = (current_ms - baseline_ms) / baseline_ms if baseline_ms else 0.0
+                regressed = current_ms > baseline_ms * (1 + threshold) and current_ms - baseline_ms > min_ms
+                if regressed:
+                    regressions.append((int(rows), stage, baseline_ms, current_ms))
+                print(f"{rows:>8}  {stage:<16}{baseline_ms:>14.3f}{current_ms:>14.3f}{change:>+9.0%}"
+                      f"{'  ❌' if regressed else ''}")
+
+    for key in ['forest_engine', 'numpy', 'sklearn']:
+        if baseline.get(key) != current.get(key):
+            print(f"⚠️ {key} differs: baseline {baseline.get(key)}, current {current.get(key)}")
+
+    return regressions
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Recommendation pipeline benchmark on synthetic catalogs')
+    parser.add_argument('action', choices=['run', 'compare', 'generate'],
+                        help='run the benchmark, compare two results, or write a synthetic catalog CSV')
+    parser.add_argument('--sizes', type=int, nargs='+', default=BENCH_SIZES, help='Catalog sizes for run')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed runs per catalog size')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic catalogs')
+    parser.add_argument('--output', default=None, help='JSON file for run results, or CSV file for generate')
+    parser.add_argument('--baseline', default=None, help='Baseline JSON for compare')
+    parser.add_argument('--current', default=None, help='Current JSON for compare')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative slowdown counted as a regression (default 0.2 = 20%%)')
+    parser.add_argument('--min-ms', type=float, default=0.05, help='Ignore slowdowns smaller than this many ms')
+    parser.add_argument('--rows', type=int, default=10000, help='Catalog size for generate')
+    args = parser.parse_args()
+
+    if args.action == 'run':
+        results = run_benchmarks(args.sizes, args.repeats, args.seed)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"✅ Results written to {args.output}")
+    elif args.action == 'compare':
+        if not args.baseline or not args.current:
+            parser.error('compare needs --baseline and --current')
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        with open(args.current, 'r') as f:
+            current = json.load(f)
+        regressions = compare_benchmarks(baseline, current, args.threshold, args.min_ms)
+        if regressions:
+            print(f"❌ {len(regressions)} stages regressed by more than {args.threshold:.0%}")
+            raise SystemExit(1)
+        print("✅ No regressions")
+    elif args.action == 'generate':
+        if not args.output:
+            parser.error('generate needs --output')
+        generate_catalog(args.rows, args.seed).to_csv(args.output, index=False)
+        print(f"✅ Wrote {args.rows} synthetic foods to {args.output}")
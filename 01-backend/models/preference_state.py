@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+import argparse
+from models.history_cache import invalidate_user_history
+
+# Food preference states
+PREFERENCE_STATES = ['liked', 'neutral', 'disliked']
+
+# food_type key of the state across every food type (contexts without a food type)
+ANY_FOOD_TYPE = ''
+
+def food_state_step(state, consecutive_low, rating):
+    """
+    Apply one rating to a food's state; returns (state, consecutive_low).
+
+    - From NEUTRAL: High rating (>=4) → LIKED, Low rating (<=2) → DISLIKED
+    - From LIKED: Low rating (1st time) → NEUTRAL, Low rating (2nd consecutive time) → DISLIKED
+    - From DISLIKED: rating >= 3 → NEUTRAL (give second chance)
+    """
+    if state == 'neutral':
+        if rating >= 4:
+            return 'liked', 0
+        if rating <= 2:
+            return 'disliked', consecutive_low
+        return 'neutral', consecutive_low
+
+    if state == 'liked':
+        if rating <= 2:
+            consecutive_low += 1
+            return ('neutral' if consecutive_low == 1 else 'disliked'), consecutive_low
+        if rating >= 4:
+            return 'liked', 0
+        return 'neutral', 0
+
+    if state == 'disliked':
+        if rating >= 3:
+            return 'neutral', 0
+        return 'disliked', consecutive_low
+
+    return state, consecutive_low
+
+def context_food_types(food_type):
+    """
+    food_type keys a rating is folded into: its own food type and the any-type context,
+    since contexts without a food type read the ratings of every type
+    """
+    if not food_type:
+        return [ANY_FOOD_TYPE]
+    return [food_type, ANY_FOOD_TYPE]
+
+def apply_ratings(ratings):
+    """
+    Fold ratings (dicts with user_food_log column names) into the stored preference states,
+    in order, with one SELECT per context. Each rating is O(1).
+    Changes are added to the session; the caller commits them with the ratings' log entries
+    """
+    from database.db_init import UserFoodPreference, db
+
+    # (user_id, mood, meal_time, food_type key) -> [(food, rating)] in rating order
+    contexts = {}
+    for rating in ratings:
+        if not rating.get('meal_time') or not rating.get('recommended_food') or rating.get('feedback_rating') is None:
+            continue
+        for key_type in context_food_types(rating.get('food_type')):
+            key = (rating['user_id'], rating['mood'], rating['meal_time'], key_type)
+            contexts.setdefault(key, []).append((rating['recommended_food'], rating['feedback_rating']))
+
+    for (user_id, mood, meal_time, key_type), food_ratings in contexts.items():
+        states = {
+            state.food: state
+            for state in UserFoodPreference.query.filter_by(
+                user_id=user_id,
+                mood=mood,
+                meal_time=meal_time,
+                food_type=key_type
+            ).filter(
+                UserFoodPreference.food.in_({food for food, _ in food_ratings})
+            ).with_for_update()
+        }
+
+        for food, value in food_ratings:
+            state = states.get(food)
+            if state is None:
+                state = UserFoodPreference(
+                    user_id=user_id,
+                    mood=mood,
+                    meal_time=meal_time,
+                    food_type=key_type,
+                    food=food,
+                    state='neutral',
+                    consecutive_low=0,
+                    rating_count=0
+                )
+                db.session.add(state)
+                states[food] = state
+
+            state.state, state.consecutive_low = food_state_step(state.state, state.consecutive_low, value)
+            state.latest_rating = value
+            state.rating_count += 1
+
+def apply_rating(user_id, mood, meal_time, food_type, food, rating):
+    """Fold one rating into the stored preference states (see apply_ratings)"""
+    apply_ratings([{
+        'user_id': user_id,
+        'mood': mood,
+        'meal_time': meal_time,
+        'food_type': food_type,
+        'recommended_food': food,
+        'feedback_rating': rating
+    }])
+
+def record_rating(user_id, mood, meal_time, food_type, food, rating):
+    """
+    Store a rating in user_food_log and update the preference states in the same transaction.
+    Retries once if a concurrent request created the same state row first. Returns the log entry
+    """
+    from database.db_init import UserFoodLog, db
+    from sqlalchemy.exc import IntegrityError
+
+    for attempt in range(2):
+        log_entry = UserFoodLog(
+            user_id=user_id,
+            mood=mood,
+            meal_time=meal_time,
+            food_type=food_type,
+            recommended_food=food,
+            feedback_rating=rating
+        )
+        db.session.add(log_entry)
+        try:
+            if meal_time and food:
+                apply_rating(user_id, mood, meal_time, food_type, food, rating)
+            db.session.commit()
+            invalidate_user_history(user_id)
+            return log_entry
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == 1:
+                raise
+
+def record_ratings(ratings):
+    """
+    Store several ratings (dicts with user_food_log column names) with one multi-row INSERT
+    and update the preference states in the same transaction. Returns the set of new log ids
+    """
+    from database.db_init import db
+    from database.bulk_writes import insert_food_logs
+    from sqlalchemy.exc import IntegrityError
+
+    for attempt in range(2):
+        try:
+            ids = insert_food_logs(ratings)
+            apply_ratings(ratings)
+            db.session.commit()
+            for user_id in {rating['user_id'] for rating in ratings}:
+                invalidate_user_history(user_id)
+            return ids
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == 1:
+                raise
+
+def load_context_preferences(user_id, emotion, meal_time, food_type):
+    """Stored preference states of one context as (food, state, latest_rating) in first-rated order"""
+    from database.db_init import UserFoodPreference
+
+    states = UserFoodPreference.query.with_entities(
+        UserFoodPreference.food,
+        UserFoodPreference.state,
+        UserFoodPreference.latest_rating
+    ).filter_by(
+        user_id=user_id,
+        mood=emotion.lower(),
+        meal_time=meal_time,
+        food_type=food_type or ANY_FOOD_TYPE
+    ).order_by(UserFoodPreference.id).all()
+
+    return [(state.food, state.state, state.latest_rating) for state in states]
+
+def load_user_preferences(user_id, contexts):
+    """
+    load_context_preferences for several (emotion, meal_time, food_type) contexts of a user with one SELECT.
+    Returns {(mood, meal_time, food_type key): [(food, state, latest_rating)]} with an entry per context
+    """
+    from database.db_init import UserFoodPreference
+
+    keys = {(emotion.lower(), meal_time, food_type or ANY_FOOD_TYPE) for emotion, meal_time, food_type in contexts}
+    grouped = {key: [] for key in keys}
+    if not keys:
+        return grouped
+
+    states = UserFoodPreference.query.with_entities(
+        UserFoodPreference.mood,
+        UserFoodPreference.meal_time,
+        UserFoodPreference.food_type,
+        UserFoodPreference.food,
+        UserFoodPreference.state,
+        UserFoodPreference.latest_rating
+    ).filter(
+        UserFoodPreference.user_id == user_id,
+        UserFoodPreference.mood.in_({key[0] for key in keys}),
+        UserFoodPreference.meal_time.in_({key[1] for key in keys}),
+        UserFoodPreference.food_type.in_({key[2] for key in keys})
+    ).order_by(UserFoodPreference.id).all()
+
+    for state in states:
+        key = (state.mood, state.meal_time, state.food_type)
+        if key in grouped:
+            grouped[key].append((state.food, state.state, state.latest_rating))
+    return grouped
+
+def replay_preference_states(user_id=None, batch_size=5000):
+    """
+    Replay user_food_log into preference states, oldest rating first.
+    Returns {(user_id, mood, meal_time, food_type, food): [state, consecutive_low, latest_rating, rating_count]}
+    """
+    from database.db_init import UserFoodLog
+
+    query = UserFoodLog.query.with_entities(
+        UserFoodLog.user_id,
+        UserFoodLog.mood,
+        UserFoodLog.meal_time,
+        UserFoodLog.food_type,
+        UserFoodLog.recommended_food,
+        UserFoodLog.feedback_rating
+    ).filter(
+        UserFoodLog.feedback_rating.isnot(None),
+        UserFoodLog.meal_time.isnot(None),
+        UserFoodLog.recommended_food.isnot(None)
+    )
+    if user_id is not None:
+        query = query.filter(UserFoodLog.user_id == user_id)
+
+    states = {}
+    for entry in query.order_by(UserFoodLog.created_at, UserFoodLog.id).yield_per(batch_size):
+        for key_type in context_food_types(entry.food_type):
+            key = (entry.user_id, entry.mood, entry.meal_time, key_type, entry.recommended_food)
+            state = states.setdefault(key, ['neutral', 0, None, 0])
+            state[0], state[1] = food_state_step(state[0], state[1], entry.feedback_rating)
+            state[2] = entry.feedback_rating
+            state[3] += 1
+    return states
+
+def rebuild_preference_state(user_id=None):
+    """Recompute the preference states of one user (or everyone) from user_food_log; returns the row count"""
+    from database.db_init import UserFoodPreference, db
+
+    states = replay_preference_states(user_id)
+
+    delete = UserFoodPreference.query
+    if user_id is not None:
+        delete = delete.filter(UserFoodPreference.user_id == user_id)
+    delete.delete(synchronize_session=False)
+
+    db.session.bulk_insert_mappings(UserFoodPreference, [
+        {
+            'user_id': key[0],
+            'mood': key[1],
+            'meal_time': key[2],
+            'food_type': key[3],
+            'food': key[4],
+            'state': state[0],
+            'consecutive_low': state[1],
+            'latest_rating': state[2],
+            'rating_count': state[3]
+        }
+        for key, state in states.items()
+    ])
+    db.session.commit()
+    return len(states)
+
+def check_preference_state(user_id=None):
+    """Compare the stored states with a replay of user_food_log; returns the mismatching keys"""
+    from database.db_init import UserFoodPreference
+
+    expected = replay_preference_states(user_id)
+
+    query = UserFoodPreference.query
+    if user_id is not None:
+        query = query.filter(UserFoodPreference.user_id == user_id)
+    stored = {
+        (row.user_id, row.mood, row.meal_time, row.food_type, row.food):
+            [row.state, row.consecutive_low, row.latest_rating, row.rating_count]
+        for row in query
+    }
+
+    return sorted(
+        (key for key in set(expected) | set(stored) if expected.get(key) != stored.get(key)),
+        key=str
+    )
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Materialized food preference state utility')
+    parser.add_argument('action', choices=['rebuild', 'check'],
+                        help='rebuild the states from user_food_log or check them against it')
+    parser.add_argument('--user-id', type=int, default=None, help='Only this user (default: everyone)')
+    args = parser.parse_args()
+
+    from database.db_init import app
+
+    with app.app_context():
+        if args.action == 'rebuild':
+            count = rebuild_preference_state(args.user_id)
+            print(f"✅ Rebuilt {count} food preference states")
+        elif args.action == 'check':
+            mismatches = check_preference_state(args.user_id)
+            if mismatches:
+                for key in mismatches[:20]:
+                    print(f"❌ Stale preference state: {key}")
+                print(f"❌ {len(mismatches)} preference states differ from user_food_log, run rebuild")
+                raise SystemExit(1)
+            print("✅ Food preference states match user_food_log")
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+import argparse
+import hashlib
+import json
+import time
+import numpy as np
+from pathlib import Path
+from models.candidate_index import CANDIDATE_K
+from models.shared_state import GenerationStore
+
+# Bump when the layout of the stored arrays changes
+TABLE_FORMAT_VERSION = 3
+
+# Ages covered by the table; other ages fall back to live scoring
+TABLE_MIN_AGE = 0
+TABLE_MAX_AGE = 99
+
+# Number of foods stored per context (top recommendation + 3 alternatives)
+TABLE_TOP_K = 4
+
+# Model scores stored for the top recommendation of each context
+TOP_SCORE_FIELDS = ['rank_score', 'binary_score', 'reg_score', 'direct_score', 'votes', 'consensus_score']
+
+MONTHS = list(range(1, 13))
+
+models_dir = Path(__file__).parent / "recommendation_models"
+data_dir = Path(__file__).parent / "../data"
+SCORE_TABLE_DIR = models_dir / "context_score_table"
+
+# Every saved table is a new generation of .npy files that workers map read-only, see GenerationStore
+score_table_generations = GenerationStore(SCORE_TABLE_DIR)
+
+# Files whose content determines every score in the table
+SOURCE_FILES = [
+    models_dir / "rank_model.pkl",
+    models_dir / "score_model.pkl",
+    models_dir / "binary_model.pkl",
+    models_dir / "encoders.pkl",
+    models_dir / "nutrition_info.json",
+    data_dir / "reduced_nutrition_df.csv",
+]
+
+def compute_table_version(extra=None, sources=None):
+    """
+    Hash the model and catalog files (plus any extra settings) into a table version string.
+    sources replaces SOURCE_FILES with the files of another model version, in the same order.
+    CANDIDATE_K is part of the version since it decides which foods a large catalog scores
+    """
+    digest = hashlib.sha256()
+    digest.update(f"format={TABLE_FORMAT_VERSION};ages={TABLE_MIN_AGE}-{TABLE_MAX_AGE};k={CANDIDATE_K}".encode())
+    for path in (SOURCE_FILES if sources is None else sources):
+        digest.update(path.name.encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    if extra is not None:
+        digest.update(json.dumps(extra, sort_keys=True).encode())
+    return digest.hexdigest()
+
+class ContextScoreTable:
+    """
+    Precomputed final orderings for every (emotion, meal_type, age, food_type, month) context.
+
+    food_order holds catalog food ids of the top foods (-1 = empty slot) and
+    top_scores holds the model scores of the first food in each context.
+    """
+
+    def __init__(self, version, emotions, meal_types, food_types, ages, food_order, top_scores):
+        self.version = version
+        self.emotions = list(emotions)
+        self.meal_types = list(meal_types)
+        self.food_types = list(food_types)  # '' stands for "any food type"
+        self.ages = list(ages)
+        self.food_order = food_order
+        self.top_scores = top_scores
+
+        self._emotion_index = {e: i for i, e in enumerate(self.emotions)}
+        self._meal_index = {m: i for i, m in enumerate(self.meal_types)}
+        self._food_type_index = {t: i for i, t in enumerate(self.food_types)}
+        self._min_age = self.ages[0]
+        self._max_age = self.ages[-1]
+
+    def lookup(self, emotion, meal_type, age, food_type, month):
+        """
+        Return (catalog food ids, top scores dict) for a context,
+        or None when the context is not covered by the table
+        """
+        e = self._emotion_index.get(emotion)
+        m = self._meal_index.get(meal_type)
+        t = self._food_type_index.get(food_type or '')
+        if e is None or m is None or t is None:
+            return None
+        if age < self._min_age or age > self._max_age or month not in MONTHS:
+            return None
+
+        key = (e, m, age - self._min_age, t, month - 1)
+        positions = [int(pos) for pos in self.food_order[key] if pos >= 0]
+        scores = dict(zip(TOP_SCORE_FIELDS, self.top_scores[key].tolist()))
+        return positions, scores
+
+    def save(self, store=score_table_generations):
+        """Publish the table as a new generation: the arrays as .npy files, the rest in table.json"""
+        with store.publish() as directory:
+            np.save(directory / "food_order.npy", self.food_order)
+            np.save(directory / "top_scores.npy", self.top_scores)
+            with open(directory / "table.json", 'w') as f:
+                json.dump({
+                    'version': self.version,
+                    'emotions': self.emotions,
+                    'meal_types': self.meal_types,
+                    'food_types': self.food_types,
+                    'ages': self.ages
+                }, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """Read a table written by save(); mmap_mode='r' maps the arrays read-only"""
+        directory = Path(directory)
+        with open(directory / "table.json", 'r') as f:
+            meta = json.load(f)
+        return cls(
+            food_order=np.load(directory / "food_order.npy", mmap_mode=mmap_mode, allow_pickle=False),
+            top_scores=np.load(directory / "top_scores.npy", mmap_mode=mmap_mode, allow_pickle=False),
+            **meta
+        )
+
+def load_score_table(version, store=score_table_generations):
+    """Map the current table generation if it exists and matches the current model version"""
+    directory = store.path()
+    if directory is None:
+        print(f"⚠️ Context score table not found at {store.root}, using live scoring")
+        return None
+
+    try:
+        table = ContextScoreTable.load(directory)
+    except Exception as e:
+        print(f"❌ Error loading context score table: {e}")
+        return None
+
+    if table.version != version:
+        print("⚠️ Context score table is stale (models or catalog changed), using live scoring")
+        return None
+
+    print("✅ Context score table loaded successfully")
+    return table
+
+def build_score_table(ages=None):
+    """
+    Score every context with the live recommendation pipeline and collect the results.
+    Each (emotion, meal_type) pair is scored with one batched call per model. Catalogs larger
+    than CANDIDATE_K score the same nearest-to-ideal candidates as live scoring
+    """
+    from models import food_recommendation_model as frm
+
+    if not frm.model_loaded:
+        raise RuntimeError("Recommendation model not loaded")
+
+    # Versioned before scoring, so a model version swapped in meanwhile never matches this table
+    version = compute_table_version(frm.NUTRITION_GENERAL_LIMITS, frm.model_sources.values())
+    ages = list(ages or range(TABLE_MIN_AGE, TABLE_MAX_AGE + 1))
+    emotions = frm.SUPPORTED_EMOTIONS
+    meal_types = frm.SUPPORTED_MEAL_TYPES
+    food_types = [''] + frm.SUPPORTED_FOOD_TYPES
+    layout = frm.feature_layout
+
+    food_order = np.full(
+        (len(emotions), len(meal_types), len(ages), len(food_types), len(MONTHS), TABLE_TOP_K),
+        -1, dtype=np.int32
+    )
+    top_scores = np.zeros(food_order.shape[:-1] + (len(TOP_SCORE_FIELDS),))
+
+    for age_group in ['child', 'adult']:
+        group_ages = [a for a in ages if ('adult' if a > 15 else 'child') == age_group]
+        if not group_ages:
+            continue
+        age_slots = [ages.index(a) for a in group_ages]
+
+        ids_by_type = {food_type: frm.select_candidate_foods(age_group, food_type or None) for food_type in food_types}
+
+        for e, emotion in enumerate(emotions):
+            # The live candidate cut only depends on the emotion, age group and food type
+            cut_by_type = {
+                food_type: frm.candidate_index.nearest(ids, emotion, age_group, food_type or None, CANDIDATE_K)
+                if len(ids) > 0 else ids
+                for food_type, ids in ids_by_type.items()
+            }
+            # Every food type option draws its candidates from this set (both are sorted ids)
+            group_ids = np.unique(np.concatenate(list(cut_by_type.values())))
+            candidates_by_type = {
+                food_type: np.searchsorted(group_ids, ids) for food_type, ids in cut_by_type.items()
+            }
+
+            # Direct scores only depend on the food, emotion and age group
+            direct_scores = frm.direct_score_tensor.scores(emotion, age_group)[group_ids]
+
+            for m, meal_type in enumerate(meal_types):
+                base = frm.build_feature_matrix(group_ids, emotion, meal_type, 0, MONTHS[0])
+
+                # Foods with unreadable nutrition values are never scored
+                scorable = np.isfinite(base).all(axis=1)
+
+                # One row per (age, month, food)
+                features = np.tile(base, (len(group_ages) * len(MONTHS), 1))
+                grid = features.reshape(len(group_ages), len(MONTHS), len(group_ids), -1)
+                if layout['age'] is not None:
+                    grid[:, :, :, layout['age']] = np.array(group_ages)[:, None, None]
+                if layout['month'] is not None:
+                    grid[:, :, :, layout['month']] = (np.array(MONTHS) / 12)[None, :, None]
+
+                shape = (len(group_ages), len(MONTHS), len(group_ids))
+                features = np.nan_to_num(features)
+                rank_scores, binary_scores, reg_scores = (
+                    scores.reshape(shape) for scores in frm.predict_model_scores(features)
+                )
+
+                for t, food_type in enumerate(food_types):
+                    positions = candidates_by_type[food_type]
+                    positions = positions[scorable[positions]]
+                    if len(positions) == 0:
+                        continue
+                    candidates = group_ids[positions]
+
+                    for a, age_slot in enumerate(age_slots):
+                        for month_slot in range(len(MONTHS)):
+                            final_sorted = frm.rank_scored_foods(
+                                candidates,
+                                rank_scores[a, month_slot, positions],
+                                binary_scores[a, month_slot, positions],
+                                reg_scores[a, month_slot, positions],
+                                emotion, age_group,
+                                direct_scores=direct_scores[positions]
+                            )
+                            if not final_sorted:
+                                continue
+
+                            key = (e, m, age_slot, t, month_slot)
+                            food_order[key][:len(final_sorted[:TABLE_TOP_K])] = [
+                                food['food_id'] for food in final_sorted[:TABLE_TOP_K]
+                            ]
+                            top_scores[key] = [final_sorted[0][field] for field in TOP_SCORE_FIELDS]
+
+            print(f"   Scored {emotion} contexts for {age_group} ages")
+
+    return ContextScoreTable(
+        version=version,
+        emotions=emotions,
+        meal_types=meal_types,
+        food_types=food_types,
+        ages=ages,
+        food_order=food_order,
+        top_scores=top_scores
+    )
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Context score table utility')
+    parser.add_argument('action', choices=['build', 'check'],
+                        help='Action to perform: build the table or check whether it is current')
+    args = parser.parse_args()
+
+    from models import food_recommendation_model as frm
+    current_version = compute_table_version(frm.NUTRITION_GENERAL_LIMITS, frm.model_sources.values())
+
+    if args.action == 'build':
+        start = time.time()
+        print("🔨 Building context score table...")
+        table = build_score_table()
+        table.save()
+        print(f"✅ Context score table saved to {score_table_generations.path()} ({time.time() - start:.1f}s)")
+    elif args.action == 'check':
+        if load_score_table(current_version) is None:
+            print("❌ Context score table is missing or stale: run `python -m models.score_table build`")
+            raise SystemExit(1)
+        print(f"✅ Context score table is current (version {current_version[:12]})")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+import argparse
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from models.stage_timer import stage
+from metrics import observe
+
+logger = logging.getLogger(__name__)
+
+# Worker processes that build features and run the forests for live scoring (0 scores on the request thread)
+SCORING_POOL_SIZE = int(os.getenv("SCORING_POOL_SIZE", "0"))
+
+# Scoring jobs queued or running in the pool at once; further request threads wait for a slot
+SCORING_POOL_QUEUE_DEPTH = int(os.getenv("SCORING_POOL_QUEUE_DEPTH", "64"))
+
+class ScoringPool:
+    """
+    Forked worker processes running feature building and forest inference, so concurrent
+    request threads are not serialized on the GIL.
+
+    Workers are forked from a process whose models are already loaded: they start with the
+    active bundle (mapped artifacts stay shared with the parent) and only receive the candidate
+    food ids and context of each job, returning the score arrays. A job names the model version
+    and artifact generation it was planned with, and a worker still on another one loads it first.
+    The time from submission until a worker picks a job up is reported as the queue wait
+    """
+
+    def __init__(self, size=SCORING_POOL_SIZE, queue_depth=SCORING_POOL_QUEUE_DEPTH):
+        self.size = size
+        self.queue_depth = queue_depth
+        self._slots = threading.BoundedSemaphore(queue_depth)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.jobs = 0
+        self.queue_wait_seconds = 0.0
+        self.start()
+
+    def start(self, broken=None):
+        """Fork the worker processes; with broken set, only if that executor is still the current one"""
+        with self._lock:
+            if broken is not None and broken is not self._executor:
+                return
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = ProcessPoolExecutor(self.size, mp_context=multiprocessing.get_context('fork'))
+            # The fork context starts every worker on the first submission: do it now, before serving
+            for future in [self._executor.submit(os.getpid) for _ in range(self.size)]:
+                future.result()
+
+    def score(self, version, generation, jobs):
+        """score_candidate_batch(jobs) in a worker with the given model version and artifact generation loaded"""
+        executor = self._executor
+        submitted = time.time()
+        with self._slots:
+            try:
+                scored, queue_wait = executor.submit(_score_jobs, version, generation, jobs, submitted).result()
+            except BrokenProcessPool:
+                self.start(broken=executor)
+                raise
+
+        with self._lock:
+            self.jobs += 1
+            self.queue_wait_seconds += queue_wait
+        observe('scoring_queue_wait_seconds', queue_wait)
+        return scored
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+def _score_jobs(version, generation, jobs, submitted):
+    """Runs in a pool worker: returns the scored jobs and how long they waited to start"""
+    from models import food_recommendation_model as frm
+
+    queue_wait = max(time.time() - submitted, 0.0)
+    if (frm.model_version, frm.model_generation) != (version, generation):
+        frm.activate_model_bundle(frm.load_model_bundle(version))
+    return frm.score_candidate_batch(jobs), queue_wait
+
+# Pool of this process, started by init_scoring_pool()
+scoring_pool = None
+
+def init_scoring_pool(size=None, queue_depth=None):
+    """
+    Start the scoring pool when SCORING_POOL_SIZE (or size) is above 0 and the models are loaded.
+    Call it before the server starts its request threads
+    """
+    global scoring_pool
+    from models import food_recommendation_model as frm
+
+    size = SCORING_POOL_SIZE if size is None else size
+    if scoring_pool is not None or size <= 0 or not frm.model_loaded:
+        return scoring_pool
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        print("⚠️ Scoring pool needs the 'fork' start method, not available on this platform: scoring on request threads")
+        return scoring_pool
+
+    try:
+        scoring_pool = ScoringPool(size, SCORING_POOL_QUEUE_DEPTH if queue_depth is None else queue_depth)
+        atexit.register(shutdown_scoring_pool)
+        print(f"✅ Scoring pool started ({size} processes)")
+    except Exception as e:
+        print(f"❌ Error starting scoring pool, scoring on request threads: {e}")
+    return scoring_pool
+
+def shutdown_scoring_pool():
+    global scoring_pool
+    if scoring_pool is not None:
+        scoring_pool.shutdown()
+        scoring_pool = None
+
+def score_in_pool(version, generation, jobs):
+    """
+    Score (food_ids, emotion, meal_type, age) jobs in the scoring pool, see score_candidate_batch.
+    Returns None when the pool is not running or a worker died, so the caller scores them itself
+    """
+    pool = scoring_pool
+    if pool is None:
+        return None
+
+    with stage('scoring_pool'):
+        try:
+            return pool.score(version, generation, jobs)
+        except BrokenProcessPool as e:
+            logger.error("Scoring pool worker died, pool restarted: %s", e)
+            return None
+
+def benchmark(rows=(146, 10000), concurrency=(1, 8, 32), requests=96, size=None):
+    """
+    Throughput and latency of live scoring on request threads against the scoring pool,
+    with 1, 8 and 32 threads each sending parallel_with_direct_scoring calls (score table off)
+    """
+    from models import food_recommendation_model as frm
+    from models import scoring_pool as live  # Not __main__, whose pool the pipeline would not see
+    from models.food_catalog import FoodCatalog
+    from models.pipeline_bench import BENCH_CONTEXTS, generate_catalog, use_catalog
+
+    size = size or SCORING_POOL_SIZE or os.cpu_count()
+
+    def run(threads):
+        def one(context):
+            start = time.perf_counter()
+            frm.parallel_with_direct_scoring(*context)
+            return (time.perf_counter() - start) * 1000
+
+        contexts = [BENCH_CONTEXTS[i % len(BENCH_CONTEXTS)] for i in range(requests)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            latencies = list(executor.map(one, contexts))
+        return requests / (time.perf_counter() - start), np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+    print(f"Scoring pool: {size} processes, {os.cpu_count()} CPUs")
+    print(f"{'rows':>8}{'threads':>9}{'mode':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'wait ms':>10}")
+    for count in rows:
+        catalog = frm.food_catalog if count == len(frm.food_catalog) else FoodCatalog.from_dataframe(generate_catalog(count))
+        with use_catalog(catalog):
+            for mode in ['thread', 'pool']:
+                # Forked after the catalog swap, so the workers score the same catalog
+                pool = live.init_scoring_pool(size) if mode == 'pool' else None
+                if mode == 'pool' and pool is None:
+                    continue
+                try:
+                    run(max(concurrency))  # Warm up the candidate index and the workers
+                    for threads in concurrency:
+                        jobs, wait = (pool.jobs, pool.queue_wait_seconds) if pool else (0, 0.0)
+                        throughput, p50, p95 = run(threads)
+                        mean_wait = (pool.queue_wait_seconds - wait) / max(pool.jobs - jobs, 1) * 1000 if pool else 0.0
+                        print(f"{count:>8}{threads:>9}{mode:>8}{throughput:>10.1f}{p50:>10.2f}{p95:>10.2f}"
+                              f"{mean_wait:>10.2f}")
+                finally:
+                    live.shutdown_scoring_pool()
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Process pool for recommendation scoring')
+    parser.add_argument('action', choices=['bench'],
+                        help='compare scoring on request threads with the scoring pool under concurrent requests')
+    parser.add_argument('--rows', type=int, nargs='+', default=[146, 10000], help='Catalog sizes (146 is the real catalog)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='Concurrent request threads')
+    parser.add_argument('--requests', type=int, default=96, help='Requests per measurement')
+    parser.add_argument('--size', type=int, default=None, help='Pool processes (default SCORING_POOL_SIZE or the CPU count)')
+    args = parser.parse_args()
+
+    benchmark(args.rows, args.concurrency, args.requests, args.size)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+import argparse
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Seconds between checks for newly published generations by each worker
+SHARED_STATE_POLL_INTERVAL = float(os.getenv("SHARED_STATE_POLL_INTERVAL", "5"))
+
+class GenerationStore:
+    """
+    Numbered generations of read-only files under one directory (root/gen-000001, ...).
+
+    Workers map the files of the current generation with mmap_mode='r', so the operating system
+    keeps one copy however many workers run. A writer fills a staging directory and publishes it
+    with a rename followed by an atomic replace of root/GENERATION, so readers only ever see
+    complete generations. Published files are never rewritten: a worker still mapping an older
+    generation keeps valid pages until it re-attaches, and pruning old generations only unlinks
+    files, which leaves existing mappings intact
+    """
+
+    def __init__(self, root, keep=2):
+        self.root = Path(root)
+        self.keep = keep
+
+    def generation(self):
+        """Number of the current generation, 0 when none was published"""
+        try:
+            return int((self.root / "GENERATION").read_text().strip())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def path(self, generation=None):
+        """Directory of a generation (default the current one), or None when it does not exist"""
+        generation = self.generation() if generation is None else generation
+        path = self.root / f"gen-{generation:06d}"
+        return path if generation > 0 and path.is_dir() else None
+
+    @contextmanager
+    def publish(self):
+        """Yield a staging directory to fill; it becomes the current generation when the block succeeds"""
+        generation = self.generation() + 1
+        staging = self.root / f".gen-{generation:06d}.{os.getpid()}.partial"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        try:
+            yield staging
+            staging.rename(self.root / f"gen-{generation:06d}")
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        pointer = self.root / f"GENERATION.{os.getpid()}.tmp"
+        pointer.write_text(str(generation))
+        os.replace(pointer, self.root / "GENERATION")
+        self.prune()
+
+    def prune(self):
+        """Remove all but the newest `keep` generations"""
+        current = self.generation()
+        for path in self.root.glob("gen-*"):
+            try:
+                generation = int(path.name[4:])
+            except ValueError:
+                continue
+            if generation <= current - self.keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+class SharedStateWatcher:
+    """
+    Re-attach this worker when a watched store publishes a new generation.
+    Each watch has a callback returning True once it re-attached; only then is the generation
+    recorded, so False or an exception retries on a later poll
+    """
+
+    def __init__(self, interval=SHARED_STATE_POLL_INTERVAL):
+        self.interval = interval
+        self._watches = {}  # name -> [store, attached generation, callback]
+        self._lock = threading.Lock()
+        self._last_poll = 0.0
+
+    def watch(self, name, store, callback):
+        """Watch a store, starting from its current generation"""
+        with self._lock:
+            self._watches[name] = [store, store.generation(), callback]
+
+    def generations(self):
+        """{name: (attached generation, published generation)}"""
+        with self._lock:
+            return {name: (attached, store.generation()) for name, (store, attached, _) in self._watches.items()}
+
+    def poll(self):
+        """Run the callbacks of stores with a new generation, at most every `interval` seconds"""
+        now = time.monotonic()
+        if now - self._last_poll < self.interval:
+            return
+        self._last_poll = now
+
+        with self._lock:
+            changed = [
+                (name, watch, watch[0].generation()) for name, watch in self._watches.items()
+                if watch[0].generation() != watch[1]
+            ]
+        for name, watch, generation in changed:
+            try:
+                attached = watch[2]()
+            except Exception as e:
+                print(f"❌ Error attaching {name} generation {generation}: {e}")
+                continue
+            if attached:
+                with self._lock:
+                    watch[1] = generation
+                print(f"🔄 Re-attached {name} to generation {generation}")
+
+# Stores watched by this worker, polled from the request path
+shared_state = SharedStateWatcher()
+
+# This is the direct entry point when running this file as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Shared read-only catalog, model and score table files')
+    parser.add_argument('action', choices=['preload', 'status'],
+                        help='publish new artifact and score table generations, or show the current ones')
+    args = parser.parse_args()
+
+    from models.model_artifacts import artifact_generations, export_artifacts
+    from models.score_table import score_table_generations
+
+    if args.action == 'preload':
+        from models import food_recommendation_model as frm
+        from models.score_table import build_score_table
+
+        export_artifacts()
+        # Scored from the catalog just exported, which matches the loaded one
+        print("🔨 Building context score table...")
+        build_score_table().save()
+        print(f"✅ Published artifacts generation {artifact_generations.generation()} and score table "
+              f"generation {score_table_generations.generation()}; workers attach within {SHARED_STATE_POLL_INTERVAL:g}s")
+    elif args.action == 'status':
+        for name, store in [('artifacts', artifact_generations), ('score table', score_table_generations)]:
+            generation = store.generation()
+            path = store.path()
+            size = sum(f.stat().st_size for f in path.iterdir()) / 1024 / 1024 if path else 0.0
+            print(f"{name:<14}generation {generation:<6}{size:>10.1f} MB  {path or '(not published)'}")
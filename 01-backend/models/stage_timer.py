@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+
+# Record per-stage timings of instrumented requests (STAGE_TIMING=1)
+STAGE_TIMING = os.getenv("STAGE_TIMING", "0") == "1"
+
+# Upper bounds (ms) of the stage histogram buckets; the last bucket is unbounded
+STAGE_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Timer of the request the current thread is serving, if it is being timed
+_current = threading.local()
+
+class StageTimer:
+    """
+    Wall and CPU time per named stage of one request.
+    A stage entered several times accumulates; nested stages are also counted in their parent
+    """
+
+    def __init__(self):
+        self.stages = {}  # name -> [wall ms, cpu ms, calls], in first-entered order
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        self.total = None  # (wall ms, cpu ms), set when the request ends
+
+    def add(self, name, wall_ms, cpu_ms):
+        entry = self.stages.get(name)
+        if entry is None:
+            self.stages[name] = [wall_ms, cpu_ms, 1]
+        else:
+            entry[0] += wall_ms
+            entry[1] += cpu_ms
+            entry[2] += 1
+
+    def finish(self):
+        self.total = (
+            (time.perf_counter() - self.wall_start) * 1000,
+            (time.thread_time() - self.cpu_start) * 1000
+        )
+        return self.total
+
+    def server_timing(self):
+        """Server-Timing header value: one metric per stage plus the total, CPU time in desc"""
+        metrics = [
+            f'{name};dur={wall_ms:.2f};desc="cpu {cpu_ms:.2f}ms"'
+            for name, (wall_ms, cpu_ms, _) in self.stages.items()
+        ]
+        if self.total is not None:
+            metrics.append(f'total;dur={self.total[0]:.2f};desc="cpu {self.total[1]:.2f}ms"')
+        return ', '.join(metrics)
+
+class _Stage:
+    __slots__ = ('timer', 'name', 'wall', 'cpu')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(
+            self.name,
+            (time.perf_counter() - self.wall) * 1000,
+            (time.thread_time() - self.cpu) * 1000
+        )
+        return False
+
+class _NoStage:
+    """Shared no-op stage for untimed requests"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_no_stage = _NoStage()
+
+def stage(name):
+    """Context manager timing a stage of the current request; free when the request is not timed"""
+    timer = getattr(_current, 'timer', None)
+    if timer is None:
+        return _no_stage
+    return _Stage(timer, name)
+
+class StageHistograms:
+    """Per-stage wall time histograms (STAGE_BUCKETS_MS) with CPU time sums, over all timed requests"""
+
+    def __init__(self, buckets=STAGE_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._stages = {}  # name -> {'counts': [...], 'wall_ms': sum, 'cpu_ms': sum, 'count': n}
+        self._lock = threading.Lock()
+
+    def observe(self, name, wall_ms, cpu_ms):
+        slot = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if wall_ms <= bound:
+                slot = i
+                break
+        with self._lock:
+            entry = self._stages.get(name)
+            if entry is None:
+                entry = self._stages[name] = {
+                    'counts': [0] * (len(self.buckets) + 1), 'wall_ms': 0.0, 'cpu_ms': 0.0, 'count': 0
+                }
+            entry['counts'][slot] += 1
+            entry['wall_ms'] += wall_ms
+            entry['cpu_ms'] += cpu_ms
+            entry['count'] += 1
+
+    def observe_timer(self, timer):
+        for name, (wall_ms, cpu_ms, _) in timer.stages.items():
+            self.observe(name, wall_ms, cpu_ms)
+        if timer.total is not None:
+            self.observe('total', *timer.total)
+
+    def snapshot(self):
+        """{stage: {'buckets': [(upper bound ms, cumulative count)], 'count', 'wall_ms', 'cpu_ms'}}"""
+        with self._lock:
+            result = {}
+            for name, entry in self._stages.items():
+                cumulative = 0
+                buckets = []
+                for bound, count in zip(self.buckets + (float('inf'),), entry['counts']):
+                    cumulative += count
+                    buckets.append((bound, cumulative))
+                result[name] = {
+                    'buckets': buckets,
+                    'count': entry['count'],
+                    'wall_ms': entry['wall_ms'],
+                    'cpu_ms': entry['cpu_ms']
+                }
+            return result
+
+    def clear(self):
+        with self._lock:
+            self._stages = {}
+
+# Aggregated over every timed request of this process
+stage_histograms = StageHistograms()
+
+def begin_request_timing():
+    """Start timing the current thread's request; returns the timer, or None when STAGE_TIMING is off"""
+    if not STAGE_TIMING:
+        return None
+    timer = StageTimer()
+    _current.timer = timer
+    return timer
+
+def end_request_timing(timer):
+    """Stop timing the current thread's request and add its stages to stage_histograms"""
+    _current.timer = None
+    if timer is None:
+        return None
+    timer.finish()
+    stage_histograms.observe_timer(timer)
+    return timer